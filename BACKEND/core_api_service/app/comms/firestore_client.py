@@ -3,15 +3,20 @@
 # UPDATED: Removed 'await' from doc_ref.set() calls.
 
 import logging
-from google.cloud import firestore
+from typing import TYPE_CHECKING, Optional
 from ..models.schemas import DeviceData, Alert
 from ..config import settings
-import google.cloud.firestore
 import json
 import os
 import asyncio
-import firebase_admin
-from firebase_admin import credentials
+from ..logging_setup import get_event_logger
+from .write_behind import WriteBehindWriter, FIRESTORE_MAX_BATCH_OPS
+from .wal import WalReplicator, packet_wal
+
+if TYPE_CHECKING:
+    # google.cloud.firestore and firebase_admin take a quarter of a second to
+    # import; they are only imported by `initialize_firestore`, at startup
+    from google.cloud import firestore
 
 # --- Firebase Config ---
 if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ:
@@ -22,9 +27,12 @@ if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ:
         logging.warning("Could not parse __firebase_config. Using default credentials.")
 
 logger = logging.getLogger(__name__)
+events = get_event_logger(__name__)
 
 # Module-level Firestore client (initialized on app startup)
-_db: firestore.Client | None = None
+_db: "firestore.Client | None" = None
+# Set once `initialize_firestore` has run, whatever its outcome
+_initialized = False
 
 def initialize_firestore():
     """Initializes firebase_admin (if not already) and creates a Firestore client.
@@ -32,7 +40,8 @@ def initialize_firestore():
     This should be called once at application startup to centralize credentials and
     ensure firebase_admin is ready for auth operations used elsewhere.
     """
-    global _db
+    global _db, _initialized
+    _initialized = True
     
     # FORCE DEMO MODE - Firestore completely disabled
     logger.warning("="*70)
@@ -59,6 +68,9 @@ def initialize_firestore():
     
     # The code below is disabled for demo mode
     try:
+        from firebase_admin import credentials
+        from google.cloud import firestore
+
         # Initialize firebase_admin if not already
         if not firebase_admin._apps:
             # Use absolute path to the new service account key
@@ -104,6 +116,10 @@ def initialize_firestore():
         logger.warning("🎮 Running in DEMO MODE without Firestore - AI analysis will still work!")
         _db = None
 
+def firestore_unavailable() -> bool:
+    """True once start-up has run and left no Firestore client (demo mode)."""
+    return _initialized and _db is None
+
 def get_firestore_db():
     """Return the initialized Firestore client, or attempt to create one.
 
@@ -112,64 +128,97 @@ def get_firestore_db():
     global _db
     # DEMO MODE - Always return None, never create Firestore client
     if _db is None:
-        logger.warning("🎮 DEMO MODE - Firestore disabled, returning None")
+        # Called on every packet; keep the demo-mode notice to one line a minute
+        events.warning_limited("firestore.demo_mode", detail="Firestore disabled, returning None")
     return None
 
-async def save_sensor_data(db: firestore.Client, app_id: str, user_id: str, data: DeviceData):
+async def save_sensor_data(db: "firestore.Client", app_id: str, user_id: str, data: DeviceData, payload: Optional[dict] = None):
     """
     Saves a raw sensor data packet to Firestore.
+
+    The write is queued on `firestore_writer` and committed with other
+    pending writes in one batch shortly after. `payload` is ``data``
+    already dumped (e.g. a shared `ProcessedEnvelope.data`).
     """
     if not db:
-        logger.warning("🎮 DEMO MODE - Skipping Firestore save_sensor_data")
+        events.warning_limited("firestore.demo_mode_skip", op="save_sensor_data")
         return
 
-    try:
-        # Path: /artifacts/{appId}/users/{userId}/sensor_data/{timestamp}
-        doc_ref = db.collection(
-            "artifacts", app_id, "users", user_id, "sensor_data"
-        ).document(data.timestamp)
-
-        # Run the blocking Firestore set in a thread to avoid blocking the event loop
-        await asyncio.to_thread(doc_ref.set, data.model_dump())
-        logger.info(f"💾 Saved sensor data to Firestore: {data.timestamp}")
-    except Exception as e:
-        error_msg = str(e)
-        if "Invalid JWT Signature" in error_msg or "invalid_grant" in error_msg:
-            logger.error(f"🔴 FIRESTORE WRITE FAILED - Invalid service account key")
-            logger.error(f"💡 Download fresh key from: https://console.firebase.google.com/project/stance-sense-qwerty/settings/serviceaccounts/adminsdk")
-            logger.warning(f"🎮 Continuing in DEMO MODE - AI analysis still works!")
-            # Disable future Firestore operations
-            global _db
-            _db = None
-        else:
-            logger.error(f"❌ Error saving sensor data: {e}")
-
-async def save_alert(db: firestore.Client, app_id: str, user_id: str, alert: Alert):
+    # Path: /artifacts/{appId}/users/{userId}/sensor_data/{timestamp}
+    doc_ref = db.collection(
+        "artifacts", app_id, "users", user_id, "sensor_data"
+    ).document(data.timestamp)
+
+    if firestore_writer.set(doc_ref, payload if payload is not None else data.model_dump()):
+        events.debug("firestore.queued", kind="sensor_data", doc=data.timestamp)
+
+async def save_alert(db: "firestore.Client", app_id: str, user_id: str, alert: Alert, payload: Optional[dict] = None):
     """
     Saves a critical alert to its own collection in Firestore.
+
+    Alerts are queued as urgent, so the writer flushes them immediately
+    instead of waiting for the flush interval. `payload` is ``alert``
+    already dumped (e.g. `AlertEnvelope.data`).
     """
     if not db:
-        logger.warning("🎮 DEMO MODE - Skipping Firestore save_alert")
+        events.warning_limited("firestore.demo_mode_skip", op="save_alert")
         return
-        
-    try:
-        # Path: /artifacts/{appId}/users/{userId}/alerts/{timestamp}
-        doc_ref = db.collection(
-            "artifacts", app_id, "users", user_id, "alerts"
-        ).document(alert.timestamp)
-
-        # Run the blocking Firestore set in a thread
-        await asyncio.to_thread(doc_ref.set, alert.model_dump())
-        logger.info(f"🚨 Saved CRITICAL ALERT to Firestore: {alert.event_type}")
-    except Exception as e:
-        error_msg = str(e)
-        if "Invalid JWT Signature" in error_msg or "invalid_grant" in error_msg:
-            logger.error(f"🔴 FIRESTORE WRITE FAILED - Invalid service account key")
-            logger.error(f"💡 Download fresh key from: https://console.firebase.google.com/project/stance-sense-qwerty/settings/serviceaccounts/adminsdk")
-            logger.warning(f"🎮 Continuing in DEMO MODE - AI analysis still works!")
-            # Disable future Firestore operations
-            global _db
-            _db = None
-        else:
-            logger.error(f"❌ Error saving alert: {e}")
 
+    # Path: /artifacts/{appId}/users/{userId}/alerts/{timestamp}
+    doc_ref = db.collection(
+        "artifacts", app_id, "users", user_id, "alerts"
+    ).document(alert.timestamp)
+
+    if firestore_writer.set(doc_ref, payload if payload is not None else alert.model_dump(), urgent=True):
+        logger.info(f"🚨 Queued CRITICAL ALERT for Firestore: {alert.event_type}")
+
+
+# Shared write-behind writer for all ingest-path Firestore writes
+firestore_writer = WriteBehindWriter(
+    get_firestore_db,
+    max_batch=settings.FIRESTORE_WRITE_BATCH_SIZE,
+    flush_interval=settings.FIRESTORE_FLUSH_INTERVAL,
+    max_pending=settings.FIRESTORE_WRITE_MAX_PENDING,
+)
+
+
+def raw_packet_record(user_id: str, doc_id: str, data: DeviceData) -> bytes:
+    """Encode a raw packet as a write-ahead log record."""
+    return json.dumps({"uid": user_id, "doc_id": doc_id, "packet": data.model_dump()}, separators=(",", ":")).encode("utf-8")
+
+async def store_raw_packet_records(records: list) -> bool:
+    """
+    WAL replication sink: write logged raw packets to their sensor_data documents.
+
+    Returns False (keep the records and retry later) while Firestore is
+    unavailable. Document ids come from the log, so a replayed batch
+    overwrites the same documents instead of duplicating them.
+    """
+    db = get_firestore_db()
+    if not db:
+        events.warning_limited("firestore.demo_mode_skip", op="wal_replication")
+        return False
+
+    def commit():
+        for start in range(0, len(records), FIRESTORE_MAX_BATCH_OPS):
+            batch = db.batch()
+            for raw in records[start:start + FIRESTORE_MAX_BATCH_OPS]:
+                record = json.loads(raw)
+                # Path: /artifacts/{appId}/users/{userId}/sensor_data/{docId}
+                doc_ref = db.collection(
+                    "artifacts", "stancesense", "users", record["uid"], "sensor_data"
+                ).document(record["doc_id"])
+                batch.set(doc_ref, record["packet"])
+            batch.commit()
+
+    await asyncio.to_thread(commit)
+    return True
+
+
+# Background copy of the raw packet log to Firestore (None when WAL_ENABLED is off)
+wal_replicator = WalReplicator(
+    packet_wal,
+    store_raw_packet_records,
+    batch_size=settings.WAL_REPLICATE_BATCH,
+    poll_interval=settings.WAL_REPLICATE_INTERVAL,
+) if packet_wal else None
@@ -1,4 +1,13 @@
+from ..config import settings
+from .pubsub import create_bus
 from .websocket_manager import ConnectionManager
 
 # Single shared ConnectionManager for the application
-frontend_manager = ConnectionManager()
+frontend_manager = ConnectionManager(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    max_alerts=settings.WS_ALERT_QUEUE_SIZE,
+    policy=settings.WS_SLOW_CLIENT_POLICY,
+    send_timeout=settings.WS_SEND_TIMEOUT,
+    max_rate_hz=settings.WS_MAX_UPDATE_HZ,
+    bus=create_bus(settings.PUBSUB_URL, settings.PUBSUB_CHANNEL),
+)
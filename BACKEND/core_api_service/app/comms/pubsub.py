@@ -0,0 +1,392 @@
+# File: BACKEND/core_api_service/app/comms/pubsub.py
+#
+# Publish/subscribe bus between the frontend ConnectionManagers of the API
+# workers. Every message published by any worker is handed to every worker's
+# manager, which delivers it to its own WebSocket connections only, so a
+# packet ingested by one worker reaches dashboards connected to any other.
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Callable, Deque, List, Optional, Union
+from urllib.parse import unquote, urlsplit
+
+from ..logging_setup import get_event_logger
+
+logger = logging.getLogger(__name__)
+events = get_event_logger(__name__)
+
+# What a bus message asks the receiving managers to do
+PUBLISH = "publish"      # ConnectionManager.publish: the subscribers of (user id, type)
+STATE = "state"          # ConnectionManager.publish_state: rate limited / delta-encoded stream state
+BROADCAST = "broadcast"  # ConnectionManager.broadcast: every connection
+KINDS = (PUBLISH, STATE, BROADCAST)
+
+# Pending PUBLISH bytes on the broker connection before `publish` waits for them to drain
+_PUBLISH_HIGH_WATER = 1 << 20
+
+
+class BusMessage:
+    """
+    One frontend message on the bus: the message text plus what the
+    receiving managers need to route it (`user_id`, `msg_type`, `priority`,
+    `key`).
+
+    The text is given as a string or as a callable rendering it, called at
+    most once: in-process it only runs if some connection sends the message,
+    across processes it runs when the message is encoded. `state()` is the
+    message's ``data`` object, for `STATE` messages.
+    """
+
+    __slots__ = ("kind", "user_id", "msg_type", "priority", "key", "_render", "_text", "_state_fn", "_state")
+
+    def __init__(
+        self,
+        kind: str,
+        message: Union[str, Callable[[], str]],
+        user_id: Optional[str] = None,
+        msg_type: Optional[str] = None,
+        priority: bool = False,
+        key: Optional[str] = None,
+        state: Optional[Callable[[], dict]] = None,
+    ):
+        self.kind = kind
+        self.user_id = user_id
+        self.msg_type = msg_type
+        self.priority = priority
+        self.key = key
+        self._render = None if isinstance(message, str) else message
+        self._text: Optional[str] = message if isinstance(message, str) else None
+        self._state_fn = state
+        self._state: Optional[dict] = None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._render()
+            self._render = None
+        return self._text
+
+    def state(self) -> dict:
+        if self._state is None:
+            self._state = self._state_fn() if self._state_fn is not None else json.loads(self.text())["data"]
+        return self._state
+
+    def encode(self) -> bytes:
+        """``<JSON routing header>\\n<message text>`` (the header never contains a newline)."""
+        header = json.dumps([self.kind, self.user_id, self.msg_type, self.priority, self.key], separators=(",", ":"))
+        return header.encode("ascii") + b"\n" + self.text().encode("utf-8")
+
+    @classmethod
+    def decode(cls, payload: bytes) -> "BusMessage":
+        """Inverse of `encode`; `state()` is parsed from the text when first needed."""
+        header, sep, body = payload.partition(b"\n")
+        if not sep:
+            raise ValueError("bus message without a routing header")
+        kind, user_id, msg_type, priority, key = json.loads(header)
+        if kind not in KINDS:
+            raise ValueError(f"unknown bus message kind {kind!r}")
+        return cls(kind, body.decode("utf-8"), user_id=user_id, msg_type=msg_type, priority=bool(priority), key=key)
+
+
+Handler = Callable[[BusMessage], None]
+
+
+class PubSubBus:
+    """
+    Interface of a frontend message bus.
+
+    Managers register a handler with `subscribe`; `publish` hands a message
+    to the handlers of every worker (this one included). Handlers run on
+    the event loop and must not block.
+    """
+
+    backend = "none"
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, handler: Handler):
+        self._handlers.append(handler)
+
+    def _dispatch(self, message: BusMessage):
+        self.received += 1
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                events.error("pubsub.handler_failed", error=e)
+
+    async def start(self):
+        """Connect to the broker, if any."""
+
+    async def publish(self, message: BusMessage):
+        raise NotImplementedError
+
+    async def close(self):
+        """Stop receiving and disconnect."""
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "published": self.published, "received": self.received}
+
+
+class InProcessBus(PubSubBus):
+    """Delivers straight to the handlers in this process (a single worker)."""
+
+    backend = "memory"
+
+    async def publish(self, message: BusMessage):
+        self.published += 1
+        self._dispatch(message)
+
+
+class RespError(Exception):
+    """An error reply from the broker."""
+
+
+def _command(*args: Union[str, bytes]) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        raw = arg.encode("utf-8") if isinstance(arg, str) else arg
+        out.append(b"$%d\r\n" % len(raw))
+        out.append(raw)
+        out.append(b"\r\n")
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    """Read one RESP value; error replies are returned as `RespError`."""
+    line = await reader.readuntil(b"\r\n")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest
+    if prefix == b"-":
+        return RespError(rest.decode("utf-8", "replace"))
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if prefix in (b"*", b">"):
+        size = int(rest)
+        if size < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(size)]
+    raise ConnectionError(f"unexpected RESP reply {line[:32]!r}")
+
+
+class RespBus(PubSubBus):
+    """
+    A bus over a Redis-protocol broker (Redis, Valkey, KeyDB, or
+    ``tools/resp_broker.py`` for local runs), on TCP
+    (``redis://[[username]:password@]host[:port]``) or a Unix socket
+    (``unix:///path/to.sock``).
+
+    Each worker keeps two connections: one issuing PUBLISH on `channel` and
+    one SUBSCRIBEd to it, through which every worker's messages (its own
+    included) reach the local handlers, in publication order per worker.
+    Both reconnect with backoff. While the subscription is down a published
+    message is also delivered locally, so this worker's dashboards keep
+    receiving its own packets; while the publishing connection is down it is
+    delivered locally only. Messages published during an outage are not
+    buffered: the dashboards' next update supersedes what was missed. Those
+    already queued on a publishing connection that drops are resent once it
+    is back, up to `max_retry` of them; older ones are dropped and counted.
+    """
+
+    backend = "resp"
+
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 10.0,
+        max_retry: int = 1000,
+    ):
+        super().__init__()
+        parts = urlsplit(url)
+        if parts.scheme == "unix":
+            self._address = ("unix", parts.path)
+        elif parts.scheme == "redis":
+            self._address = ("tcp", (parts.hostname or "localhost", parts.port or 6379))
+        else:
+            raise ValueError(f"unsupported pub/sub URL scheme {parts.scheme!r} (expected redis:// or unix://)")
+        if not self._address[1]:
+            raise ValueError(f"pub/sub URL {url!r} has no socket path")
+        self._username = unquote(parts.username) if parts.username else None
+        self._password = unquote(parts.password) if parts.password else None
+        self.channel = channel
+        self._publish_prefix = b"*3\r\n$7\r\nPUBLISH\r\n" + b"$%d\r\n%s\r\n" % (len(channel.encode()), channel.encode())
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._publisher: Optional[asyncio.StreamWriter] = None
+        self._pending: List[bytes] = []
+        # PUBLISH frames whose connection dropped before they were written
+        self._retry: Deque[bytes] = deque()
+        self.max_retry = max(0, int(max_retry))
+        self._subscribed = False
+        self._tasks: List[asyncio.Task] = []
+        self.local_fallbacks = 0
+        self.decode_errors = 0
+        self.reconnects = 0
+        self.retried = 0
+        self.dropped = 0
+        self.last_receivers: Optional[int] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._publisher is not None and self._subscribed
+
+    async def _connect(self):
+        kind, address = self._address
+        if kind == "unix":
+            reader, writer = await asyncio.open_unix_connection(address)
+        else:
+            reader, writer = await asyncio.open_connection(*address)
+        if self._password is not None:
+            # Redis 6 ACL users authenticate with AUTH <username> <password>
+            auth = ("AUTH", self._username, self._password) if self._username else ("AUTH", self._password)
+            writer.write(_command(*auth))
+            reply = await _read_reply(reader)
+            if isinstance(reply, RespError):
+                writer.close()
+                raise ConnectionError(f"broker refused AUTH: {reply}")
+        return reader, writer
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._run("publisher", self._publish_session)),
+            asyncio.create_task(self._run("subscriber", self._subscribe_session)),
+        ]
+
+    async def _run(self, name: str, session):
+        """Keep one connection up, reconnecting with exponential backoff."""
+        delay = self.reconnect_delay
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                delay = self.reconnect_delay
+                await session(reader, writer)
+                raise ConnectionError("broker closed the connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reconnects += 1
+                events.warning_limited(f"pubsub.{name}_down", error=e, retry_in=delay)
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _publish_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._publisher = writer
+        events.info("pubsub.publisher_connected", channel=self.channel, resent=len(self._retry))
+        if self._retry:
+            self.retried += len(self._retry)
+            writer.write(b"".join(self._retry))
+            self._retry.clear()
+        try:
+            # PUBLISH replies: the number of workers that received the message
+            while True:
+                reply = await _read_reply(reader)
+                if isinstance(reply, RespError):
+                    events.warning_limited("pubsub.publish_rejected", error=reply)
+                else:
+                    self.last_receivers = reply
+        finally:
+            self._publisher = None
+
+    async def _subscribe_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(_command("SUBSCRIBE", self.channel))
+        reply = await _read_reply(reader)
+        if not isinstance(reply, list) or reply[:1] != [b"subscribe"]:
+            raise ConnectionError(f"unexpected SUBSCRIBE reply {reply!r}")
+        self._subscribed = True
+        events.info("pubsub.subscribed", channel=self.channel)
+        try:
+            while True:
+                reply = await _read_reply(reader)
+                if not isinstance(reply, list) or len(reply) != 3 or reply[0] != b"message":
+                    continue
+                try:
+                    message = BusMessage.decode(reply[2])
+                except (ValueError, UnicodeDecodeError) as e:
+                    self.decode_errors += 1
+                    events.warning_limited("pubsub.bad_message", error=e)
+                    continue
+                self._dispatch(message)
+        finally:
+            self._subscribed = False
+
+    async def publish(self, message: BusMessage):
+        publisher = self._publisher
+        if publisher is not None:
+            payload = message.encode()
+            # Commands issued in one event loop turn go out in one write (one syscall)
+            if not self._pending:
+                asyncio.get_running_loop().call_soon(self._flush)
+            self._pending.append(self._publish_prefix + b"$%d\r\n" % len(payload) + payload + b"\r\n")
+            self.published += 1
+            if publisher.transport.get_write_buffer_size() > _PUBLISH_HIGH_WATER:
+                self._flush()
+                try:
+                    await publisher.drain()
+                except ConnectionError:
+                    pass
+        if publisher is None or not self._subscribed:
+            # Not coming back through the broker: at least this worker's dashboards get it
+            self.local_fallbacks += 1
+            self._dispatch(message)
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        publisher = self._publisher
+        if publisher is not None and not publisher.is_closing():
+            publisher.write(b"".join(pending))
+            return
+        # The connection dropped after these were queued: resend them on reconnect
+        self._retry.extend(pending)
+        overflow = len(self._retry) - self.max_retry
+        if overflow > 0:
+            for _ in range(overflow):
+                self._retry.popleft()
+            self.dropped += overflow
+            events.warning_limited("pubsub.messages_dropped", dropped=self.dropped, max_retry=self.max_retry)
+
+    async def close(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "channel": self.channel,
+            "connected": self.connected,
+            "local_fallbacks": self.local_fallbacks,
+            "decode_errors": self.decode_errors,
+            "reconnects": self.reconnects,
+            "retry_backlog": len(self._retry),
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "last_receivers": self.last_receivers,
+        }
+
+
+def create_bus(url: str, channel: str) -> PubSubBus:
+    """The bus for PUBSUB_URL: ``memory://`` (or empty) in-process, else a Redis-protocol broker."""
+    if not url or url.startswith("memory:"):
+        return InProcessBus()
+    return RespBus(url, channel)
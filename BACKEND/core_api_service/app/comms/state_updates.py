@@ -0,0 +1,94 @@
+# File: BACKEND/core_api_service/app/comms/state_updates.py
+#
+# "Latest state" dashboard messages (one device stream's processed_data) and
+# their delta encoding. An update is rendered lazily, so an update that is
+# conflated away before its turn to be sent is never serialized, and every
+# rendering is shared by all the connections that send it.
+
+import json
+from typing import Callable, Dict, Optional
+
+# Sent states kept per stream for a connection that has not acknowledged them yet
+MAX_UNACKED = 8
+
+
+def merge_patch(old: dict, new: dict) -> dict:
+    """JSON merge patch (RFC 7386) turning `old` into `new`.
+
+    Nested dicts are diffed recursively; any other changed value (lists
+    included) is sent whole, and a removed key is sent as null.
+    """
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+            continue
+        before = old[key]
+        if before is value or before == value:
+            continue
+        if isinstance(value, dict) and isinstance(before, dict):
+            patch[key] = merge_patch(before, value)
+        else:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+class StateUpdate:
+    """
+    The newest state of one stream (`key`), version `seq`.
+
+    - `text()`: the plain message, as sent to connections without deltas
+    - `full()`: the plain message plus ``key`` and ``seq``, for connections
+      that acknowledge states to receive deltas
+    - `delta(base_seq, base_state)`: a ``<type>_delta`` message carrying the
+      merge patch from the acknowledged state `base_seq` to this one, or
+      None when nothing changed
+
+    `render` returns the plain message and `state` its ``data`` object; each
+    is called at most once.
+    """
+
+    __slots__ = ("msg_type", "key", "seq", "_render", "_state_fn", "_text", "_state", "_full", "_deltas")
+
+    def __init__(self, msg_type: str, key: str, seq: int, render: Callable[[], str], state: Callable[[], dict]):
+        self.msg_type = msg_type
+        self.key = key
+        self.seq = seq
+        self._render = render
+        self._state_fn = state
+        self._text: Optional[str] = None
+        self._state: Optional[dict] = None
+        self._full: Optional[str] = None
+        self._deltas: Dict[int, Optional[str]] = {}
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def state(self) -> dict:
+        if self._state is None:
+            self._state = self._state_fn()
+        return self._state
+
+    def full(self) -> str:
+        if self._full is None:
+            # Appended to the top-level object: {"type":...,"data":{...},"key":...,"seq":N}
+            self._full = f'{self.text()[:-1]},"key":{json.dumps(self.key)},"seq":{self.seq}}}'
+        return self._full
+
+    def delta(self, base_seq: int, base_state: dict) -> Optional[str]:
+        # Connections that acknowledged the same state share one encoding
+        if base_seq not in self._deltas:
+            patch = merge_patch(base_state, self.state())
+            self._deltas[base_seq] = json.dumps({
+                "type": f"{self.msg_type}_delta",
+                "key": self.key,
+                "seq": self.seq,
+                "base": base_seq,
+                "data": patch,
+            }) if patch else None
+        return self._deltas[base_seq]
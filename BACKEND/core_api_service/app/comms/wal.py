@@ -0,0 +1,548 @@
+# File: BACKEND/core_api_service/app/comms/wal.py
+#
+# Append-only, segment-rotated write-ahead log for accepted packets.
+#
+# The log is a directory of segment files named by a 20-digit sequence number
+# (00000000000000000001.wal, ...). A segment is a concatenation of records:
+#
+#   offset  type     field
+#   0       u32      payload length
+#   4       u32      crc32 of payload
+#   8       bytes    payload
+#
+# Appends go to the newest segment and are fsync'd before they are reported
+# durable; once a segment exceeds `segment_bytes` a new one is started. A torn
+# record at the end of the newest segment (crash mid-write) is truncated when
+# the log is opened. Positions in the log are `(segment, offset)` pairs, and
+# `checkpoint.json` records how far a `WalReplicator` has copied the log to the
+# storage backend; segments entirely before the checkpoint are deleted.
+#
+# A log directory belongs to one process, held with an exclusive flock on its
+# LOCK file. Workers sharing WAL_DIR each take the first free one: WAL_DIR
+# itself, then WAL_DIR/worker-1, WAL_DIR/worker-2, ...; a worker restarted
+# after exiting takes its slot (and its log) back. When fewer workers come
+# back than there were, the extra worker-N logs have no owner: each
+# replicator locks the ones nobody holds when it starts, replicates them to
+# the end and then deletes them.
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so one process per WAL_DIR
+    fcntl = None
+
+from ..config import settings
+from ..logging_setup import get_event_logger
+from ..samples import SAMPLE_WINDOW, summarize
+
+logger = logging.getLogger(__name__)
+events = get_event_logger(__name__)
+
+DEFAULT_WAL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "wal"))
+
+_HEADER = struct.Struct("<II")
+_SEGMENT_SUFFIX = ".wal"
+_CHECKPOINT_FILE = "checkpoint.json"
+_LOCK_FILE = "LOCK"
+
+Position = Tuple[int, int]
+
+
+def _segment_name(segment: int) -> str:
+    return f"{segment:020d}{_SEGMENT_SUFFIX}"
+
+
+class WriteAheadLog:
+    """
+    Durable local log of raw packet records.
+
+    `append` is a coroutine that returns once the records are on disk.
+    Concurrent appends are group-committed: whatever arrives while one
+    write+fsync is in flight is written with a single fsync afterwards, so
+    the disk sync cost is shared across requests. File I/O runs in a worker
+    thread.
+
+    `max_bytes` bounds the disk used while the backend is unreachable; past
+    it the oldest segments are dropped (and logged) rather than filling the
+    disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_bytes: int = 1024 * 1024 * 1024,
+        fsync: bool = True,
+    ):
+        self.base_directory = directory
+        # The directory actually in use, set when `open` has locked one
+        self.directory = directory
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.max_bytes = max(self.segment_bytes, int(max_bytes))
+        self.fsync = bool(fsync)
+        self._lock = threading.Lock()
+        self._segments: List[int] = []
+        self._sizes: dict = {}
+        self._file = None
+        self._lock_file = None
+        self._opened = False
+        self._waiting: List[Tuple[List[bytes], asyncio.Future]] = []
+        self._syncing = False
+        self._appended = 0
+        self._syncs = 0
+        self._dropped_segments = 0
+        self._dropped_bytes = 0
+        self._sync_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._group_sizes = deque(maxlen=SAMPLE_WINDOW)
+
+    # --- Opening and recovery ---
+
+    def open(self):
+        """Open the log, recovering from a torn tail. Safe to call more than once."""
+        with self._lock:
+            if self._opened:
+                return
+            self._load(self._claim_directory())
+        logger.info("Write-ahead log opened at %s: %d segments, %d bytes", self.directory, len(self._segments), self.total_bytes())
+
+    def _load(self, directory: str):
+        self.directory = directory
+        self._segments = sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(_SEGMENT_SUFFIX) and name[:-len(_SEGMENT_SUFFIX)].isdigit()
+        )
+        for segment in self._segments:
+            self._sizes[segment] = os.path.getsize(self._path(segment))
+        if self._segments:
+            self._recover_tail(self._segments[-1])
+        else:
+            self._segments.append(1)
+            self._sizes[1] = 0
+        self._file = open(self._path(self._segments[-1]), "ab")
+        self._opened = True
+
+    def _claim_directory(self) -> str:
+        """Lock and return the first log directory no other process holds."""
+        slot = 0
+        while True:
+            directory = self.base_directory if slot == 0 else os.path.join(self.base_directory, f"worker-{slot}")
+            os.makedirs(directory, exist_ok=True)
+            if fcntl is None or self._try_lock(directory):
+                return directory
+            slot += 1
+
+    def _try_lock(self, directory: str) -> bool:
+        lock_path = os.path.join(directory, _LOCK_FILE)
+        try:
+            lock_file = open(lock_path, "ab")
+        except FileNotFoundError:  # removed by `remove` meanwhile
+            return False
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # The holder may have removed the log between our open and flock
+            held = os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except (BlockingIOError, FileNotFoundError):
+            held = False
+        if not held:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def orphaned_logs(self) -> List["WriteAheadLog"]:
+        """Lock and open the worker-N logs under the base directory that no process holds.
+
+        The caller owns the returned logs: replicate each to its end, then
+        `remove` it (or `close` it to leave it for the next start).
+        """
+        if fcntl is None or not self._opened:
+            return []
+        logs = []
+        for name in sorted(os.listdir(self.base_directory)):
+            directory = os.path.join(self.base_directory, name)
+            if not name.startswith("worker-") or directory == self.directory or not os.path.isdir(directory):
+                continue
+            log = WriteAheadLog(directory, segment_bytes=self.segment_bytes, max_bytes=self.max_bytes, fsync=self.fsync)
+            with log._lock:
+                if not log._try_lock(directory):
+                    continue
+                log._load(directory)
+            logs.append(log)
+        return logs
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, _segment_name(segment))
+
+    def _recover_tail(self, segment: int):
+        """Truncate a partially written or corrupt record at the end of `segment`."""
+        path = self._path(segment)
+        with open(path, "rb") as f:
+            data = f.read()
+        valid = 0
+        while valid + _HEADER.size <= len(data):
+            length, crc = _HEADER.unpack_from(data, valid)
+            end = valid + _HEADER.size + length
+            if end > len(data) or zlib.crc32(data[valid + _HEADER.size:end]) != crc:
+                break
+            valid = end
+        if valid != len(data):
+            logger.warning("Write-ahead log: truncating %d torn bytes at the end of %s", len(data) - valid, _segment_name(segment))
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+                f.flush()
+                os.fsync(f.fileno())
+        self._sizes[segment] = valid
+
+    # --- Appending ---
+
+    async def append(self, payloads: List[bytes]):
+        """Append `payloads` and return once they are durable.
+
+        Raises `OSError` if the records could not be written.
+        """
+        if not payloads:
+            return
+        if not self._opened:
+            await asyncio.to_thread(self.open)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((payloads, future))
+        if not self._syncing:
+            self._syncing = True
+            asyncio.create_task(self._group_commit())
+        await future
+
+    async def _group_commit(self):
+        try:
+            while self._waiting:
+                waiting, self._waiting = self._waiting, []
+                payloads = [p for batch, _ in waiting for p in batch]
+                try:
+                    await asyncio.to_thread(self._write, payloads)
+                except Exception as e:
+                    for _, future in waiting:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for _, future in waiting:
+                    if not future.done():
+                        future.set_result(None)
+        finally:
+            self._syncing = False
+
+    def _write(self, payloads: List[bytes]):
+        started = time.monotonic()
+        with self._lock:
+            buf = bytearray()
+            for payload in payloads:
+                buf += _HEADER.pack(len(payload), zlib.crc32(payload))
+                buf += payload
+            segment = self._segments[-1]
+            try:
+                self._file.write(buf)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError:
+                # Do not leave a half-written group behind the durable end
+                self._file.truncate(self._sizes[segment])
+                raise
+            self._sizes[segment] += len(buf)
+            self._appended += len(payloads)
+            self._syncs += 1
+            if self._sizes[segment] >= self.segment_bytes:
+                self._rotate()
+            self._enforce_max_bytes()
+        self._sync_samples.append(time.monotonic() - started)
+        self._group_sizes.append(len(payloads))
+
+    def _rotate(self):
+        self._file.close()
+        segment = self._segments[-1] + 1
+        self._segments.append(segment)
+        self._sizes[segment] = 0
+        self._file = open(self._path(segment), "ab")
+
+    def _enforce_max_bytes(self):
+        while len(self._segments) > 1 and sum(self._sizes.values()) > self.max_bytes:
+            segment = self._segments.pop(0)
+            size = self._sizes.pop(segment)
+            self._dropped_segments += 1
+            self._dropped_bytes += size
+            events.error("wal.segment_dropped", segment=segment, bytes=size, reason="max_bytes")
+            try:
+                os.remove(self._path(segment))
+            except OSError:
+                pass
+
+    # --- Reading and checkpoints ---
+
+    @property
+    def opened(self) -> bool:
+        return self._opened
+
+    def end_position(self) -> Position:
+        with self._lock:
+            segment = self._segments[-1]
+            return segment, self._sizes[segment]
+
+    def read(self, position: Position, max_records: int) -> Tuple[List[bytes], Position]:
+        """Read up to `max_records` durable records from `position`.
+
+        Returns the payloads and the position just after the last one.
+        Position skips forward past segments that have been dropped.
+        """
+        with self._lock:
+            segments = list(self._segments)
+            end = (segments[-1], self._sizes[segments[-1]])
+        segment, offset = position
+        if segment < segments[0]:
+            segment, offset = segments[0], 0
+        records: List[bytes] = []
+        while len(records) < max_records and (segment, offset) < end:
+            limit = end[1] if segment == end[0] else None
+            try:
+                with open(self._path(segment), "rb") as f:
+                    f.seek(offset)
+                    data = f.read() if limit is None else f.read(limit - offset)
+            except FileNotFoundError:
+                data = b""
+            pos = 0
+            while len(records) < max_records and pos + _HEADER.size <= len(data):
+                length, crc = _HEADER.unpack_from(data, pos)
+                body = data[pos + _HEADER.size:pos + _HEADER.size + length]
+                if len(body) != length or zlib.crc32(body) != crc:
+                    events.error("wal.corrupt_record", segment=segment, offset=offset + pos)
+                    pos = len(data)
+                    break
+                records.append(bytes(body))
+                pos += _HEADER.size + length
+            offset += pos
+            if len(records) < max_records and segment != end[0]:
+                # Sealed segment fully consumed
+                segment, offset = next(s for s in segments if s > segment), 0
+        return records, (segment, offset)
+
+    def load_checkpoint(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, _CHECKPOINT_FILE)) as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def save_checkpoint(self, position: Position):
+        """Atomically record `position` and delete segments that are fully behind it."""
+        path = os.path.join(self.directory, _CHECKPOINT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": position[0], "offset": position[1]}, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        with self._lock:
+            while len(self._segments) > 1 and self._segments[0] < position[0]:
+                segment = self._segments.pop(0)
+                self._sizes.pop(segment, None)
+                try:
+                    os.remove(self._path(segment))
+                except OSError:
+                    pass
+
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            if self._lock_file:
+                # Closing the descriptor releases the flock
+                self._lock_file.close()
+                self._lock_file = None
+            self._opened = False
+
+    def remove(self):
+        """Close the log and delete its directory, unreplicated records included."""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            for name in os.listdir(self.directory):
+                if name != _LOCK_FILE:
+                    os.remove(os.path.join(self.directory, name))
+            # Unlinked while still locked, so nobody can lock the old file and use the slot
+            os.remove(os.path.join(self.directory, _LOCK_FILE))
+            os.rmdir(self.directory)
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
+            self._segments = []
+            self._sizes = {}
+            self._opened = False
+
+    def stats(self) -> dict:
+        groups = self._group_sizes
+        return {
+            "directory": self.directory,
+            "segments": len(self._segments),
+            "bytes": self.total_bytes(),
+            "appended": self._appended,
+            "syncs": self._syncs,
+            "records_per_sync": round(sum(groups) / len(groups), 3) if groups else 0.0,
+            "dropped_segments": self._dropped_segments,
+            "dropped_bytes": self._dropped_bytes,
+            "sync": summarize(self._sync_samples),
+        }
+
+
+class WalReplicator:
+    """
+    Copies log records to the storage backend in the background.
+
+    Reads up to `batch_size` records from the checkpoint and hands them to
+    `sink`, a coroutine returning True once they are stored. Only then does
+    the checkpoint advance, so records survive restarts and backend outages
+    (delivery is at-least-once; sinks should write idempotently). Failures
+    back off exponentially up to `max_backoff` seconds.
+
+    Orphaned worker-N logs found at start (see `WriteAheadLog.orphaned_logs`)
+    are replicated first, and each is deleted once its checkpoint reaches
+    its end.
+    """
+
+    def __init__(
+        self,
+        wal: WriteAheadLog,
+        sink: Callable[[List[bytes]], Awaitable[bool]],
+        batch_size: int = 500,
+        poll_interval: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.wal = wal
+        self.sink = sink
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = float(poll_interval)
+        self.max_backoff = float(max_backoff)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._position: Position = (0, 0)
+        self._orphans: List[WriteAheadLog] = []
+        self._orphans_drained = 0
+        self._replicated = 0
+        self._failures = 0
+        self._batch_samples = deque(maxlen=SAMPLE_WINDOW)
+
+    async def start(self):
+        """Resume from the saved checkpoint. Safe to call more than once."""
+        if self._task:
+            return
+        await asyncio.to_thread(self.wal.open)
+        self._position = self.wal.load_checkpoint()
+        self._orphans = await asyncio.to_thread(self.wal.orphaned_logs)
+        for log in self._orphans:
+            events.warning("wal.orphan_adopted", directory=log.directory, bytes=log.total_bytes())
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("WAL replicator started at segment %d offset %d", *self._position)
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while self._orphans and not self._stopping.is_set():
+            log = self._orphans[0]
+            if not await self._replicate(log, log.load_checkpoint(), drain=True):
+                break
+            await asyncio.to_thread(log.remove)
+            self._orphans.pop(0)
+            self._orphans_drained += 1
+            events.info("wal.orphan_drained", directory=log.directory)
+        await self._replicate(self.wal, self._position)
+
+    async def _replicate(self, wal: WriteAheadLog, position: Position, drain: bool = False) -> bool:
+        """Copy `wal` from `position` until stopped, or with `drain` until its end.
+
+        Returns True if `wal` was replicated to its end.
+        """
+        backoff = self.poll_interval
+        while not self._stopping.is_set():
+            records, next_position = await asyncio.to_thread(wal.read, position, self.batch_size)
+            if not records:
+                if next_position != position:
+                    # Skipped past dropped or corrupt data
+                    position = next_position
+                    await asyncio.to_thread(wal.save_checkpoint, next_position)
+                if drain and position >= wal.end_position():
+                    return True
+                await self._sleep(self.poll_interval)
+                continue
+            started = time.monotonic()
+            try:
+                stored = await self.sink(records)
+            except Exception as e:
+                events.error("wal.replicate_failed", records=len(records), error=e)
+                stored = False
+            if not stored:
+                self._failures += 1
+                await self._sleep(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+            backoff = self.poll_interval
+            self._batch_samples.append(time.monotonic() - started)
+            self._replicated += len(records)
+            position = next_position
+            if wal is self.wal:
+                self._position = position
+            await asyncio.to_thread(wal.save_checkpoint, next_position)
+        return False
+
+    async def close(self, timeout: Optional[float] = None):
+        """Stop replicating; unreplicated records stay in the log for the next start."""
+        if not self._task:
+            return
+        self._stopping.set()
+        done, not_done = await asyncio.wait([self._task], timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        self._task = None
+        # Orphans not yet drained are left, unlocked, for the next start
+        for log in self._orphans:
+            log.close()
+        self._orphans = []
+
+    def stats(self) -> dict:
+        end_segment, end_offset = self.wal.end_position() if self.wal.opened else (0, 0)
+        return {
+            "position": {"segment": self._position[0], "offset": self._position[1]},
+            "end": {"segment": end_segment, "offset": end_offset},
+            "replicated": self._replicated,
+            "failures": self._failures,
+            "orphans_pending": len(self._orphans),
+            "orphans_drained": self._orphans_drained,
+            "batch": summarize(self._batch_samples),
+        }
+
+
+# Shared log for raw ingest packets (None when WAL_ENABLED is off)
+packet_wal: Optional[WriteAheadLog] = WriteAheadLog(
+    settings.WAL_DIR or DEFAULT_WAL_DIR,
+    segment_bytes=settings.WAL_SEGMENT_BYTES,
+    max_bytes=settings.WAL_MAX_BYTES,
+    fsync=settings.WAL_FSYNC,
+) if settings.WAL_ENABLED else None
@@ -1,46 +1,543 @@
 # File: BACKEND/core_api_service/app/comms/websocket_manager.py
 
-from fastapi import WebSocket
+import asyncio
+import itertools
+import json
 import logging
-from typing import List
+from collections import OrderedDict, deque
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from ..logging_setup import get_event_logger
+from ..metrics import WS_MESSAGES
+from .pubsub import BROADCAST, PUBLISH, STATE, BusMessage, InProcessBus, PubSubBus
+from .state_updates import MAX_UNACKED, StateUpdate
 
 logger = logging.getLogger(__name__)
+events = get_event_logger(__name__)
+
+# What to do with a slow client whose data queue is full
+DROP = "drop"          # drop its oldest queued data message
+CONFLATE = "conflate"  # keep only the latest queued message per key, then drop oldest
+DISCONNECT = "disconnect"  # evict the client
+POLICIES = (DROP, CONFLATE, DISCONNECT)
+
+# Message types a dashboard can subscribe to
+MESSAGE_TYPES = ("processed_data", "alert", "rag_analysis")
+# Subscription user id matching every user (only for clients allowed to see all users)
+ALL_USERS = "*"
+
+Topic = Tuple[str, str]
+
+
+class SubscriptionError(Exception):
+    """A subscribe/unsubscribe request that is malformed or not allowed."""
+
+
+class _Client:
+    """One connection's outbound queues and writer task.
+
+    Alerts and data messages are queued separately; the writer always sends
+    queued alerts first. Data messages live in an insertion-ordered dict so a
+    message with a conflation key can replace its queued predecessor in place.
+
+    State updates are additionally rate limited per stream: one that arrives
+    within `min_interval` of the stream's last one is held in `held` (newer
+    ones replace it) until the interval has passed. With `deltas` on, the
+    states sent but not yet acknowledged are kept in `unacked` and the last
+    acknowledged one in `acked`, per stream.
+    """
+
+    __slots__ = (
+        "websocket", "user_id", "allowed_users", "topics", "alerts", "data", "wakeup", "task", "closed",
+        "min_interval", "next_send", "held", "deltas", "unacked", "acked",
+    )
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[str], allowed_users: Optional[FrozenSet[str]], min_interval: float):
+        self.websocket = websocket
+        self.user_id = user_id
+        # None: may subscribe to any user (anonymous demo dashboards)
+        self.allowed_users = allowed_users
+        self.topics: Set[Topic] = set()
+        self.alerts: deque = deque()
+        self.data: "OrderedDict[object, object]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.min_interval = min_interval
+        self.next_send: Dict[str, float] = {}
+        self.held: Dict[str, StateUpdate] = {}
+        self.deltas = False
+        self.unacked: Dict[str, "OrderedDict[int, dict]"] = {}
+        self.acked: Dict[str, Tuple[int, dict]] = {}
+
+    @property
+    def queued(self) -> int:
+        return len(self.alerts) + len(self.data)
+
 
 class ConnectionManager:
     """
     Manages active WebSocket connections for the frontend.
+
+    Connections subscribe to topics, a (user id, message type) pair, and
+    `publish` enqueues a message only for the connections subscribed to its
+    topic, found through a topic -> connections index. A connection starts
+    subscribed to every message type of the users it is allowed to see and
+    can narrow or change that with JSON text messages::
+
+        {"action": "subscribe", "user_ids": ["<uid>"], "types": ["alert"]}
+        {"action": "unsubscribe", "user_ids": ["<uid>"]}
+
+    Omitted ``types`` means all of `MESSAGE_TYPES`, omitted ``user_ids`` all
+    of the connection's allowed users. Each request is answered with the
+    resulting ``subscriptions`` (or an ``error``) message.
+
+    Per-device ``processed_data`` goes through `publish_state`: a
+    connection gets at most `max_rate_hz` updates per device stream, the
+    latest winning (alerts are never held back). A subscribe request may
+    lower that rate with ``"max_rate_hz"`` and opt into deltas with
+    ``"deltas": true``; full updates then carry ``key`` and ``seq``, the
+    client acknowledges the ones it has applied with
+    ``{"action": "ack", "key": ..., "seq": N}``, and later updates of that
+    stream arrive as ``processed_data_delta`` messages holding the JSON
+    merge patch (RFC 7386) from the acknowledged state ``base``.
+
+    `publish` and `broadcast` only enqueue: each connection has its own bounded outbound
+    queue drained by its own writer task, so a slow or stalled dashboard
+    never delays the others, or the ingest pipeline that broadcasts.
+    Priority messages (alerts) are sent before any queued data message.
+
+    A client whose data queue is full is handled by `policy`: ``drop`` its
+    oldest queued message, ``conflate`` (replace a queued message with the
+    same `key` by the newer one, otherwise drop the oldest) or
+    ``disconnect`` it. Alerts are never dropped; a client that cannot keep
+    `max_alerts` of them queued is disconnected. A connection whose send
+    fails, or takes longer than `send_timeout`, is evicted.
+
+    `publish`, `publish_state` and `broadcast` go through `bus`, which hands
+    them to the manager of every worker; each delivers to its own
+    connections only. The default in-process bus delivers straight to this
+    manager, keeping state updates rendered only when sent.
     """
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
 
-    async def connect(self, websocket: WebSocket):
-        """Accepts a new WebSocket connection."""
+    def __init__(
+        self,
+        max_queue: int = 256,
+        max_alerts: int = 64,
+        policy: str = CONFLATE,
+        send_timeout: float = 5.0,
+        max_rate_hz: float = 0.0,
+        bus: Optional[PubSubBus] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow client policy {policy!r} (expected one of {', '.join(POLICIES)})")
+        self.max_queue = max(1, int(max_queue))
+        self.max_alerts = max(1, int(max_alerts))
+        self.policy = policy
+        self.send_timeout = float(send_timeout)
+        # 0: state updates are not rate limited
+        self.max_rate_hz = max(0.0, float(max_rate_hz))
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._ids = itertools.count()
+        self._topics: Dict[Topic, Set[_Client]] = {}
+        self._seqs: Dict[str, int] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self.broadcasts = 0
+        self.published = 0
+        self.deliveries = 0
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.held_back = 0
+        self.deltas_sent = 0
+        self.bytes_sent = 0
+        self.evicted = 0
+        self.bus = bus if bus is not None else InProcessBus()
+        self.bus.subscribe(self._deliver)
+
+    async def start(self):
+        """Connect the bus (startup)."""
+        await self.bus.start()
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self._clients)
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[str] = None, allowed_users: Optional[Iterable[str]] = None):
+        """Accepts a new WebSocket connection and starts its writer.
+
+        `allowed_users` are the user ids the (already authenticated) client
+        may subscribe to, None for any. It starts subscribed to all of them,
+        or to `ALL_USERS`.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"New frontend connection. Total: {len(self.active_connections)}")
+        allowed = frozenset(allowed_users) if allowed_users is not None else None
+        client = _Client(websocket, user_id, allowed, self._min_interval(None))
+        client.task = asyncio.create_task(self._writer(client))
+        self._clients[websocket] = client
+        self._subscribe(client, sorted(allowed) if allowed is not None else [ALL_USERS], MESSAGE_TYPES)
+        logger.info(f"New frontend connection. Total: {len(self._clients)}")
 
     def disconnect(self, websocket: WebSocket):
-        """Removes a WebSocket connection."""
-        self.active_connections.remove(websocket)
-        logger.info(f"Frontend disconnected. Total: {len(self.active_connections)}")
+        """Removes a WebSocket connection. Safe to call for an evicted one."""
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return
+        self._stop(client)
+        logger.info(f"Frontend disconnected. Total: {len(self._clients)}")
+
+    def _stop(self, client: _Client):
+        self._unsubscribe(client, list(client.topics))
+        client.closed = True
+        client.alerts.clear()
+        client.data.clear()
+        client.held.clear()
+        client.unacked.clear()
+        client.acked.clear()
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def _evict(self, client: _Client, reason: str):
+        """Drop a dead or hopelessly slow client and close its socket in the background."""
+        if self._clients.get(client.websocket) is not client:
+            return
+        del self._clients[client.websocket]
+        self._stop(client)
+        self.evicted += 1
+        WS_MESSAGES.labels("evicted").inc()
+        events.warning("ws.evicted", reason=reason, clients=len(self._clients))
+        # 1011: server error (send failed), 1008: policy violation (too slow)
+        task = asyncio.create_task(self._close_socket(client.websocket, 1011 if reason == "send_failed" else 1008))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close_socket(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Sends a message to a single WebSocket."""
-        await websocket.send_text(message)
+        """Queues a message for a single WebSocket."""
+        client = self._clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, message, priority=False, key=None)
+
+    def _subscribe(self, client: _Client, user_ids: Iterable[str], types: Iterable[str]) -> int:
+        added = 0
+        for user_id in user_ids:
+            for msg_type in types:
+                topic = (user_id, msg_type)
+                if topic not in client.topics:
+                    client.topics.add(topic)
+                    self._topics.setdefault(topic, set()).add(client)
+                    added += 1
+        return added
+
+    def _unsubscribe(self, client: _Client, topics: Iterable[Topic]):
+        for topic in topics:
+            client.topics.discard(topic)
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def _min_interval(self, requested_hz: Optional[float]) -> float:
+        rate = self.max_rate_hz
+        if requested_hz is not None and requested_hz > 0:
+            # Clients may only ask for fewer updates than the server cap
+            rate = min(rate, requested_hz) if rate else requested_hz
+        return 1.0 / rate if rate else 0.0
+
+    def _apply_options(self, client: _Client, request: dict):
+        if "max_rate_hz" in request:
+            rate = request["max_rate_hz"]
+            if not isinstance(rate, (int, float)) or isinstance(rate, bool) or rate <= 0:
+                raise SubscriptionError("max_rate_hz must be a positive number")
+            client.min_interval = self._min_interval(float(rate))
+        if "deltas" in request:
+            client.deltas = bool(request["deltas"])
+            if not client.deltas:
+                client.unacked.clear()
+                client.acked.clear()
 
-    async def broadcast(self, message: str):
-        """Broadcasts a message to all connected clients."""
-        if not self.active_connections:
-            logger.warning("Broadcast called, but no clients are connected.")
+    def _ack(self, client: _Client, request: dict):
+        key, seq = request.get("key"), request.get("seq")
+        if not isinstance(key, str) or not isinstance(seq, int):
+            raise SubscriptionError("ack needs a stream key and an integer seq")
+        sent = client.unacked.get(key)
+        # Unknown or superseded: the client stays on its previous base
+        if sent is None or seq not in sent:
             return
+        state = sent[seq]
+        for old in [s for s in sent if s <= seq]:
+            del sent[old]
+        client.acked[key] = (seq, state)
 
-        for connection in self.active_connections:
+    def _requested_topics(self, client: _Client, request: dict) -> Tuple[List[str], List[str]]:
+        user_ids = request.get("user_ids")
+        types = request.get("types")
+        if user_ids is None:
+            user_ids = sorted(client.allowed_users) if client.allowed_users is not None else [ALL_USERS]
+        if types is None:
+            types = list(MESSAGE_TYPES)
+        if not isinstance(user_ids, list) or not all(isinstance(u, str) and u for u in user_ids):
+            raise SubscriptionError("user_ids must be a list of user ids")
+        if not isinstance(types, list) or not all(t in MESSAGE_TYPES for t in types):
+            raise SubscriptionError(f"types must be a list drawn from {', '.join(MESSAGE_TYPES)}")
+        if client.allowed_users is not None:
+            denied = [u for u in user_ids if u not in client.allowed_users]
+            if denied:
+                raise SubscriptionError(f"not allowed to subscribe to {', '.join(denied)}")
+        return user_ids, types
+
+    def handle_message(self, websocket: WebSocket, text: str):
+        """Apply a subscribe/unsubscribe request received from `websocket` and queue the reply."""
+        client = self._clients.get(websocket)
+        if client is None:
+            return
+        try:
             try:
-                await connection.send_text(message)
+                request = json.loads(text)
+            except ValueError:
+                raise SubscriptionError("expected a JSON object")
+            if not isinstance(request, dict):
+                raise SubscriptionError("expected a JSON object")
+            action = request.get("action")
+            if action == "ack":
+                # Not answered: acks follow every applied update
+                self._ack(client, request)
+                return
+            if action not in ("subscribe", "unsubscribe"):
+                raise SubscriptionError("action must be 'subscribe', 'unsubscribe' or 'ack'")
+            user_ids, types = self._requested_topics(client, request)
+            self._apply_options(client, request)
+        except SubscriptionError as e:
+            events.warning_limited("ws.subscription_rejected", detail=str(e))
+            reply = {"type": "error", "detail": str(e)}
+        else:
+            if action == "subscribe":
+                self._subscribe(client, user_ids, types)
+            else:
+                self._unsubscribe(client, [(u, t) for u in user_ids for t in types])
+            reply = {
+                "type": "subscriptions",
+                "topics": [{"user_id": u, "type": t} for u, t in sorted(client.topics)],
+                "max_rate_hz": round(1.0 / client.min_interval, 3) if client.min_interval else None,
+                "deltas": client.deltas,
+            }
+        self._enqueue(client, json.dumps(reply), priority=False, key=None)
+
+    def _targets(self, user_id: str, msg_type: str) -> Set[_Client]:
+        subscribers = self._topics.get((user_id, msg_type))
+        everyone = self._topics.get((ALL_USERS, msg_type))
+        if subscribers and everyone:
+            return subscribers | everyone
+        return subscribers or everyone or set()
+
+    async def publish(self, message: str, user_id: str, msg_type: str, priority: bool = False, key: Optional[str] = None):
+        """Queues a message about `user_id` for the clients subscribed to it.
+
+        `priority` and `key` are as for `broadcast`.
+        """
+        await self.bus.publish(BusMessage(PUBLISH, message, user_id=user_id, msg_type=msg_type, priority=priority, key=key))
+
+    def _deliver(self, message: BusMessage):
+        """Bus handler: a message published by any worker, for this worker's connections."""
+        if message.kind == PUBLISH:
+            self._publish_local(message.text(), message.user_id, message.msg_type, message.priority, message.key)
+        elif message.kind == STATE:
+            self._publish_state_local(message.user_id, message.msg_type, message.key, message.text, message.state)
+        else:
+            self._broadcast_local(message.text(), message.priority, message.key)
+
+    def _publish_local(self, message: str, user_id: str, msg_type: str, priority: bool, key: Optional[str]):
+        self.published += 1
+        targets = self._targets(user_id, msg_type)
+        if not targets:
+            return
+        for client in list(targets):
+            self._enqueue(client, message, priority, key)
+        self.deliveries += len(targets)
+        events.debug("ws.publish", type=msg_type, clients=len(targets))
+
+    async def publish_state(self, user_id: str, msg_type: str, key: str, render: Callable[[], str], state: Callable[[], dict]):
+        """Publish the newest state of stream `key` (e.g. one device's processed data).
+
+        `render` returns the message and `state` its ``data`` object; both are
+        called only if, and when, some connection sends this update. Each
+        subscriber gets at most its rate of updates per stream, the newest
+        winning, as a full message or a delta (see the class docstring).
+        Across workers the update is rendered once, when it is published.
+        """
+        await self.bus.publish(BusMessage(STATE, render, user_id=user_id, msg_type=msg_type, key=key, state=state))
+
+    def _publish_state_local(self, user_id: str, msg_type: str, key: str, render: Callable[[], str], state: Callable[[], dict]):
+        self.published += 1
+        # Numbered by the delivering worker: a connection only sees its own worker's sequence
+        seq = self._seqs.get(key, 0) + 1
+        self._seqs[key] = seq
+        targets = self._targets(user_id, msg_type)
+        if not targets:
+            return
+        update = StateUpdate(msg_type, key, seq, render, state)
+        now = asyncio.get_running_loop().time()
+        for client in list(targets):
+            self._offer(client, update, now)
+        self.deliveries += len(targets)
+
+    def _offer(self, client: _Client, update: StateUpdate, now: float):
+        if client.closed:
+            return
+        key = update.key
+        if key in client.held:
+            client.held[key] = update
+            self.conflated += 1
+            WS_MESSAGES.labels("conflated").inc()
+            return
+        due = client.next_send.get(key, 0.0)
+        if now >= due:
+            client.next_send[key] = now + client.min_interval
+            self._enqueue(client, update, priority=False, key=key)
+            return
+        client.held[key] = update
+        self.held_back += 1
+        asyncio.get_running_loop().call_at(due, self._release, client, key)
+
+    def _release(self, client: _Client, key: str):
+        update = client.held.pop(key, None)
+        if update is None or client.closed:
+            return
+        client.next_send[key] = asyncio.get_running_loop().time() + client.min_interval
+        self._enqueue(client, update, priority=False, key=key)
+
+    def _render(self, client: _Client, item) -> Optional[str]:
+        """The text to send for a queued message or state update (None: nothing to send)."""
+        if isinstance(item, str):
+            return item
+        if not client.deltas:
+            return item.text()
+        sent = client.unacked.setdefault(item.key, OrderedDict())
+        sent[item.seq] = item.state()
+        while len(sent) > MAX_UNACKED:
+            sent.popitem(last=False)
+        acked = client.acked.get(item.key)
+        if acked is None:
+            return item.full()
+        text = item.delta(*acked)
+        if text is None:
+            # Unchanged since the acknowledged state; nothing to acknowledge either
+            del sent[item.seq]
+        else:
+            self.deltas_sent += 1
+        return text
+
+    async def broadcast(self, message: str, priority: bool = False, key: Optional[str] = None):
+        """Queues a message for every connected client, whatever its subscriptions.
+
+        `priority` messages (alerts) jump ahead of queued data and are never
+        dropped. `key` identifies what the message is the latest state of
+        (e.g. one device's stream); under the ``conflate`` policy a queued
+        message with the same key is replaced rather than sent stale.
+        """
+        await self.bus.publish(BusMessage(BROADCAST, message, priority=priority, key=key))
+
+    def _broadcast_local(self, message: str, priority: bool, key: Optional[str]):
+        if not self._clients:
+            events.warning_limited("ws.broadcast_no_clients")
+            return
+        self.broadcasts += 1
+        for client in list(self._clients.values()):
+            self._enqueue(client, message, priority, key)
+        events.debug("ws.broadcast", clients=len(self._clients))
+
+    def _enqueue(self, client: _Client, message: str, priority: bool, key: Optional[str]):
+        if client.closed:
+            return
+        if priority:
+            if len(client.alerts) >= self.max_alerts:
+                self._evict(client, "alerts_backlog")
+                return
+            client.alerts.append(message)
+        else:
+            data = client.data
+            if key is not None and self.policy == CONFLATE and key in data:
+                # Replaced in place: keeps its turn, sends the newest state
+                data[key] = message
+                self.conflated += 1
+                WS_MESSAGES.labels("conflated").inc()
+                return
+            if len(data) >= self.max_queue:
+                if self.policy == DISCONNECT:
+                    self._evict(client, "slow_consumer")
+                    return
+                data.popitem(last=False)
+                self.dropped += 1
+                WS_MESSAGES.labels("dropped").inc()
+            data[key if key is not None and self.policy == CONFLATE else next(self._ids)] = message
+        client.wakeup.set()
+
+    async def _writer(self, client: _Client):
+        websocket = client.websocket
+        while not client.closed:
+            if not client.alerts and not client.data:
+                client.wakeup.clear()
+                await client.wakeup.wait()
+                continue
+            item = client.alerts.popleft() if client.alerts else client.data.popitem(last=False)[1]
+            message = self._render(client, item)
+            if message is None:
+                continue
+            try:
+                await asyncio.wait_for(websocket.send_text(message), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                self._evict(client, "send_timeout")
+                return
             except Exception as e:
-                logger.error(f"Failed to send message to client: {e}")
-                # Optional: remove dead connections
-                # self.active_connections.remove(connection)
-        
-        logger.debug(f"Broadcasted message to {len(self.active_connections)} clients.")
+                events.error("ws.send_failed", error=e)
+                self._evict(client, "send_failed")
+                return
+            self.sent += 1
+            self.bytes_sent += len(message)
+            WS_MESSAGES.labels("sent").inc()
+
+    async def close(self):
+        """Stop receiving from the bus, stop every writer and close the connections (shutdown)."""
+        await self.bus.close()
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            self._stop(client)
+        # 1001: going away
+        await asyncio.gather(*(self._close_socket(c.websocket, 1001) for c in clients), *list(self._closing))
 
+    def stats(self) -> dict:
+        clients = list(self._clients.values())
+        return {
+            "clients": len(clients),
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "max_alerts": self.max_alerts,
+            "broadcasts": self.broadcasts,
+            "topics": len(self._topics),
+            "published": self.published,
+            "mean_fanout": round(self.deliveries / self.published, 2) if self.published else 0.0,
+            "queued": sum(c.queued for c in clients),
+            "max_client_queued": max((c.queued for c in clients), default=0),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "max_rate_hz": self.max_rate_hz or None,
+            "held": sum(len(c.held) for c in clients),
+            "held_back": self.held_back,
+            "delta_clients": sum(1 for c in clients if c.deltas),
+            "deltas_sent": self.deltas_sent,
+            "bytes_sent": self.bytes_sent,
+            "evicted": self.evicted,
+            "bus": self.bus.stats(),
+        }
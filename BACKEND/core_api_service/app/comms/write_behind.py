@@ -0,0 +1,177 @@
+# File: BACKEND/core_api_service/app/comms/write_behind.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..logging_setup import get_event_logger
+from ..samples import SAMPLE_WINDOW, summarize
+
+logger = logging.getLogger(__name__)
+events = get_event_logger(__name__)
+
+# Firestore rejects WriteBatch commits with more than 500 operations
+FIRESTORE_MAX_BATCH_OPS = 500
+
+
+class WriteBehindWriter:
+    """
+    Coalesces Firestore document writes into `WriteBatch` commits.
+
+    `set` only queues the write and returns immediately. A single flusher
+    task commits queued writes in batches of up to `max_batch` operations,
+    either when that many are pending or `flush_interval` seconds after the
+    first one was queued. Urgent writes (alerts) wake the flusher straight
+    away. Commits run in a worker thread so the event loop is never blocked
+    on a Firestore RPC.
+
+    The client is looked up through `client_getter` at flush time, so writes
+    queued while Firestore is unavailable are dropped instead of retried
+    against a dead client.
+    """
+
+    def __init__(
+        self,
+        client_getter: Callable[[], Any],
+        max_batch: int = FIRESTORE_MAX_BATCH_OPS,
+        flush_interval: float = 0.5,
+        max_pending: int = 20000,
+    ):
+        self._client_getter = client_getter
+        self.max_batch = max(1, min(int(max_batch), FIRESTORE_MAX_BATCH_OPS))
+        self.flush_interval = float(flush_interval)
+        self.max_pending = max(1, int(max_pending))
+        self._pending: List[Tuple[Any, dict]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._urgent = False
+        self._queued = 0
+        self._written = 0
+        self._failed = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._latency_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._size_samples = deque(maxlen=SAMPLE_WINDOW)
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """Spawn the flusher task. Safe to call more than once."""
+        if self._task:
+            return
+        self._closed = False
+        self._spawn_flusher()
+        logger.info("Write-behind writer started: batch %d ops, interval %.2fs", self.max_batch, self.flush_interval)
+
+    def _spawn_flusher(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def set(self, doc_ref: Any, data: dict, urgent: bool = False) -> bool:
+        """Queue `doc_ref.set(data)`. Returns False if the write was not accepted."""
+        if self._closed or len(self._pending) >= self.max_pending:
+            self._dropped += 1
+            events.warning_limited("firestore.write_dropped", closed=self._closed, pending=len(self._pending))
+            return False
+        if not self._task:
+            # Lazily start when the app was not run through its startup event (e.g. tests)
+            self._spawn_flusher()
+        self._pending.append((doc_ref, data))
+        self._queued += 1
+        if urgent:
+            self._urgent = True
+        if urgent or len(self._pending) >= self.max_batch or len(self._pending) == 1:
+            self._wake.set()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if self._closed and not self._pending:
+                return
+            # Give other writes a chance to coalesce, unless a batch is already
+            # full or an urgent write is waiting
+            if not self._closed and not self._urgent and len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+            await self.flush()
+            if self._closed:
+                return
+
+    async def flush(self):
+        """Commit everything queued so far, `max_batch` operations at a time."""
+        self._urgent = False
+        while self._pending:
+            chunk = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            await self._commit(chunk)
+
+    async def _commit(self, chunk: List[Tuple[Any, dict]]):
+        db = self._client_getter()
+        if db is None:
+            self._dropped += len(chunk)
+            events.warning_limited("firestore.demo_mode_skip", op="write_behind", ops=len(chunk))
+            return
+        started = time.monotonic()
+        try:
+            batch = db.batch()
+            for doc_ref, data in chunk:
+                batch.set(doc_ref, data)
+            await asyncio.to_thread(batch.commit)
+            self._written += len(chunk)
+        except Exception as e:
+            self._failed += len(chunk)
+            error_msg = str(e)
+            if "Invalid JWT Signature" in error_msg or "invalid_grant" in error_msg:
+                events.warning_limited("firestore.invalid_credentials", stage="write_behind", hint="download a fresh service account key")
+            else:
+                events.error("firestore.flush_failed", ops=len(chunk), error=e)
+        finally:
+            self._flushes += 1
+            self._latency_samples.append(time.monotonic() - started)
+            self._size_samples.append(len(chunk))
+
+    async def close(self, timeout: Optional[float] = None):
+        """Stop accepting writes and flush what is queued.
+
+        Writes still pending after `timeout` seconds are abandoned and logged.
+        """
+        self._closed = True
+        if not self._task:
+            return
+        self._wake.set()
+        done, not_done = await asyncio.wait([self._task], timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning("Write-behind flush timed out; %d writes abandoned", len(self._pending))
+        self._task = None
+
+    def stats(self) -> dict:
+        sizes = self._size_samples
+        return {
+            "max_batch": self.max_batch,
+            "flush_interval_s": self.flush_interval,
+            "pending": len(self._pending),
+            "closed": self._closed,
+            "queued": self._queued,
+            "written": self._written,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "flushes": self._flushes,
+            "batch_size": {
+                "count": len(sizes),
+                "mean": round(sum(sizes) / len(sizes), 3) if sizes else 0.0,
+                "max": max(sizes) if sizes else 0,
+            },
+            "flush_latency": summarize(self._latency_samples),
+        }
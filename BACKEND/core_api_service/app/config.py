@@ -18,6 +18,117 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "") # Get your API key from Google AI Studio
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
 
+    # --- Ingest Processing ---
+    # Async workers consuming the background processing queue
+    PROCESSING_WORKERS: int = int(os.getenv("PROCESSING_WORKERS", "4"))
+    # Max packets waiting for processing before ingest answers 429
+    PROCESSING_QUEUE_SIZE: int = int(os.getenv("PROCESSING_QUEUE_SIZE", "2000"))
+    # Seconds to wait for queued packets on shutdown
+    PROCESSING_DRAIN_TIMEOUT: float = float(os.getenv("PROCESSING_DRAIN_TIMEOUT", "30"))
+    # Seconds a packet/Idempotency-Key is remembered for duplicate suppression
+    DEDUP_WINDOW_SECONDS: float = float(os.getenv("DEDUP_WINDOW_SECONDS", "600"))
+    # Max keys held in the dedup window (oldest evicted first)
+    DEDUP_MAX_ENTRIES: int = int(os.getenv("DEDUP_MAX_ENTRIES", "100000"))
+
+    # --- Write-ahead log for raw packets ---
+    # Acknowledge ingest once packets are on local disk; replicate to Firestore in the background.
+    # Only useful with a Firestore backend: without one the log is bypassed
+    WAL_ENABLED: bool = os.getenv("WAL_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Log directory (default: <service>/data/wal); workers sharing it each lock a log of their own
+    WAL_DIR: str = os.getenv("WAL_DIR", "")
+    # Start a new segment file once the current one reaches this size
+    WAL_SEGMENT_BYTES: int = int(os.getenv("WAL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+    # Disk budget while the backend is unreachable; oldest segments are dropped past it
+    WAL_MAX_BYTES: int = int(os.getenv("WAL_MAX_BYTES", str(1024 * 1024 * 1024)))
+    # fsync every group commit (off: survives process crashes but not power loss)
+    WAL_FSYNC: bool = os.getenv("WAL_FSYNC", "true").lower() in ("1", "true", "yes")
+    # Records per replication batch and idle poll interval in seconds
+    WAL_REPLICATE_BATCH: int = int(os.getenv("WAL_REPLICATE_BATCH", "500"))
+    WAL_REPLICATE_INTERVAL: float = float(os.getenv("WAL_REPLICATE_INTERVAL", "0.5"))
+
+    # --- User profile cache ---
+    # Seconds a user/consent document is served from memory
+    PROFILE_CACHE_TTL: float = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+    # Seconds a missing document is remembered as missing
+    PROFILE_CACHE_NEGATIVE_TTL: float = float(os.getenv("PROFILE_CACHE_NEGATIVE_TTL", "60"))
+    PROFILE_CACHE_SIZE: int = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+
+    # --- AI features ---
+    # Packets per device in the rolling window used for windowed model features
+    FEATURE_WINDOW_SIZE: int = int(os.getenv("FEATURE_WINDOW_SIZE", "32"))
+    # Device windows kept in memory (least recently updated evicted first)
+    FEATURE_WINDOW_MAX_DEVICES: int = int(os.getenv("FEATURE_WINDOW_MAX_DEVICES", "10000"))
+    # Seconds of streamed accelerometer samples per tremor estimate (bin spacing is 1/window)
+    TREMOR_WINDOW_S: float = float(os.getenv("TREMOR_WINDOW_S", "2.0"))
+    # Peak amplitude (g) in the 3-7 Hz band above which tremor is detected
+    TREMOR_MIN_AMPLITUDE_G: float = float(os.getenv("TREMOR_MIN_AMPLITUDE_G", "0.5"))
+    # Band amplitude (g) that maps to a tremor score of 1.0
+    TREMOR_FULL_SCALE_G: float = float(os.getenv("TREMOR_FULL_SCALE_G", "1.0"))
+    # Evaluate tree-ensemble models from compiled node tables instead of sklearn
+    COMPILED_MODELS: bool = os.getenv("COMPILED_MODELS", "true").lower() in ("1", "true", "yes")
+    # Model artifact directory (default: <service>/models), watched for new versions
+    MODEL_DIR: str = os.getenv("MODEL_DIR", "")
+    # Seconds between checks of MODEL_DIR for changed artifacts (0 disables hot reload)
+    MODEL_RELOAD_INTERVAL: float = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+    # Compiled models, memory-mapped by every worker (default: <service>/data/model_cache)
+    MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "")
+
+    # --- Inference executor ---
+    # Where AI scoring runs: "inline" (on the event loop), "thread" or "process" pool
+    INFERENCE_MODE: str = os.getenv("INFERENCE_MODE", "thread").lower()
+    # Threads or processes in the inference pool
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "2"))
+    # Micro-batch concurrent single-packet scoring calls into one model call
+    INFERENCE_BATCHING: bool = os.getenv("INFERENCE_BATCHING", "true").lower() in ("1", "true", "yes")
+    # Longest a packet waits for others to share its batch (ms); shrinks when arrivals are dense
+    INFERENCE_BATCH_WINDOW_MS: float = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "2"))
+    # Packets per batch; a full batch runs without waiting out the window
+    INFERENCE_BATCH_MAX: int = int(os.getenv("INFERENCE_BATCH_MAX", "64"))
+
+    # --- Frontend WebSocket fan-out ---
+    # Data messages queued per dashboard connection before the slow client policy applies
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    # Alerts queued per connection; a client this far behind on alerts is disconnected
+    WS_ALERT_QUEUE_SIZE: int = int(os.getenv("WS_ALERT_QUEUE_SIZE", "64"))
+    # Full data queue: "drop" the oldest message, "conflate" per device then drop, or "disconnect"
+    WS_SLOW_CLIENT_POLICY: str = os.getenv("WS_SLOW_CLIENT_POLICY", "conflate").lower()
+    # Seconds one send may take before the connection is treated as dead and evicted
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+    # Most processed_data updates per second per device stream sent to one dashboard (0: every packet)
+    WS_MAX_UPDATE_HZ: float = float(os.getenv("WS_MAX_UPDATE_HZ", "5"))
+    # Accept dashboards that connect without ?token= and let them see every user (local demos only)
+    WS_ALLOW_ANONYMOUS: bool = os.getenv("WS_ALLOW_ANONYMOUS", "false").lower() in ("1", "true", "yes")
+    # Bus sharing dashboard messages between workers: "memory://" (single worker),
+    # "redis://[[username]:password@]host:port" or "unix:///path/to/broker.sock" (any Redis-protocol broker)
+    PUBSUB_URL: str = os.getenv("PUBSUB_URL", "memory://")
+    # Pub/sub channel the workers exchange dashboard messages on
+    PUBSUB_CHANNEL: str = os.getenv("PUBSUB_CHANNEL", "stancesense:frontend")
+
+    # --- Firestore write-behind ---
+    # Max writes per WriteBatch commit (Firestore caps this at 500)
+    FIRESTORE_WRITE_BATCH_SIZE: int = int(os.getenv("FIRESTORE_WRITE_BATCH_SIZE", "500"))
+    # Seconds a queued write waits for others to coalesce with (alerts skip the wait)
+    FIRESTORE_FLUSH_INTERVAL: float = float(os.getenv("FIRESTORE_FLUSH_INTERVAL", "0.5"))
+    # Max writes waiting to be committed before new ones are dropped
+    FIRESTORE_WRITE_MAX_PENDING: int = int(os.getenv("FIRESTORE_WRITE_MAX_PENDING", "20000"))
+    # Seconds to wait for pending writes to be committed on shutdown
+    FIRESTORE_FLUSH_TIMEOUT: float = float(os.getenv("FIRESTORE_FLUSH_TIMEOUT", "10"))
+
+    # --- Logging ---
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # "text" (level:logger:message) or "json" (one object per line)
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    # Keep 1 in N debug events per event name
+    LOG_DEBUG_SAMPLE_EVERY: int = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "1"))
+    # Max debug events per second per event name (after sampling)
+    LOG_DEBUG_RATE_PER_SEC: float = float(os.getenv("LOG_DEBUG_RATE_PER_SEC", "10"))
+
+    # --- Auth ---
+    # Verified Firebase ID tokens kept in the LRU cache
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    # Upper bound on how long a verified token is trusted without re-checking
+    TOKEN_CACHE_MAX_TTL: float = float(os.getenv("TOKEN_CACHE_MAX_TTL", "3600"))
+
     class Config:
         # This allows loading from a .env file (if you use one)
         env_file = ".env"
@@ -0,0 +1,201 @@
+"""Logging setup and structured event logging for the hot path.
+
+`configure_logging()` routes every record through a `QueueHandler`, so the
+event loop only pays for an in-memory enqueue; a background
+`QueueListener` thread does the formatting and stdout I/O.
+
+`get_event_logger()` returns an `EventLogger` that emits one structured record
+per event (``event=<name> key=value ...``, or JSON lines with
+``LOG_FORMAT=json``). Fields are only formatted when the level is enabled,
+debug events are sampled and rate limited per event name, and
+`warning_limited` collapses repeated warnings into one line per interval
+with a ``suppressed=N`` count.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Optional
+
+from .config import settings
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _Event:
+    """Lazily rendered event message; formatting happens in the listener thread."""
+
+    __slots__ = ("name", "fields")
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+
+    def __str__(self) -> str:
+        parts = [f"event={self.name}"]
+        for key, value in self.fields.items():
+            if isinstance(value, float):
+                value = f"{value:.3f}"
+            parts.append(f"{key}={value}")
+        return " ".join(parts)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured events contribute their fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        msg = record.msg
+        if isinstance(msg, _Event):
+            payload["event"] = msg.name
+            payload.update(msg.fields)
+        else:
+            payload["message"] = record.getMessage()
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that skips formatting on the caller's thread.
+
+    The stock `prepare` renders the message before enqueueing; records stay
+    in-process here, so the listener can format them instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RateLimiter:
+    """Token bucket per key; remembers how many calls were suppressed."""
+
+    def __init__(self, per_second: float, burst: Optional[float] = None):
+        self.per_second = float(per_second)
+        self.burst = float(burst if burst is not None else max(1.0, per_second))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str):
+        """Return the suppressed count since the last allowed call, or None if denied."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.per_second)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return None
+            self._buckets[key] = (tokens - 1.0, now, 0)
+            return suppressed
+
+
+class EventLogger:
+    """
+    Structured event logging with level gating, sampling and rate limits.
+
+    `debug` events are kept 1-in-`sample_every` and at most `debug_per_second`
+    per event name; other levels are always emitted.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_every: int = 1, debug_per_second: float = 10.0):
+        self.logger = logger
+        self.sample_every = max(1, int(sample_every))
+        self._counters = {}
+        self._debug_limiter = RateLimiter(debug_per_second)
+        self._warn_limiters = {}
+
+    def event(self, level: int, name: str, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, _Event(name, fields))
+
+    def debug(self, name: str, **fields):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self._counters.get(name, 0) + 1
+        self._counters[name] = count
+        if count % self.sample_every:
+            return
+        suppressed = self._debug_limiter.allow(name)
+        if suppressed is None:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self.logger.debug(_Event(name, fields))
+
+    def info(self, name: str, **fields):
+        self.event(logging.INFO, name, **fields)
+
+    def warning(self, name: str, **fields):
+        self.event(logging.WARNING, name, **fields)
+
+    def error(self, name: str, **fields):
+        self.event(logging.ERROR, name, **fields)
+
+    def exception(self, name: str, **fields):
+        self.logger.exception(_Event(name, fields))
+
+    def warning_limited(self, name: str, interval: float = 60.0, **fields):
+        """Emit `name` at most once per `interval` seconds."""
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
+        limiter = self._warn_limiters.get(interval)
+        if limiter is None:
+            limiter = self._warn_limiters[interval] = RateLimiter(1.0 / interval, burst=1.0)
+        suppressed = limiter.allow(name)
+        if suppressed is None:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self.logger.warning(_Event(name, fields))
+
+
+def get_event_logger(name: str) -> EventLogger:
+    return EventLogger(
+        logging.getLogger(name),
+        sample_every=settings.LOG_DEBUG_SAMPLE_EVERY,
+        debug_per_second=settings.LOG_DEBUG_RATE_PER_SEC,
+    )
+
+
+def configure_logging():
+    """Install the queue-based root handler. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler()
+    if settings.LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records, stop the listener thread and log synchronously again."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, _DeferredQueueHandler):
+                root.removeHandler(handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+        _listener = None
@@ -1,14 +1,18 @@
 
 # File: BACKEND/core_api_service/app/main.py
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
+from typing import Optional, Set, Tuple
 
 # Import our application modules
 from .config import settings
+from .logging_setup import configure_logging, shutdown_logging
+from .metrics import registry, Gauge, RouteMetricsMiddleware, PROMETHEUS_CONTENT_TYPE, stage_summary
+from .warmup import startup_warmup
 from .comms.websocket_manager import ConnectionManager
 from .comms.manager import frontend_manager
 from .comms.firestore_client import (
@@ -16,10 +20,21 @@ from .comms.firestore_client import (
     save_sensor_data, 
     save_alert,
     initialize_firestore,
+    firestore_writer,
+    wal_replicator,
 )
+from .comms.wal import packet_wal
 from .models.schemas import DeviceData, Alert, ProcessedData
-from .services.ai_processor import process_data_with_ai
+from .services.ai_processor import process_data_with_ai, inference_scheduler, warm_up as warm_up_inference
 from .services.rag_agent import generate_contextual_alert
+from .services.processing_queue import processing_queue
+from .services.token_verifier import token_verifier, verify_authorization
+from .services.dedup import ingest_dedup
+from .services.device_windows import device_windows
+from .services.tremor_estimator import tremor_estimators
+from .services.profile_cache import profile_cache, get_user_doc_async
+from .services.model_registry import model_registry
+from .services.inference_executor import inference_executor
 from .routes.auth import router as auth_router
 from .routes import ingest as ingest_router_module
 from .routes import consent as consent_router_module
@@ -28,7 +43,7 @@ from .routes import aggregated as aggregated_router_module
 from .routes import rag_analysis as rag_analysis_router_module
 
 # --- Globals & Setup ---
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -55,6 +70,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Metrics ---
+# Per-route request count and latency for every router above (see /metrics)
+app.add_middleware(RouteMetricsMiddleware)
+
+registry.register(Gauge(
+    "stancesense_processing_queue_depth",
+    "Packets waiting or in progress on the processing queue.",
+    lambda: processing_queue.stats()["depth"],
+))
+registry.register(Gauge(
+    "stancesense_inference_inflight",
+    "AI scoring calls queued or running on the inference executor.",
+    lambda: inference_executor.inflight,
+))
+registry.register(Gauge(
+    "stancesense_ws_clients",
+    "Connected frontend WebSocket clients.",
+    lambda: len(frontend_manager.active_connections),
+))
+registry.register(Gauge(
+    "stancesense_ws_queued_messages",
+    "Messages queued across frontend WebSocket connections.",
+    lambda: frontend_manager.stats()["queued"],
+))
+registry.register(Gauge(
+    "stancesense_ready",
+    "1 once startup warm-up has finished and the worker accepts traffic.",
+    lambda: 1 if startup_warmup.ready else 0,
+))
+registry.register(Gauge(
+    "stancesense_firestore_writes_pending",
+    "Writes queued on the write-behind writer.",
+    lambda: firestore_writer.stats()["pending"],
+))
+registry.register(Gauge(
+    "stancesense_wal_bytes",
+    "Bytes held in the raw packet write-ahead log.",
+    lambda: packet_wal.total_bytes() if packet_wal else 0,
+))
+
 # --- WebSocket Manager for Frontend ---
 # Use the shared frontend_manager singleton so other modules can broadcast
 # (e.g. background tasks in routes/ingest.py)
@@ -67,9 +122,8 @@ app_id = settings.APP_ID # Get app_id from config
 user_id = "temp_user_id" # This would come from Firebase Auth
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Application startup: initialize firebase_admin and Firestore client."""
+def _initialize_firebase():
+    """Initialize firebase_admin and the Firestore client (runs in a warm-up thread)."""
     try:
         initialize_firestore()
         global db
@@ -78,6 +132,45 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error initializing Firebase on startup: {e}")
 
+
+@app.on_event("startup")
+async def startup_event():
+    """Application startup: start background services, then warm up without blocking liveness."""
+    await processing_queue.start()
+    await firestore_writer.start()
+    await model_registry.start()
+    await frontend_manager.start()
+    if wal_replicator:
+        await wal_replicator.start()
+    if settings.WS_ALLOW_ANONYMOUS:
+        logger.warning("WS_ALLOW_ANONYMOUS is on: dashboards without a token receive every user's data")
+    # Heavy imports, model loads and pool start-up run concurrently; /ready
+    # stays 503 until they and a dummy inference pass have finished
+    startup_warmup.start(
+        {
+            "firebase": _initialize_firebase,
+            "models": model_registry.load_all,
+            "inference_pool": inference_executor.start,
+        },
+        {"inference": warm_up_inference},
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Application shutdown: finish queued background processing, then flush pending writes."""
+    await startup_warmup.close()
+    await frontend_manager.close()
+    await model_registry.close()
+    await processing_queue.drain(timeout=settings.PROCESSING_DRAIN_TIMEOUT)
+    await inference_scheduler.close()
+    await inference_executor.close()
+    await firestore_writer.close(timeout=settings.FIRESTORE_FLUSH_TIMEOUT)
+    if wal_replicator:
+        await wal_replicator.close(timeout=settings.FIRESTORE_FLUSH_TIMEOUT)
+        packet_wal.close()
+    shutdown_logging()
+
 # --- Routes ---
 
 @app.get("/")
@@ -97,31 +190,103 @@ async def health():
     except Exception as e:
         return JSONResponse(status_code=503, content={"status": "unhealthy", "detail": str(e)})
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness endpoint: 503 until startup warm-up has finished."""
+    body = startup_warmup.stats()
+    if startup_warmup.ready:
+        return body
+    return JSONResponse(status_code=503, content=body)
+
+
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for the ingest processing pipeline."""
+    return {
+        "processing_queue": processing_queue.stats(),
+        "token_cache": token_verifier.stats(),
+        "ingest_dedup": ingest_dedup.stats(),
+        "device_windows": device_windows.stats(),
+        "tremor_estimators": tremor_estimators.stats(),
+        "profile_cache": profile_cache.stats(),
+        "models": model_registry.stats(),
+        "inference": inference_executor.stats(),
+        "inference_batching": inference_scheduler.stats(),
+        "websocket": frontend_manager.stats(),
+        "firestore_writer": firestore_writer.stats(),
+        "wal": packet_wal.stats() if packet_wal else None,
+        "wal_replicator": wal_replicator.stats() if wal_replicator else None,
+        "warmup": startup_warmup.stats(),
+        "stages": stage_summary(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of stage, route and queue metrics."""
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Note: the canonical ingest endpoints are implemented in `app.routes.ingest`.
 # The duplicate inline /ingest/data handler was removed to avoid route conflicts.
 
 
 # --- Frontend WebSocket Endpoint ---
+async def _frontend_subscriber(websocket: WebSocket, token: Optional[str]) -> Tuple[Optional[str], Optional[Set[str]]]:
+    """The connecting dashboard's user id and the user ids it may subscribe to.
+
+    Browsers cannot set headers on a WebSocket, so the Firebase ID token comes
+    as ``?token=`` (an ``Authorization`` header is accepted too). A user may
+    follow themselves and the users listed in ``patient_ids`` on their user
+    document. Without a token the dashboard may follow everyone if
+    WS_ALLOW_ANONYMOUS is set (None, None); otherwise HTTP 401 is raised.
+    """
+    token = token or websocket.headers.get("authorization")
+    if not token:
+        if settings.WS_ALLOW_ANONYMOUS:
+            return None, None
+        raise HTTPException(status_code=401, detail="Missing token")
+    uid = verify_authorization(token, allow_simulator=True)
+    allowed = {uid}
+    db_local = get_firestore_db()
+    if db_local:
+        user_doc = await get_user_doc_async(db_local, uid)
+        patients = (user_doc or {}).get("patient_ids") or []
+        allowed.update(p for p in patients if isinstance(p, str) and p)
+    return uid, allowed
+
+
 # The web dashboard connects here to get real-time processed data
 @app.websocket("/ws/frontend-data")
-async def websocket_frontend_endpoint(websocket: WebSocket):
+async def websocket_frontend_endpoint(websocket: WebSocket, token: Optional[str] = None):
     """
     WebSocket endpoint for the frontend to receive real-time
-    processed data and alerts.
+    processed data and alerts for the users it subscribes to
+    (see `ConnectionManager` for the subscription messages).
     """
-    await frontend_manager.connect(websocket)
+    try:
+        uid, allowed_users = await _frontend_subscriber(websocket, token)
+    except HTTPException as e:
+        logger.warning(f"Rejected frontend WebSocket: {e.detail}")
+        # Closing before accept refuses the handshake (HTTP 403)
+        await websocket.close(code=1008)
+        return
+    await frontend_manager.connect(websocket, user_id=uid, allowed_users=allowed_users)
     logger.info("Frontend client connected to WebSocket.")
     try:
         while True:
-            # Keep the connection alive, listening for any messages
+            # Keep the connection alive; text messages are subscription requests
             data = await websocket.receive_text()
-            # We don't expect messages from frontend, but can handle them
-            logger.info(f"Received message from frontend: {data}")
+            frontend_manager.handle_message(websocket, data)
     except WebSocketDisconnect:
-        frontend_manager.disconnect(websocket)
         logger.info("Frontend client disconnected.")
+    except RuntimeError:
+        # Socket already closed by the manager (evicted as dead or too slow)
+        pass
+    finally:
+        frontend_manager.disconnect(websocket)
 
 # --- Main entry point for uvicorn ---
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws="websockets", ws_per_message_deflate=True)
 
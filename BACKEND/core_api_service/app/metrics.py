@@ -0,0 +1,347 @@
+# File: BACKEND/core_api_service/app/metrics.py
+#
+# In-process metrics with Prometheus text exposition.
+#
+# Histograms are cumulative bucket counters (what Prometheus's
+# histogram_quantile() consumes), so observing a value is a bisect plus a
+# couple of integer increments and memory does not grow with traffic.
+
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, 100 µs .. 10 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_upper", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, upper: Tuple[float, ...]):
+        self._upper = upper
+        self._counts = [0] * (len(upper) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self._upper, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile by linear interpolation inside its bucket."""
+        total = self._count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self._upper, self._counts):
+            if seen + count >= rank and count:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self._upper[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self._count,
+            "mean_ms": round(self._sum / self._count * 1000.0, 3) if self._count else 0.0,
+            "p50_ms": round(self.quantile(0.50) * 1000.0, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000.0, 3),
+        }
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _Metric(abc.ABC):
+    """A named metric family; subclasses set `kind` and render their samples."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    @abc.abstractmethod
+    def _render_samples(self) -> List[str]:
+        """The family's sample lines in exposition format."""
+
+
+class _LabelledMetric(_Metric):
+    """A metric with one child per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation)
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A fresh child holding one label combination's state."""
+
+    def labels(self, *values: str):
+        """Return the child for these label values, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        return sorted(self._children.items())
+
+
+class Counter(_LabelledMetric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self.children()
+        ]
+
+
+class Histogram(_LabelledMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for values, child in self.children():
+            with child._lock:
+                counts = list(child._counts)
+                total, count = child._sum, child._count
+            cumulative = 0
+            for upper, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(float(upper))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Unlabelled gauge whose value is read from `function` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function):
+        super().__init__(name, documentation)
+        self._function = function
+
+    def _render_samples(self) -> List[str]:
+        try:
+            value = float(self._function())
+        except Exception:
+            return []
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "stancesense_stage_duration_seconds",
+    "Time spent in each ingest pipeline stage.",
+    ["stage"],
+))
+STAGE_ERRORS = registry.register(Counter(
+    "stancesense_stage_errors_total",
+    "Pipeline stage invocations that raised.",
+    ["stage"],
+))
+INGEST_PACKETS = registry.register(Counter(
+    "stancesense_ingest_packets_total",
+    "Packets seen by the ingest endpoints, by outcome.",
+    ["endpoint", "result"],
+))
+HTTP_REQUESTS = registry.register(Counter(
+    "stancesense_http_requests_total",
+    "HTTP requests by route template, method and status code.",
+    ["method", "route", "status"],
+))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "stancesense_http_request_duration_seconds",
+    "HTTP request latency by route template and method.",
+    ["method", "route"],
+))
+INFERENCE_QUEUE_SECONDS = registry.register(Histogram(
+    "stancesense_inference_queue_seconds",
+    "Time AI scoring calls wait for a free inference worker, by executor mode.",
+    ["mode"],
+))
+INFERENCE_RUN_SECONDS = registry.register(Histogram(
+    "stancesense_inference_run_seconds",
+    "Time AI scoring calls run on an inference worker, by executor mode.",
+    ["mode"],
+))
+INFERENCE_BATCH_SIZE = registry.register(Histogram(
+    "stancesense_inference_batch_size",
+    "Packets per model call formed by the inference micro-batching scheduler.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+))
+INFERENCE_BATCH_WAIT_SECONDS = registry.register(Histogram(
+    "stancesense_inference_batch_wait_seconds",
+    "Time packets wait in the micro-batching scheduler for their batch to close.",
+))
+WS_MESSAGES = registry.register(Counter(
+    "stancesense_ws_messages_total",
+    "Frontend WebSocket messages sent, dropped or conflated in slow clients' queues, and evicted clients.",
+    ["result"],
+))
+
+
+class _StageTimer:
+    __slots__ = ("_name", "_started")
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.labels(self._name).observe(time.perf_counter() - self._started)
+        if exc_type is not None:
+            STAGE_ERRORS.labels(self._name).inc()
+        return False
+
+
+def stage(name: str) -> _StageTimer:
+    """Time a pipeline stage into `stancesense_stage_duration_seconds{stage=name}`.
+
+    Use as ``with stage("decode"): ...``; exceptions are also counted in
+    `stancesense_stage_errors_total`.
+    """
+    return _StageTimer(name)
+
+
+def stage_summary() -> dict:
+    """p50/p99 per stage, estimated from the histogram buckets."""
+    return {values[0]: child.summary() for values, child in STAGE_SECONDS.children()}
+
+
+class RouteMetricsMiddleware:
+    """
+    ASGI middleware recording request count and latency per route template.
+
+    Labels use the matched route's path template (``/ingest/data``,
+    ``/api/users/{uid}``) rather than the raw path, so label cardinality
+    stays bounded. WebSocket connections are passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            template = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.labels(method, template, str(status["code"])).inc()
+            HTTP_REQUEST_SECONDS.labels(method, template).observe(elapsed)
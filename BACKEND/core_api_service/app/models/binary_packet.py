@@ -0,0 +1,151 @@
+# File: BACKEND/core_api_service/app/models/binary_packet.py
+#
+# Fixed-layout binary encoding of DeviceData packets.
+#
+# A buffer is a plain concatenation of 48-byte little-endian records; there is
+# no framing header, so gateways can append records as they arrive. Each record
+# carries its own format version:
+#
+#   offset  type     field
+#   0       u8       version        (RECORD_VERSION = 1)
+#   1       u8       flags          bit0 fall_detected, bit1 tremor_detected, bit2 rigid
+#   2       u16      reserved       (0)
+#   4       u32      seq            reserved for a per-device sequence number;
+#                                   not read by the server (0 if unused)
+#   8       i64      timestamp_ms   Unix epoch milliseconds, UTC
+#   16      f32      accel_x_g
+#   20      f32      accel_y_g
+#   24      f32      accel_z_g
+#   28      f32      frequency_hz
+#   32      f32      amplitude_g
+#   36      f32      emg_wrist
+#   40      f32      emg_arm
+#   44      u32      reserved       (0)
+#
+# Sensor values are float32, which is well within the precision the hardware
+# reports; NaN and infinities are rejected. On decode each value is widened via its shortest float32 decimal
+# form, so a reading sent as 0.02 comes back as 0.02 rather than
+# 0.019999999552965164.
+
+import datetime
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from .schemas import DeviceData, RigidityData, SafetyData, TremorData
+
+RECORD_VERSION = 1
+
+FLAG_FALL = 0x01
+FLAG_TREMOR = 0x02
+FLAG_RIGID = 0x04
+
+RECORD_DTYPE = np.dtype([
+    ("version", "<u1"),
+    ("flags", "<u1"),
+    ("reserved0", "<u2"),
+    ("seq", "<u4"),
+    ("timestamp_ms", "<i8"),
+    ("accel_x_g", "<f4"),
+    ("accel_y_g", "<f4"),
+    ("accel_z_g", "<f4"),
+    ("frequency_hz", "<f4"),
+    ("amplitude_g", "<f4"),
+    ("emg_wrist", "<f4"),
+    ("emg_arm", "<f4"),
+    ("reserved1", "<u4"),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+
+_SENSOR_FIELDS = ("accel_x_g", "accel_y_g", "accel_z_g", "frequency_hz", "amplitude_g", "emg_wrist", "emg_arm")
+
+BINARY_CONTENT_TYPE = "application/vnd.stancesense.packet"
+
+
+def decode_records(buf: bytes) -> np.ndarray:
+    """View `buf` as a structured array of records without copying.
+
+    Raises `ValueError` if the buffer is not a whole number of records,
+    contains a record version this server does not understand, or has a
+    sensor value that is NaN or infinite.
+    """
+    if len(buf) % RECORD_SIZE:
+        raise ValueError(f"buffer length {len(buf)} is not a multiple of the {RECORD_SIZE}-byte record size")
+    records = np.frombuffer(buf, dtype=RECORD_DTYPE)
+    if len(records) and not np.all(records["version"] == RECORD_VERSION):
+        bad = int(records["version"][records["version"] != RECORD_VERSION][0])
+        raise ValueError(f"unsupported record version {bad} (expected {RECORD_VERSION})")
+    for name in _SENSOR_FIELDS:
+        finite = np.isfinite(records[name])
+        if not finite.all():
+            raise ValueError(f"record {int(np.argmin(finite))} has a non-finite {name}")
+    return records
+
+
+def timestamps_to_iso(timestamp_ms: np.ndarray) -> List[str]:
+    """Format epoch-millisecond timestamps as ISO 8601 UTC strings."""
+    iso = np.datetime_as_string(timestamp_ms.astype("datetime64[ms]"), unit="ms")
+    return [s + "Z" for s in iso.tolist()]
+
+
+def _widen(column: np.ndarray) -> List[float]:
+    """float32 column -> Python floats that print as the shortest float32 repr."""
+    return column.astype("U16").astype(np.float64).tolist()
+
+
+def records_to_device_data(records: np.ndarray, device_id: Optional[str] = None) -> List[DeviceData]:
+    """Build DeviceData models from decoded records.
+
+    The dtype guarantees field types and `decode_records` has rejected
+    non-finite values, so models are constructed without re-running
+    validation.
+    """
+    flags = records["flags"]
+    falls = ((flags & FLAG_FALL) != 0).tolist()
+    tremors = ((flags & FLAG_TREMOR) != 0).tolist()
+    rigids = ((flags & FLAG_RIGID) != 0).tolist()
+    columns = [_widen(records[name]) for name in _SENSOR_FIELDS]
+    timestamps = timestamps_to_iso(records["timestamp_ms"])
+
+    packets = []
+    for i, (ax, ay, az, freq, amp, wrist, arm) in enumerate(zip(*columns)):
+        packets.append(DeviceData.model_construct(
+            timestamp=timestamps[i],
+            device_id=device_id,
+            safety=SafetyData.model_construct(fall_detected=falls[i], accel_x_g=ax, accel_y_g=ay, accel_z_g=az),
+            tremor=TremorData.model_construct(frequency_hz=freq, amplitude_g=amp, tremor_detected=tremors[i]),
+            rigidity=RigidityData.model_construct(emg_wrist=wrist, emg_arm=arm, rigid=rigids[i]),
+        ))
+    return packets
+
+
+def _parse_timestamp_ms(timestamp: str) -> int:
+    ts = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def encode_records(packets: Iterable[DeviceData], start_seq: int = 0) -> bytes:
+    """Encode packets into a concatenated record buffer (for gateways, tools and tests)."""
+    packets = list(packets)
+    records = np.zeros(len(packets), dtype=RECORD_DTYPE)
+    for i, p in enumerate(packets):
+        records[i] = (
+            RECORD_VERSION,
+            (FLAG_FALL if p.safety.fall_detected else 0)
+            | (FLAG_TREMOR if p.tremor.tremor_detected else 0)
+            | (FLAG_RIGID if p.rigidity.rigid else 0),
+            0,
+            start_seq + i,
+            _parse_timestamp_ms(p.timestamp),
+            p.safety.accel_x_g,
+            p.safety.accel_y_g,
+            p.safety.accel_z_g,
+            p.tremor.frequency_hz,
+            p.tremor.amplitude_g,
+            p.rigidity.emg_wrist,
+            p.rigidity.emg_arm,
+            0,
+        )
+    return records.tobytes()
@@ -0,0 +1,83 @@
+# File: BACKEND/core_api_service/app/models/decode.py
+#
+# Fast-path decoding of device packets straight from request bytes.
+
+import datetime
+from typing import Annotated, Any, List
+
+from pydantic import BeforeValidator, ConfigDict, TypeAdapter
+
+from .schemas import DeviceData, RigidityData, SafetyData, TremorData
+
+
+def _coerce_flag(value: Any) -> Any:
+    """Legacy hardware sends 'yes'/'no' strings for boolean flags."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("yes", "true", "1")
+    return value
+
+
+def _expand_short_timestamp(value: Any) -> Any:
+    """Expand an 'HH:MM' timestamp to today's ISO 8601 UTC time."""
+    try:
+        if value and len(value) == 5 and value.count(":") == 1:
+            today = datetime.datetime.utcnow().date()
+            hh, mm = value.split(":")
+            return datetime.datetime(today.year, today.month, today.day, int(hh), int(mm)).isoformat() + "Z"
+    except Exception:
+        pass
+    return value
+
+
+Flag = Annotated[bool, BeforeValidator(_coerce_flag)]
+PacketTimestamp = Annotated[str, BeforeValidator(_expand_short_timestamp)]
+
+
+# Wire variants of the input schemas. They fold the normalization previously
+# done on a copied dict (`routes.ingest._normalize_packet`) into validation, so
+# pydantic-core builds the model directly from the JSON bytes. Instances are
+# still DeviceData (and dump identically), so downstream code is unchanged.
+
+class WireSafetyData(SafetyData):
+    model_config = ConfigDict(title="SafetyData")
+    fall_detected: Flag
+
+
+class WireTremorData(TremorData):
+    model_config = ConfigDict(title="TremorData")
+    tremor_detected: Flag
+
+
+class WireRigidityData(RigidityData):
+    model_config = ConfigDict(title="RigidityData")
+    rigid: Flag
+
+
+class WireDeviceData(DeviceData):
+    model_config = ConfigDict(title="DeviceData")
+    timestamp: PacketTimestamp
+    safety: WireSafetyData
+    tremor: WireTremorData
+    rigidity: WireRigidityData
+
+
+_packet_list = TypeAdapter(List[WireDeviceData])
+
+
+def decode_packet(raw: bytes) -> DeviceData:
+    """Parse, normalize and validate one JSON packet in a single pass.
+
+    Raises `pydantic.ValidationError` (a `ValueError`) on malformed JSON or
+    an invalid packet.
+    """
+    return WireDeviceData.model_validate_json(raw)
+
+
+def decode_packet_list(raw: bytes) -> List[DeviceData]:
+    """Decode a JSON array of packets; any invalid element fails the whole call."""
+    return _packet_list.validate_json(raw)
+
+
+def validate_packet(obj: Any) -> DeviceData:
+    """Validate an already-parsed packet dict with the same normalization rules."""
+    return WireDeviceData.model_validate(obj)
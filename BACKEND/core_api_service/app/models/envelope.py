@@ -0,0 +1,151 @@
+# File: BACKEND/core_api_service/app/models/envelope.py
+#
+# Serialize-once wrappers for a processed packet and its alert.
+#
+# One processed packet is written to Firestore twice (sensor_data and
+# processed_data), broadcast to the dashboard, and embedded in an alert
+# snapshot that is itself written and broadcast. The envelopes below build
+# the packet's dict and its JSON at most once each, on first use, and every
+# consumer shares those objects. Shared dicts must be treated as read-only.
+
+import re
+from typing import Any, Dict, Optional
+
+from pydantic_core import to_json
+
+from .schemas import Alert, ProcessedData
+
+_PROCESSED_MESSAGE_PREFIX = b'{"type":"processed_data","data":'
+_ALERT_MESSAGE_PREFIX = b'{"type":"alert","data":'
+_SNAPSHOT_KEY = b',"data_snapshot":'
+
+# A UTF-8 encoded non-ASCII character
+_UTF8_CHAR = re.compile(rb"[\xc0-\xff][\x80-\xbf]*")
+
+
+def _escape_char(match) -> bytes:
+    code = ord(match.group().decode("utf-8"))
+    if code < 0x10000:
+        return b"\\u%04x" % code
+    code -= 0x10000
+    return b"\\u%04x\\u%04x" % (0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+
+
+def _ascii_json(data: bytes) -> bytes:
+    """Escape non-ASCII characters as json.dumps does, so the decoded message
+    stays a compact one-byte-per-character str (care recommendations carry
+    emoji, which would otherwise widen it to four bytes per character)."""
+    if data.isascii():
+        return data
+    return _UTF8_CHAR.sub(_escape_char, data)
+
+
+class ProcessedEnvelope:
+    """
+    A `ProcessedData` plus its lazily built, shared serializations.
+
+    - `data`: ``processed.model_dump()``, for Firestore writes and alert snapshots
+    - `json`: the packet as compact, ASCII-only JSON bytes (pydantic-core, no
+      dict round trip)
+    - `message` / `message_text`: the ``processed_data`` WebSocket message,
+      with any broadcast-only fields from `extend` appended, as ASCII bytes
+      and as the str that text frames need
+
+    `message` is spliced from `json`, so the packet is encoded once however
+    many of these are used.
+    """
+
+    __slots__ = ("processed", "_extras", "_data", "_message_data", "_json", "_message", "_message_text")
+
+    def __init__(self, processed: ProcessedData):
+        self.processed = processed
+        self._extras: Dict[str, Any] = {}
+        self._data: Optional[dict] = None
+        self._message_data: Optional[dict] = None
+        self._json: Optional[bytes] = None
+        self._message: Optional[bytes] = None
+        self._message_text: Optional[str] = None
+
+    def extend(self, **fields):
+        """Add broadcast-only fields (e.g. care recommendations) to `message`."""
+        if self._message is not None or self._message_data is not None:
+            raise RuntimeError("message already serialized")
+        self._extras.update(fields)
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = self.processed.model_dump()
+        return self._data
+
+    @property
+    def message_data(self) -> dict:
+        """The ``data`` of `message` as a dict: `data` plus the `extend` fields (shallow copy)."""
+        if self._message_data is None:
+            self._message_data = {**self.data, **self._extras} if self._extras else self.data
+        return self._message_data
+
+    @property
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = _ascii_json(ProcessedData.__pydantic_serializer__.to_json(self.processed))
+        return self._json
+
+    @property
+    def message(self) -> bytes:
+        if self._message is None:
+            body = self.json
+            if self._extras:
+                # Same key order as dumping the dict with the extras added last
+                extras = _ascii_json(to_json(self._extras))
+                body = body[:-1] + b"," + extras[1:]
+            self._message = _PROCESSED_MESSAGE_PREFIX + body + b"}"
+        return self._message
+
+    @property
+    def message_text(self) -> str:
+        if self._message_text is None:
+            self._message_text = self.message.decode("ascii")
+        return self._message_text
+
+    def alert(self, alert: Alert) -> "AlertEnvelope":
+        """Wrap `alert`, whose snapshot is this packet."""
+        return AlertEnvelope(alert, self)
+
+
+class AlertEnvelope:
+    """
+    An `Alert` whose ``data_snapshot`` is a processed packet, sharing that
+    packet's dict and JSON instead of copying and re-encoding them.
+    """
+
+    __slots__ = ("alert", "snapshot", "_data", "_message", "_message_text")
+
+    def __init__(self, alert: Alert, snapshot: ProcessedEnvelope):
+        self.alert = alert
+        self.snapshot = snapshot
+        self._data: Optional[dict] = None
+        self._message: Optional[bytes] = None
+        self._message_text: Optional[str] = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            data = self.alert.model_dump(exclude={"data_snapshot"})
+            data["data_snapshot"] = self.snapshot.data
+            self._data = data
+        return self._data
+
+    @property
+    def message(self) -> bytes:
+        if self._message is None:
+            # data_snapshot is the last Alert field, so appending keeps the key order
+            head = _ascii_json(Alert.__pydantic_serializer__.to_json(self.alert, exclude={"data_snapshot"}))
+            self._message = _ALERT_MESSAGE_PREFIX + head[:-1] + _SNAPSHOT_KEY + self.snapshot.json + b"}}"
+        return self._message
+
+    @property
+    def message_text(self) -> str:
+        if self._message_text is None:
+            self._message_text = self.message.decode("ascii")
+        return self._message_text
@@ -17,6 +17,11 @@ class TremorData(BaseModel):
     frequency_hz: float
     amplitude_g: float
     tremor_detected: bool
+    # Optional raw accelerometer stream (g, oldest first) since the previous
+    # packet. When present the server estimates tremor itself and replaces
+    # the three fields above in the processed output.
+    samples_g: Optional[List[float]] = None
+    sample_rate_hz: Optional[float] = None
 
 class RigidityData(BaseModel):
     emg_wrist: float
@@ -5,6 +5,8 @@ import os
 import datetime
 
 from ..comms.firestore_client import get_firestore_db
+from ..services.token_verifier import token_verifier
+from ..services.profile_cache import profile_cache, get_user_doc, KIND_USER
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,6 +44,7 @@ def signup(body: SignupRequest):
                 "created_at": datetime.datetime.utcnow().isoformat() + "Z",
             }
             db.collection("users").document(uid).set(doc)
+            profile_cache.invalidate(uid, KIND_USER)
 
         return {"uid": uid, "status": "created"}
 
@@ -54,18 +57,14 @@ def login(body: LoginRequest):
     logger.info("ENTER POST /auth/login called")
     try:
         # Assume firebase_admin was initialized at application startup
-        from firebase_admin import auth as fb_auth
-
-        decoded = fb_auth.verify_id_token(body.id_token)
+        decoded = token_verifier.verify(body.id_token)
         uid = decoded.get("uid")
 
-        # Fetch user doc from Firestore
+        # Fetch user doc from Firestore (cached per user)
         db = get_firestore_db()
         user_doc = None
         if db and uid:
-            doc = db.collection("users").document(uid).get()
-            if doc.exists:
-                user_doc = doc.to_dict()
+            user_doc = get_user_doc(db, uid)
 
         return {"uid": uid, "user": user_doc}
 
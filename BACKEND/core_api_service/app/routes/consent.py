@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import os
 from ..comms.firestore_client import get_firestore_db
-import firebase_admin
-from firebase_admin import auth as fb_auth
+from ..services.token_verifier import verify_authorization
+from ..services.profile_cache import profile_cache, consent_ref, get_consent as cached_consent, KIND_CONSENT
 
 router = APIRouter()
 
@@ -14,17 +14,7 @@ class ConsentRequest(BaseModel):
 
 @router.post("/consent")
 def set_consent(body: ConsentRequest, authorization: str | None = None):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
-    try:
-        if authorization.lower().startswith("bearer "):
-            id_token = authorization.split(" ", 1)[1]
-        else:
-            id_token = authorization
-        decoded = fb_auth.verify_id_token(id_token)
-        uid = decoded.get("uid")
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    uid = verify_authorization(authorization)
 
     db = get_firestore_db()
     if not db:
@@ -32,8 +22,9 @@ def set_consent(body: ConsentRequest, authorization: str | None = None):
 
     try:
         # Store consent under users/{uid}/consent doc
-        doc_ref = db.collection("users").document(uid).collection("preferences").document("consent")
-        doc_ref.set({"consent": bool(body.consent)})
+        consent_ref(db, uid).set({"consent": bool(body.consent)})
+        # Alerting reads consent through the cache; make the change visible now
+        profile_cache.invalidate(uid, KIND_CONSENT)
         return {"uid": uid, "consent": body.consent}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -41,25 +32,12 @@ def set_consent(body: ConsentRequest, authorization: str | None = None):
 
 @router.get("/consent")
 def get_consent(authorization: str | None = None):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
-    try:
-        if authorization.lower().startswith("bearer "):
-            id_token = authorization.split(" ", 1)[1]
-        else:
-            id_token = authorization
-        decoded = fb_auth.verify_id_token(id_token)
-        uid = decoded.get("uid")
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    uid = verify_authorization(authorization)
 
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
     try:
-        doc = db.collection("users").document(uid).collection("preferences").document("consent").get()
-        if doc.exists:
-            return {"uid": uid, "consent": doc.to_dict().get("consent", False)}
-        return {"uid": uid, "consent": False}
+        return {"uid": uid, "consent": cached_consent(db, uid)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -4,40 +4,15 @@ from fastapi import APIRouter, HTTPException, Header, Query, Body
 from typing import Optional, List, Dict
 import logging
 from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import auth as fb_auth
 from ..comms.firestore_client import get_firestore_db
 from ..config import settings
 from ..models.schemas import MedicationLog, PatientNote
+from ..services.token_verifier import verify_authorization
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def _verify_token(authorization: Optional[str]) -> str:
-    """Verify Firebase ID token and return user ID."""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
-    
-    try:
-        if authorization.lower().startswith("bearer "):
-            id_token = authorization.split(" ", 1)[1]
-        else:
-            id_token = authorization
-        
-        # Allow simulator bypass
-        if id_token in ["simulator_test_token", "simulator_mode_bypass"]:
-            return "simulator_user_test_123"
-        
-        decoded = fb_auth.verify_id_token(id_token)
-        uid = decoded.get("uid")
-        if not uid:
-            raise HTTPException(status_code=401, detail="Invalid token: no uid")
-        return uid
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
-
-
 @router.get("/analytics/trends")
 async def get_symptom_trends(
     hours: int = Query(default=24, ge=1, le=168),
@@ -47,7 +22,7 @@ async def get_symptom_trends(
     Get symptom trends over the specified time period (default 24 hours).
     Returns time-series data of AI scores for charting.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
@@ -102,7 +77,7 @@ async def get_processed_history(
     Get paginated processed sensor data history.
     Returns most recent entries first.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
@@ -149,7 +124,7 @@ async def get_analytics_summary(
     Get summary statistics for the specified time period.
     Includes averages, peaks, fall count, critical events.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
@@ -232,7 +207,7 @@ async def get_hardware_status(authorization: Optional[str] = Header(default=None
     Get hardware device status including battery, signal strength, firmware version.
     Returns mock data for simulator mode, real device data when connected.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     
     # For simulator mode, return mock hardware status
     if uid == "simulator_user_test_123":
@@ -293,7 +268,7 @@ async def log_medication(
     """
     Log medication intake with timestamp, name, dosage, and optional notes.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
@@ -332,7 +307,7 @@ async def get_medication_history(
     Retrieve medication log history for the specified time period.
     Returns most recent entries first.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
@@ -384,7 +359,7 @@ async def submit_patient_note(
     """
     Submit a patient symptom note or observation.
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
@@ -424,7 +399,7 @@ async def get_notes_history(
     Retrieve patient notes history for the specified time period.
     Optionally filter by category (symptom, observation, general).
     """
-    uid = _verify_token(authorization)
+    uid = verify_authorization(authorization, allow_simulator=True)
     db = get_firestore_db()
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
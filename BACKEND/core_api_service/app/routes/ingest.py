@@ -1,31 +1,59 @@
 """Internal endpoint used by Node ingestion service.
 
-Implements POST /ingest/data which validates a device packet, normalizes fields,
-saves the raw packet to Firestore, prints an entry log, and enqueues background
-processing via FastAPI BackgroundTasks.
+Implements POST /ingest/data which decodes, normalizes and validates a device
+packet in one pass from the request bytes, durably appends the raw packet to
+the local write-ahead log (replicated to Firestore in the background; with
+WAL_ENABLED off, the default, or no Firestore backend it is queued on the
+write-behind writer instead),
+logs an ingest event, and enqueues background processing on the bounded
+processing queue (429/503 with Retry-After when it cannot take more work).
+
+POST /ingest/batch accepts many packets per request (JSON array or NDJSON) so
+forwarders can amortize auth, validation and task scheduling across a batch.
+POST /ingest/binary does the same for buffers of fixed-layout binary records.
+
+All three endpoints are idempotent within DEDUP_WINDOW_SECONDS: a retried
+packet (same device_id and timestamp) or request (same Idempotency-Key header)
+is acknowledged with its original id and status "duplicate" and does no work.
+A retry that arrives while the first attempt is still being handled waits
+for that attempt's outcome.
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Header
+from fastapi import APIRouter, HTTPException, Header, Request, Response
 from pydantic import BaseModel, Field
 from typing import Optional
 import uuid
 import datetime
 import asyncio
+import functools
+import json
 
-from ..comms.firestore_client import get_firestore_db, save_sensor_data, save_alert
-import firebase_admin
-from firebase_admin import auth as fb_auth
-from ..services.ai_processor import process_data_with_ai
+from ..comms.firestore_client import get_firestore_db, firestore_unavailable, save_sensor_data, save_alert, firestore_writer, raw_packet_record
+from ..comms.wal import packet_wal
+from ..services.ai_processor import process_batch, process_data_with_ai
 from ..services.rag_agent import generate_contextual_alert
 from ..services.care_recommendations import generate_care_recommendations
 from ..comms.manager import frontend_manager
+from ..services.processing_queue import processing_queue, QueueFullError, QueueClosedError
+from ..services.token_verifier import verify_authorization
+from ..services.dedup import ingest_dedup
+from ..services.profile_cache import get_consent_async
 from ..models.schemas import ProcessedData, Alert as AlertModel, DeviceData
+from ..models.envelope import ProcessedEnvelope
+from ..models.decode import decode_packet, decode_packet_list, validate_packet
+from ..models.binary_packet import decode_records, records_to_device_data
+from ..logging_setup import get_event_logger
+from ..metrics import stage, INGEST_PACKETS
 import logging
 
 logger = logging.getLogger(__name__)
+events = get_event_logger(__name__)
 
 router = APIRouter()
 
+# Upper bound on packets accepted by a single /ingest/batch request
+MAX_BATCH_PACKETS = 1000
+
 # Use shared manager imported from app.comms.manager
 # frontend_manager is the shared singleton instance
 
@@ -36,6 +64,10 @@ def _normalize_packet(raw: dict) -> dict:
 	This converts 'yes'/'no' strings to booleans and ensures timestamps are
 	ISO 8601 where possible. We do minimal mutation; server still accepts
 	different formats but normalizes common ones.
+
+	The ingest routes now decode with `models.decode`, which applies the same
+	rules during validation; this dict-based path is kept as the reference
+	for `tools/bench_decode.py`.
 	"""
 	packet = dict(raw)
 
@@ -73,237 +105,528 @@ def _normalize_packet(raw: dict) -> dict:
 	return packet
 
 
-@router.post("/data", status_code=202)
-async def ingest_data(body: dict, background_tasks: BackgroundTasks, authorization: str | None = Header(default=None)):
-	print("\n" + "="*70)
-	print("🔬 [FastAPI] DATA INGESTION STARTED")
-	print("="*70)
+def _sensor_data_ref(db, uid: str, doc_id: str):
+	# Path: artifacts/stancesense/users/{uid}/sensor_data/{doc_id}
+	return db.collection("artifacts").document("stancesense").collection("users").document(uid).collection("sensor_data").document(doc_id)
 
-	# Authenticate request via Firebase ID token in Authorization header
-	uid = None
-	if not authorization:
-		raise HTTPException(status_code=401, detail="Missing Authorization header")
-	try:
-		# Expect header like: Bearer <id_token>
-		if authorization.lower().startswith("bearer "):
-			id_token = authorization.split(" ", 1)[1]
-		else:
-			id_token = authorization
-		
-		# SIMULATOR MODE BYPASS: For testing without real Firebase users
-		if id_token == "simulator_test_token" or id_token == "simulator_mode_bypass":
-			uid = "simulator_user_test_123"  # Test user ID
-			print(f"🎮 [FastAPI] DEMO MODE - User: {uid}")
-		else:
-			# Normal Firebase authentication
-			decoded = fb_auth.verify_id_token(id_token)
-			uid = decoded.get("uid")
-			print(f"🔐 [FastAPI] Authenticated user: {uid}")
-	except Exception as e:
-		raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
 
-	# Normalize
-	packet = _normalize_packet(body)
+def _save_raw_batch(uid: str, accepted: list) -> bool:
+	"""Queue raw packets on the write-behind writer, which commits them in batches."""
+	db = get_firestore_db()
+	if not (db and uid):
+		return False
+	saved = True
+	for doc_id, data in accepted:
+		saved = firestore_writer.set(_sensor_data_ref(db, uid, doc_id), data.model_dump()) and saved
+	return saved
 
-	# Validate using pydantic
-	try:
-		data = DeviceData(**packet)
-		print("✅ [FastAPI] Packet validated successfully")
-		print(f"📊 [FastAPI] Data: Tremor={data.tremor.amplitude_g}g, Rigidity={data.rigidity.emg_wrist}, Fall={data.safety.fall_detected}")
-	except Exception as e:
-		print(f"❌ [FastAPI] VALIDATION ERROR: {str(e)}")
-		print(f"📦 [FastAPI] Received packet: {packet}")
-		raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
 
-	# Save raw packet to Firestore
-	db = get_firestore_db()
-	doc_id = str(uuid.uuid4())
-	saved = False
-	if db and uid:
+async def _persist_raw(uid: str, accepted: list) -> bool:
+	"""Persist raw packets before acknowledging them.
+
+	With the write-ahead log enabled this returns once the packets are
+	durably on local disk; the WAL replicator copies them to Firestore in the
+	background. Otherwise, or when start-up found no Firestore backend to
+	replicate to, they are queued on the write-behind writer.
+	"""
+	with stage("raw_persist"):
+		if packet_wal is None or firestore_unavailable():
+			return _save_raw_batch(uid, accepted)
 		try:
-			# Path: artifacts/stancesense/users/{uid}/sensor_data/{doc_id}
-			doc_ref = db.collection("artifacts").document("stancesense").collection("users").document(uid).collection("sensor_data").document(doc_id)
-			doc_ref.set(data.model_dump())
-			saved = True
-			print(f"💾 [FastAPI] Saved to Firestore: {doc_id}")
-		except Exception as e:
-			print(f"❌ [FastAPI] Firestore error: {e}")
+			await packet_wal.append([raw_packet_record(uid, doc_id, data) for doc_id, data in accepted])
+		except OSError as e:
+			events.error("ingest.wal_append_failed", uid=uid, packets=len(accepted), error=e)
+			raise HTTPException(status_code=503, detail="Could not persist packets, retry later", headers={"Retry-After": "1"})
+		return True
+
+
+def _decode_batch_body(raw: bytes):
+	"""Decode a batch request body into ``(packets, rejected, total)``.
+
+	``packets`` holds ``(index, DeviceData)`` pairs, indexed by position in
+	the body like the ``rejected`` entries.
+
+	Accepts either a JSON array (``[{...}, {...}]``) or NDJSON (one JSON
+	object per line). A clean JSON array is decoded in one pass; if any
+	element is invalid the array is re-validated element by element so the
+	valid packets are still accepted. Raises ``ValueError`` when the body
+	itself is not parseable.
+	"""
+	text = raw.strip()
+	if not text:
+		return [], [], 0
+	if text[:1] == b"[":
+		try:
+			packets = decode_packet_list(text)
+			return list(enumerate(packets)), [], len(packets)
+		except ValueError:
+			items = json.loads(text)
+			if not isinstance(items, list):
+				raise ValueError("expected a JSON array")
+			validate = validate_packet
 	else:
-		if not db:
-			print("⚠️  [FastAPI] Firestore not initialized - data processed in-memory only")
-		saved = False
+		items = [line for line in text.splitlines() if line.strip()]
+		validate = decode_packet
 
-	# Enqueue AI processing in background (async-safe)
-	async def _process_and_save_async():
+	packets = []
+	rejected = []
+	for index, item in enumerate(items):
 		try:
-			print("\n🤖 [AI] Starting AI processing...")
+			packets.append((index, validate(item)))
+		except ValueError as e:
+			rejected.append({"index": index, "error": str(e)})
+	return packets, rejected, len(items)
+
+
+def _stream_key(uid: str, data: DeviceData) -> str:
+	# Windowed features are tracked per user and device
+	return f"{uid}:{data.device_id or ''}"
+
+
+async def _process_and_save_async(data: DeviceData, uid: str, doc_id: str, processed: Optional[ProcessedData] = None):
+	"""Run AI, care recommendations, persistence, RAG alerting and broadcast for one packet.
+
+	`processed` is passed when the packet was already scored as part of a batch.
+	"""
+	try:
+		if processed is None:
 			# Run AI processing (async). process_data_with_ai is async, so await it directly.
-			processed: ProcessedData = await process_data_with_ai(data)
-			print("="*70)
-			print("🧠 [AI] ANALYSIS COMPLETE")
-			print("="*70)
-			
-			# Access scores safely
-			scores = processed.scores if hasattr(processed, 'scores') else processed.get('scores', {})
-			analysis = processed.analysis if hasattr(processed, 'analysis') else processed.get('analysis', {})
-			
-			print(f"🫨 Tremor Score: {scores.get('tremor', 0):.3f}")
-			print(f"🔒 Rigidity Score: {scores.get('rigidity', 0):.3f}")
-			print(f"🚶 Gait Score: {scores.get('gait', 0):.3f}")
-			print(f"🐌 Slowness Score: {scores.get('slowness', 0):.3f}")
-			
-			if hasattr(analysis, 'is_tremor_confirmed'):
-				print(f"✅ Tremor Confirmed: {analysis.is_tremor_confirmed}")
-				print(f"✅ Rigid Detected: {analysis.is_rigid}")
-				print(f"⚖️  Gait Stability: {analysis.gait_stability_score:.2f}")
-			else:
-				print(f"✅ Tremor Confirmed: {analysis.get('is_tremor_confirmed', False)}")
-				print(f"✅ Rigid Detected: {analysis.get('is_rigid', False)}")
-				print(f"⚖️  Gait Stability: {analysis.get('gait_stability_score', 0):.2f}")
-			print("="*70)
-
-			# Persist processed data to Firestore via helper
-			db = get_firestore_db()
-			if db and uid:
-				try:
-					await save_sensor_data(db, "stancesense", uid, processed)
+			with stage("ai_process"):
+				processed = await process_data_with_ai(data, stream_key=_stream_key(uid, data))
+		scores = processed.scores or {}
+		events.debug(
+			"ai.scored",
+			doc_id=doc_id,
+			uid=uid,
+			tremor=scores.get("tremor", 0.0),
+			rigidity=scores.get("rigidity", 0.0),
+			gait=scores.get("gait", 0.0),
+			slowness=scores.get("slowness", 0.0),
+			tremor_confirmed=processed.analysis.is_tremor_confirmed,
+			rigid=processed.analysis.is_rigid,
+			gait_stability=processed.analysis.gait_stability_score,
+		)
+		# Serialized at most once, shared by the Firestore writes, broadcasts and alert snapshot
+		envelope = ProcessedEnvelope(processed)
+
+		# Persist processed data to Firestore via helper
+		db = get_firestore_db()
+		if db and uid:
+			try:
+				with stage("processed_persist"):
+					await save_sensor_data(db, "stancesense", uid, processed, payload=envelope.data)
 					# Also write to processed_data collection for historical records
 					proc_ref = db.collection("artifacts").document("stancesense").collection("users").document(uid).collection("processed_data").document(doc_id)
-					await asyncio.to_thread(proc_ref.set, processed.model_dump())
-					print(f"💾 [AI] Saved processed data: {doc_id}")
-				except Exception as e:
-					error_msg = str(e)
-					if "Invalid JWT Signature" in error_msg or "invalid_grant" in error_msg:
-						print(f"🔴 [AI] FIRESTORE WRITE FAILED - Invalid service account key")
-						print(f"💡 Download fresh key from Firebase Console")
-						print(f"🎮 Continuing in DEMO MODE without database writes")
-					else:
-						print(f"❌ [AI] Error saving processed data: {e}")
-
-			# Determine critical events
-			critical_event = None
-			if processed.safety.fall_detected:
-				critical_event = "fall"
-				print("🚨 [AI] CRITICAL: FALL DETECTED!")
-			elif processed.analysis.is_rigid:
-				critical_event = "rigidity_spike"
-				print("⚠️  [AI] WARNING: High rigidity detected")
-			elif processed.analysis.is_tremor_confirmed:
-				print("⚠️  [AI] WARNING: Tremor confirmed")
-
-			# Generate care recommendations and game suggestions
-			try:
-				care_data = generate_care_recommendations(processed)
-				# Add to processed data
-				processed_dict = processed.model_dump()
-				processed_dict['care_recommendations'] = care_data['care_recommendations']
-				processed_dict['recommended_game'] = care_data['recommended_game']
-				print(f"💡 [Care] Generated {len(care_data['care_recommendations'])} recommendations")
-				print(f"🎮 [Care] Recommended game: {care_data['recommended_game']['name']}")
+					firestore_writer.set(proc_ref, envelope.data)
+				events.debug("ai.queued_for_save", doc_id=doc_id)
 			except Exception as e:
-				print(f"❌ [Care] Error generating recommendations: {e}")
-				processed_dict = processed.model_dump()
+				error_msg = str(e)
+				if "Invalid JWT Signature" in error_msg or "invalid_grant" in error_msg:
+					events.warning_limited("firestore.invalid_credentials", stage="processed_data", hint="download a fresh service account key")
+				else:
+					events.error("ai.save_failed", doc_id=doc_id, error=e)
+
+		# Determine critical events
+		critical_event = None
+		if processed.safety.fall_detected:
+			critical_event = "fall"
+		elif processed.analysis.is_rigid:
+			critical_event = "rigidity_spike"
+
+		# Generate care recommendations and game suggestions
+		try:
+			with stage("care_recommendations"):
+				care_data = generate_care_recommendations(processed)
+			# Add to the broadcast (not persisted)
+			envelope.extend(
+				care_recommendations=care_data['care_recommendations'],
+				recommended_game=care_data['recommended_game'],
+			)
+		except Exception as e:
+			events.error("care.failed", doc_id=doc_id, error=e)
 
-			# ALWAYS broadcast processed data first (so frontend gets scores)
-			try:
-				message = {
-					"type": "processed_data",
-					"data": processed_dict
-				}
-				import json
-				await frontend_manager.broadcast(json.dumps(message))
-				print("📡 [AI] Processed data broadcasted to frontend")
-			except Exception as e:
-				print(f"❌ [AI] Error broadcasting processed data: {e}")
+		# ALWAYS broadcast processed data first (so frontend gets scores)
+		try:
+			with stage("broadcast"):
+				# Rendered only if a dashboard sends it (rate-limited per device, deltas on request)
+				await frontend_manager.publish_state(
+					uid,
+					"processed_data",
+					key=f"processed:{uid}:{processed.device_id}",
+					render=lambda: envelope.message_text,
+					state=lambda: envelope.message_data,
+				)
+		except Exception as e:
+			events.error("broadcast.failed", doc_id=doc_id, type="processed_data", error=e)
 
-			# ADDITIONALLY send alert if critical event detected
-			if critical_event:
+		# ADDITIONALLY send alert if critical event detected
+		if critical_event:
+			try:
+				# Check user consent for external AI before calling RAG
+				consent_flag = False
 				try:
-					print(f"🎯 [RAG] Generating contextual alert for: {critical_event}")
-					# Check user consent for external AI before calling RAG
+					if db and uid:
+						with stage("consent_lookup"):
+							consent_flag = await get_consent_async(db, uid)
+				except Exception:
+					# If we cannot determine consent, default to False (do not call external LLM)
 					consent_flag = False
-					try:
-						consent_doc = db.collection("users").document(uid).collection("preferences").document("consent").get()
-						if consent_doc and consent_doc.exists:
-							consent_flag = consent_doc.to_dict().get("consent", False)
-					except Exception:
-						# If we cannot determine consent, default to False (do not call external LLM)
-						consent_flag = False
-
-					# Generate alert via RAG (async) — pass consent flag
+
+				# Generate alert via RAG (async) — pass consent flag
+				with stage("rag_alert"):
 					alert_text = await generate_contextual_alert(processed, critical_event, consent=consent_flag)
-					print("="*70)
-					print("🎯 [RAG] ALERT GENERATED")
-					print("="*70)
-					print(f"📝 Message: {alert_text}")
-					print("="*70)
-					
-					# Map event types to frontend-compatible formats
-					event_type_map = {
-						"fall": "fall",
-						"rigidity_spike": "rigidity",
-						"tremor_confirmed": "tremor"
-					}
-					
-					# Determine severity
-					severity = "critical" if critical_event == "fall" else "warning"
-					
-					alert_doc = AlertModel(
-						id=f"{processed.timestamp}_{critical_event}",
-						timestamp=processed.timestamp,
-						event_type=critical_event,
-						severity=severity,
-						type=event_type_map.get(critical_event, critical_event),
-						message=alert_text,
-						data_snapshot=processed.model_dump()
-					)
-
-					# Save alert using helper
-					if db and uid:
-						try:
-							await save_alert(db, "stancesense", uid, alert_doc)
-							print(f"💾 [RAG] Alert saved to Firestore")
-						except Exception as e:
-							print(f"❌ [RAG] Error saving alert: {e}")
 
-					# Broadcast alert to frontend with type wrapper
+				# Map event types to frontend-compatible formats
+				event_type_map = {
+					"fall": "fall",
+					"rigidity_spike": "rigidity",
+					"tremor_confirmed": "tremor"
+				}
+
+				# Determine severity
+				severity = "critical" if critical_event == "fall" else "warning"
+				events.info("alert.generated", doc_id=doc_id, uid=uid, event_type=critical_event, severity=severity)
+
+				alert_doc = AlertModel(
+					id=f"{processed.timestamp}_{critical_event}",
+					timestamp=processed.timestamp,
+					event_type=critical_event,
+					severity=severity,
+					type=event_type_map.get(critical_event, critical_event),
+					message=alert_text,
+					data_snapshot=envelope.data
+				)
+				alert_envelope = envelope.alert(alert_doc)
+
+				# Save alert using helper
+				if db and uid:
 					try:
-						message = {
-							"type": "alert",
-							"data": alert_doc.model_dump()
-						}
-						import json
-						await frontend_manager.broadcast(json.dumps(message))
-						print("📡 [RAG] Alert broadcasted to frontend\n")
+						with stage("alert_persist"):
+							await save_alert(db, "stancesense", uid, alert_doc, payload=alert_envelope.data)
 					except Exception as e:
-						print(f"❌ [RAG] Error broadcasting alert: {e}")
+						events.error("alert.save_failed", doc_id=doc_id, error=e)
+
+				# Broadcast alert to frontend with type wrapper
+				try:
+					with stage("alert_broadcast"):
+						await frontend_manager.publish(alert_envelope.message_text, uid, "alert", priority=True)
 				except Exception as e:
-					print(f"❌ [RAG] Error generating contextual alert: {e}")
-		except Exception as e:
-			print(f"❌ [AI] Error in background AI processing: {e}\n")
-			logger.exception("Error in background AI processing: %s", e)
+					events.error("broadcast.failed", doc_id=doc_id, type="alert", error=e)
+			except Exception as e:
+				events.error("alert.failed", doc_id=doc_id, event_type=critical_event, error=e)
+	except Exception as e:
+		events.exception("ai.failed", doc_id=doc_id, uid=uid, error=e)
+
+
+def _reserve_processing(weight: int = 1):
+	"""Reserve room on the bounded processing queue, mapping saturation to HTTP errors."""
+	try:
+		processing_queue.reserve(weight)
+	except QueueFullError as e:
+		raise HTTPException(status_code=429, detail="Processing queue is full, retry later", headers={"Retry-After": str(e.retry_after)})
+	except QueueClosedError:
+		raise HTTPException(status_code=503, detail="Service is shutting down", headers={"Retry-After": "5"})
+
+
+async def _persist_and_enqueue(uid: str, accepted: list, job) -> bool:
+	"""Persist raw packets, then queue their processing.
+
+	Queue room is reserved first, so a saturated queue rejects the packets
+	without leaving raw records behind for the client's retry; the job is
+	only queued once the packets are persisted, so a failed append (503)
+	does not get them processed twice when the client retries.
+	"""
+	weight = len(accepted)
+	_reserve_processing(weight)
+	try:
+		saved = await _persist_raw(uid, accepted)
+	except BaseException:
+		processing_queue.release(weight)
+		raise
+	try:
+		processing_queue.submit(uid, job, weight=weight, reserved=True)
+	except QueueClosedError:
+		# Persisted, so still acknowledged; shutdown began while it was written
+		events.warning("ingest.processing_skipped", uid=uid, packets=weight)
+	return saved
+
+
+def _packet_key(uid: str, data: DeviceData):
+	"""Natural idempotency key for a packet, or None if it cannot be identified.
+
+	A device never emits two packets with the same timestamp, so retries of
+	one packet share ``(device_id, timestamp)``. Packets without a device id
+	(legacy hardware with minute-resolution ``HH:MM`` timestamps) are only
+	deduplicated through the ``Idempotency-Key`` header.
+	"""
+	if data.device_id:
+		return (uid, data.device_id, data.timestamp)
+	return None
+
+
+def _request_key(uid: str, idempotency_key: str | None):
+	return (uid, "request", idempotency_key) if idempotency_key else None
+
+
+def _split_duplicates(uid: str, packets, prior: dict):
+	"""Assign doc ids to new packets and resolve retried ones to their original id.
+
+	`prior` maps the packet keys already accepted to their acknowledgement
+	(`DedupClaim.prior`). Returns ``(accepted, duplicates, new_keys)``. New
+	keys are only remembered by the caller once the packets have been
+	queued, so a 429 does not turn the client's retry into a false duplicate.
+	"""
+	accepted = []
+	duplicates = []
+	new_keys = {}
+	for index, data in packets:
+		key = _packet_key(uid, data)
+		if key is not None:
+			prior_id = new_keys.get(key)
+			if prior_id is None and key in prior:
+				prior_id = prior[key]["id"]
+			if prior_id is not None:
+				duplicates.append({"index": index, "id": prior_id})
+				continue
+		doc_id = str(uuid.uuid4())
+		if key is not None:
+			new_keys[key] = doc_id
+		accepted.append((doc_id, data))
+	return accepted, duplicates, new_keys
+
+
+def _dedup_keys(uid: str, request_key, packets) -> list:
+	"""The request's and its packets' idempotency keys, to claim before accepting them."""
+	keys = [request_key] if request_key is not None else []
+	keys.extend(key for key in (_packet_key(uid, data) for _, data in packets) if key is not None)
+	return keys
+
+
+def _remember_accepted(uid: str, new_keys: dict, saved: bool):
+	for key, doc_id in new_keys.items():
+		ingest_dedup.remember(key, {"status": "accepted", "id": doc_id, "saved": saved, "user": uid})
+
+
+def _duplicate_response(response: Response, prior: dict, endpoint: str) -> dict:
+	"""Replay the original acknowledgement for a retried request (200, no new work)."""
+	INGEST_PACKETS.labels(endpoint, "duplicate").inc(len(prior["ids"]) if "ids" in prior else 1)
+	response.status_code = 200
+	return {**prior, "status": "duplicate"}
+
+
+def _count_packets(endpoint: str, accepted: int, duplicates: int = 0, rejected: int = 0):
+	for result, n in (("accepted", accepted), ("duplicate", duplicates), ("rejected", rejected)):
+		if n:
+			INGEST_PACKETS.labels(endpoint, result).inc(n)
+
+
+async def _process_batch_async(items: list, uid: str):
+	"""Process an accepted batch in arrival order within a single background task.
+
+	The whole batch is scored with one model call per model; persistence,
+	alerting and broadcast then run per packet.
+	"""
+	packets = [data for _, data in items]
+	try:
+		with stage("ai_process_batch"):
+			scored = await process_batch(packets, stream_keys=[_stream_key(uid, data) for data in packets])
+	except Exception as e:
+		events.exception("ai.failed", uid=uid, packets=len(packets), error=e)
+		return
+	for (doc_id, data), processed in zip(items, scored):
+		await _process_and_save_async(data, uid, doc_id, processed=processed)
+
+
+@router.post("/data", status_code=202)
+async def ingest_data(
+	request: Request,
+	response: Response,
+	authorization: str | None = Header(default=None),
+	idempotency_key: str | None = Header(default=None),
+):
+	# Authenticate request via Firebase ID token in Authorization header
+	uid = verify_authorization(authorization, allow_simulator=True)
+
+	# Retries carrying an Idempotency-Key are acknowledged before decoding
+	request_key = _request_key(uid, idempotency_key)
+	if request_key is not None:
+		prior = ingest_dedup.lookup(request_key)
+		if prior is not None:
+			events.debug("ingest.duplicate", uid=uid, id=prior.get("id"))
+			return _duplicate_response(response, prior, "data")
+
+	# Decode, normalize and validate straight from the request bytes
+	body = await request.body()
+	try:
+		with stage("decode"):
+			data = decode_packet(body)
+	except ValueError as e:
+		_count_packets("data", accepted=0, rejected=1)
+		events.warning_limited("ingest.invalid_packet", interval=10.0, uid=uid, error=e)
+		raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
+
+	# Held in flight until accepted, so concurrent retries wait for this attempt
+	keys = [key for key in (request_key, _packet_key(uid, data)) if key is not None]
+	claim = await ingest_dedup.claim(keys)
+	try:
+		for key in keys:
+			prior = claim.prior.get(key)
+			if prior is not None:
+				events.debug("ingest.duplicate", uid=uid, id=prior.get("id"))
+				return _duplicate_response(response, prior, "data")
+
+		# Durably log the raw packet before acknowledging it, then queue AI processing
+		doc_id = str(uuid.uuid4())
+		saved = await _persist_and_enqueue(uid, [(doc_id, data)], functools.partial(_process_and_save_async, data, uid, doc_id))
+
+		result = {"status": "accepted", "id": doc_id, "saved": saved, "user": uid}
+		for key in keys:
+			ingest_dedup.remember(key, result)
+	finally:
+		ingest_dedup.release(claim)
+
+	_count_packets("data", accepted=1)
+	events.debug("ingest.accepted", doc_id=doc_id, uid=uid, saved=saved)
+	return result
+
+
+@router.post("/batch", status_code=202)
+async def ingest_batch(
+	request: Request,
+	response: Response,
+	authorization: str | None = Header(default=None),
+	idempotency_key: str | None = Header(default=None),
+):
+	"""Accept many device packets in one request.
+
+	The body is a JSON array or NDJSON stream of DeviceData packets. The token
+	is verified once, every packet is normalized and validated in a single
+	pass, raw packets are written with Firestore batch commits, and the valid
+	packets are handed to the AI pipeline as one background task. Invalid
+	packets are reported by index in ``rejected`` rather than failing the
+	whole upload, and packets already accepted within the dedup window are
+	reported by index in ``duplicates`` with their original id.
+	"""
+	uid = verify_authorization(authorization, allow_simulator=True)
 
-	# Schedule the async task without blocking the request
-	asyncio.create_task(_process_and_save_async())
+	request_key = _request_key(uid, idempotency_key)
+	if request_key is not None:
+		prior = ingest_dedup.lookup(request_key)
+		if prior is not None:
+			return _duplicate_response(response, prior, "batch")
 
-	print(f"✅ [FastAPI] Packet accepted for processing: {doc_id}\n")
-	return {"status": "accepted", "id": doc_id, "saved": saved, "user": uid}
+	try:
+		body = await request.body()
+		with stage("decode"):
+			packets, rejected, total = _decode_batch_body(body)
+	except (ValueError, UnicodeDecodeError) as e:
+		raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+	if not total:
+		raise HTTPException(status_code=400, detail="Empty batch")
+	if total > MAX_BATCH_PACKETS:
+		raise HTTPException(status_code=413, detail=f"Batch too large: {total} packets (max {MAX_BATCH_PACKETS})")
+
+	if not packets:
+		raise HTTPException(status_code=400, detail={"message": "No valid packets in batch", "rejected": rejected})
+
+	claim = await ingest_dedup.claim(_dedup_keys(uid, request_key, packets))
+	try:
+		if request_key in claim.prior:
+			return _duplicate_response(response, claim.prior[request_key], "batch")
+		accepted, duplicates, new_keys = _split_duplicates(uid, packets, claim.prior)
+		saved = False
+		if accepted:
+			saved = await _persist_and_enqueue(uid, accepted, functools.partial(_process_batch_async, accepted, uid))
+
+		result = {
+			"status": "accepted",
+			"ids": [doc_id for doc_id, _ in accepted],
+			"accepted": len(accepted),
+			"rejected": rejected,
+			"duplicates": duplicates,
+			"saved": saved,
+			"user": uid,
+		}
+		_remember_accepted(uid, new_keys, saved)
+		if request_key is not None:
+			ingest_dedup.remember(request_key, result)
+	finally:
+		ingest_dedup.release(claim)
+
+	_count_packets("batch", len(accepted), len(duplicates), len(rejected))
+	events.debug("ingest.batch_accepted", uid=uid, accepted=len(accepted), rejected=len(rejected), duplicates=len(duplicates), saved=saved)
+	return result
+
+
+@router.post("/binary", status_code=202)
+async def ingest_binary(
+	request: Request,
+	response: Response,
+	authorization: str | None = Header(default=None),
+	x_device_id: str | None = Header(default=None),
+	idempotency_key: str | None = Header(default=None),
+):
+	"""Accept a buffer of fixed-layout binary packet records.
+
+	The body is a concatenation of records in the format documented in
+	`models.binary_packet` (Content-Type ``application/vnd.stancesense.packet``).
+	The buffer is viewed as a NumPy structured array without copying and the
+	records are handed to the AI pipeline as one batch. ``X-Device-Id``, if
+	sent, applies to every record in the buffer and enables per-record
+	duplicate suppression on ``(device_id, timestamp)``.
+	"""
+	uid = verify_authorization(authorization, allow_simulator=True)
+
+	request_key = _request_key(uid, idempotency_key)
+	if request_key is not None:
+		prior = ingest_dedup.lookup(request_key)
+		if prior is not None:
+			return _duplicate_response(response, prior, "binary")
+
+	try:
+		body = await request.body()
+		with stage("decode"):
+			records = decode_records(body)
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=f"Invalid binary body: {e}")
+	if not len(records):
+		raise HTTPException(status_code=400, detail="Empty batch")
+	if len(records) > MAX_BATCH_PACKETS:
+		raise HTTPException(status_code=413, detail=f"Batch too large: {len(records)} packets (max {MAX_BATCH_PACKETS})")
+
+	packets = list(enumerate(records_to_device_data(records, device_id=x_device_id)))
+	claim = await ingest_dedup.claim(_dedup_keys(uid, request_key, packets))
+	try:
+		if request_key in claim.prior:
+			return _duplicate_response(response, claim.prior[request_key], "binary")
+		accepted, duplicates, new_keys = _split_duplicates(uid, packets, claim.prior)
+		saved = False
+		if accepted:
+			saved = await _persist_and_enqueue(uid, accepted, functools.partial(_process_batch_async, accepted, uid))
+
+		result = {
+			"status": "accepted",
+			"ids": [doc_id for doc_id, _ in accepted],
+			"accepted": len(accepted),
+			"duplicates": duplicates,
+			"saved": saved,
+			"user": uid,
+		}
+		_remember_accepted(uid, new_keys, saved)
+		if request_key is not None:
+			ingest_dedup.remember(request_key, result)
+	finally:
+		ingest_dedup.release(claim)
+
+	_count_packets("binary", len(accepted), len(duplicates))
+	events.debug("ingest.binary_accepted", uid=uid, records=len(accepted), duplicates=len(duplicates), saved=saved)
+	return result
 
 
 @router.get("/raw")
 async def get_raw_sensor_data(limit: int = 10, authorization: str | None = Header(default=None)):
 	"""Return the most recent raw sensor data documents for the authenticated user."""
-	if not authorization:
-		raise HTTPException(status_code=401, detail="Missing Authorization header")
-	try:
-		if authorization.lower().startswith("bearer "):
-			id_token = authorization.split(" ", 1)[1]
-		else:
-			id_token = authorization
-		decoded = fb_auth.verify_id_token(id_token)
-		uid = decoded.get("uid")
-	except Exception as e:
-		raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+	uid = verify_authorization(authorization)
 
 	db = get_firestore_db()
 	if not db:
@@ -317,4 +640,3 @@ async def get_raw_sensor_data(limit: int = 10, authorization: str | None = Heade
 		return {"items": items}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
-
@@ -402,8 +402,8 @@ async def broadcast_rag_insights(
             }
         }
         
-        await frontend_manager.broadcast(json.dumps(message))
-        logger.info(f"📡 Broadcasted RAG insights to {frontend_manager.active_connections} connected frontends")
+        await frontend_manager.publish(json.dumps(message), user_id, "rag_analysis", key=f"rag_insights:{user_id}")
+        logger.info(f"📡 Published RAG insights for {user_id} to subscribed frontends")
         
     except Exception as e:
         logger.error(f"Error broadcasting RAG insights: {e}")
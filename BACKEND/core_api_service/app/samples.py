@@ -0,0 +1,24 @@
+# File: BACKEND/core_api_service/app/samples.py
+#
+# Windows of recent samples behind the percentiles reported by stats().
+#
+# Unlike the histograms in `metrics`, these keep the last SAMPLE_WINDOW raw
+# values, so a /stats endpoint shows exact percentiles of recent traffic.
+
+# Number of recent samples kept for percentile estimates in stats()
+SAMPLE_WINDOW = 1024
+
+
+def summarize(samples) -> dict:
+    """Count, mean, p50, p95 and max of durations in seconds, reported in milliseconds."""
+    if not samples:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "count": n,
+        "mean_ms": round(sum(ordered) / n * 1000.0, 3),
+        "p50_ms": round(ordered[int(0.50 * (n - 1))] * 1000.0, 3),
+        "p95_ms": round(ordered[int(0.95 * (n - 1))] * 1000.0, 3),
+        "max_ms": round(ordered[-1] * 1000.0, 3),
+    }
@@ -1,54 +1,51 @@
 # File: BACKEND/core_api_service/app/services/ai_processor.py
 
-from ..models.schemas import DeviceData, ProcessedData, AIAnalysis
+from ..config import settings
+from ..models.schemas import DeviceData, ProcessedData, AIAnalysis, TremorData
+import asyncio
 import logging
 import math
-from typing import Optional
-import os
-import joblib
+from typing import List, Optional, Sequence
+import numpy as np
+
+from .device_windows import device_windows
+from .feature_registry import ROW_SIZE, SIGNAL_INDEX, FeaturePlan, signal_row
+from .inference_executor import inference_executor
+from .inference_scheduler import InferenceScheduler
+from .model_registry import PADS, RIGIDITY, SEMG, model_registry
+from .tremor_estimator import tremor_estimators
 
 logger = logging.getLogger(__name__)
 
 # Model artifacts (optional). If these exist, we'll use them; otherwise fall back to heuristics.
-MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models"))
-RIGIDITY_MODEL_PATH = os.path.join(MODEL_DIR, "rigidity_model_v0.joblib")
-PADS_MODEL_PATH = os.path.join(MODEL_DIR, "pads_model.joblib")
-SEMG_MODEL_PATH = os.path.join(MODEL_DIR, "semg_model.joblib")
+# They are served by `model_registry`, which picks up new versions without a restart.
+MODEL_DIR = model_registry.model_dir
+RIGIDITY_MODEL_PATH = model_registry.path(RIGIDITY)
+PADS_MODEL_PATH = model_registry.path(PADS)
+SEMG_MODEL_PATH = model_registry.path(SEMG)
 
-_rigidity_model = None
-_pads_model = None
-_semg_model = None
 
-def _load_models():
-    global _rigidity_model, _pads_model, _semg_model
-    try:
-        if os.path.exists(RIGIDITY_MODEL_PATH):
-            _rigidity_model = joblib.load(RIGIDITY_MODEL_PATH)
-            logger.info("Loaded rigidity model from %s", RIGIDITY_MODEL_PATH)
-    except Exception as e:
-        logger.warning("Could not load rigidity model: %s", e)
+def _feature_plan(artifact: dict) -> FeaturePlan:
+    plan = artifact.get("plan")
+    return plan if plan is not None else FeaturePlan(artifact["features"])
 
-    try:
-        if os.path.exists(PADS_MODEL_PATH):
-            _pads_model = joblib.load(PADS_MODEL_PATH)
-            logger.info("Loaded PADS model from %s", PADS_MODEL_PATH)
-    except Exception as e:
-        logger.warning("Could not load PADS model: %s", e)
-
-    try:
-        if os.path.exists(SEMG_MODEL_PATH):
-            _semg_model = joblib.load(SEMG_MODEL_PATH)
-            logger.info("Loaded sEMG model from %s", SEMG_MODEL_PATH)
-    except Exception as e:
-        logger.warning("Could not load sEMG model: %s", e)
 
+# Models are loaded by the startup warm-up (see `warm_up`), or on first use
 
-# Load at import time (best-effort)
-_load_models()
+# Streaming tremor estimate columns of the signal row (see tremor_estimator)
+_TREMOR_ESTIMATED = SIGNAL_INDEX["tremor_estimated"]
+_TREMOR_PEAK_HZ = SIGNAL_INDEX["tremor_peak_hz"]
+_TREMOR_PEAK_AMPLITUDE = SIGNAL_INDEX["tremor_peak_amplitude_g"]
+_TREMOR_BAND_POWER = SIGNAL_INDEX["tremor_band_power"]
+_TREMOR_DETECTED = SIGNAL_INDEX["tremor_band_detected"]
 
 
-def _process_tremor(tremor_data) -> float:
-    """Simulated tremor model: scale amplitude_g to 0..1 with max 30.0."""
+def _process_tremor(tremor_data, signals: Optional[np.ndarray] = None) -> float:
+    """Tremor score from the server-side estimate when the device streams
+    samples, otherwise the simulated model: amplitude_g scaled to 0..1 with max 30.0.
+    """
+    if signals is not None and signals[_TREMOR_ESTIMATED]:
+        return float(_estimated_tremor_scores(signals))
     try:
         detected = getattr(tremor_data, "tremor_detected", "no")
         amp = float(getattr(tremor_data, "amplitude_g", 0.0))
@@ -60,8 +57,33 @@ def _process_tremor(tremor_data) -> float:
     return float(score)
 
 
-def _process_rigidity(rigidity_data) -> float:
-    """Heuristic rigidity: high when both muscles are tense above threshold."""
+def _estimated_tremor_scores(signals: np.ndarray) -> np.ndarray:
+    """Band amplitude (from band power) over TREMOR_FULL_SCALE_G, 0 unless detected."""
+    band_amplitude = np.sqrt(2.0 * signals[..., _TREMOR_BAND_POWER])
+    return np.where(signals[..., _TREMOR_DETECTED] > 0, _cap_one(band_amplitude / settings.TREMOR_FULL_SCALE_G), 0.0)
+
+
+def _processed_tremor(tremor: TremorData, signals: Optional[np.ndarray]) -> TremorData:
+    """The tremor section of the output: server estimates replace the device's, samples are dropped."""
+    if tremor.samples_g is None:
+        return tremor
+    if signals is None or not signals[_TREMOR_ESTIMATED]:
+        return tremor.model_copy(update={"samples_g": None})
+    return TremorData(
+        frequency_hz=round(float(signals[_TREMOR_PEAK_HZ]), 3),
+        amplitude_g=round(float(signals[_TREMOR_PEAK_AMPLITUDE]), 3),
+        tremor_detected=bool(signals[_TREMOR_DETECTED]),
+        sample_rate_hz=tremor.sample_rate_hz,
+    )
+
+
+def _process_rigidity(rigidity_data, signals: Optional[np.ndarray] = None) -> float:
+    """Heuristic rigidity: high when both muscles are tense above threshold.
+
+    `signals` is the packet's signal row (see `feature_registry.signal_row`),
+    which carries the device's rolling-window features; without it the model
+    only sees this packet's EMG.
+    """
     try:
         wrist = float(getattr(rigidity_data, "emg_wrist", 0.0))
         arm = float(getattr(rigidity_data, "emg_arm", 0.0))
@@ -69,25 +91,18 @@ def _process_rigidity(rigidity_data) -> float:
         return 0.0
     TENSE_THRESHOLD = 5.0
     # If a trained rigidity model is available, use it.
+    rigidity_model = model_registry.get(RIGIDITY)
     try:
-        if _rigidity_model is not None:
+        if rigidity_model is not None:
             # The model artifact is expected to be a dict with keys: model, features
-            if isinstance(_rigidity_model, dict) and "model" in _rigidity_model and "features" in _rigidity_model:
-                model = _rigidity_model["model"]
-                features = _rigidity_model["features"]
+            if isinstance(rigidity_model, dict) and "model" in rigidity_model and "features" in rigidity_model:
+                model = rigidity_model["model"]
+                if signals is None:
+                    signals = signal_row({"rigidity": {"emg_wrist": wrist, "emg_arm": arm}})
                 # Build a feature vector from expected features; unknown features default to 0
-                X = []
-                for f in features:
-                    # attempt to map feature names to available sensor values
-                    if f == "emg_wrist_rms":
-                        X.append(wrist)
-                    elif f == "emg_arm_rms":
-                        X.append(arm)
-                    else:
-                        # Default placeholder
-                        X.append(0.0)
+                X = _feature_plan(rigidity_model).fill(signals)
                 # Model may expect 2D array
-                pred = model.predict([X])[0]
+                pred = model.predict(X.reshape(1, -1))[0]
                 # If classifier returns {0,1}, normalize to float
                 try:
                     return float(pred)
@@ -95,7 +110,7 @@ def _process_rigidity(rigidity_data) -> float:
                     return min(1.0, float(pred))
             else:
                 # If raw model object, try a simple predict using emg features
-                pred = _rigidity_model.predict([[wrist, arm]])
+                pred = rigidity_model.predict([[wrist, arm]])
                 return float(pred[0])
     except Exception as e:
         logger.warning("Rigidity model inference failed: %s", e)
@@ -160,61 +175,15 @@ def _process_gait(safety_data) -> float:
     return float(score)
 
 
-async def process_data_with_ai(data: DeviceData) -> ProcessedData:
-    """Main processing pipeline.
-
-    Returns a `ProcessedData` instance containing original fields + `analysis`.
-    """
-    # Calculate scores
-    # Optionally use PADS / sEMG models if available for improved scores
-    tremor_score = _process_tremor(data.tremor)
-    rigidity_score = _process_rigidity(data.rigidity)
-    slowness_score = _process_slowness(data.safety)
-    gait_score = _process_gait(data.safety)
-
-    # If PADS model loaded and supports gait/slowness enrichment, attempt to call it
-    try:
-        if _pads_model is not None:
-            # We expect pads model to provide gait/slowness adjustments; interfaces vary
-            # This is a best-effort invocation — if it fails, we keep heuristics
-            if isinstance(_pads_model, dict) and "model" in _pads_model and "features" in _pads_model:
-                mdl = _pads_model["model"]
-                feats = _pads_model["features"]
-                X = []
-                for f in feats:
-                    # basic mapping for common features
-                    if f == "accel_mag_mean":
-                        ax = float(getattr(data.safety, "accel_x_g", 0.0))
-                        ay = float(getattr(data.safety, "accel_y_g", 0.0))
-                        mag = math.sqrt(ax * ax + ay * ay)
-                        X.append(mag)
-                    else:
-                        X.append(0.0)
-                pred = mdl.predict([X])[0]
-                # assume pred contains gait/slowness in [0,1]
-                gait_score = float(pred)
-    except Exception as e:
-        logger.debug("PADS model inference skipped/failed: %s", e)
-
-    # If sEMG model available, optionally refine rigidity/tremor
-    try:
-        if _semg_model is not None:
-            if isinstance(_semg_model, dict) and "model" in _semg_model and "features" in _semg_model:
-                mdl = _semg_model["model"]
-                feats = _semg_model["features"]
-                X = []
-                for f in feats:
-                    if f == "emg_wrist":
-                        X.append(float(getattr(data.rigidity, "emg_wrist", 0.0)))
-                    elif f == "emg_arm":
-                        X.append(float(getattr(data.rigidity, "emg_arm", 0.0)))
-                    else:
-                        X.append(0.0)
-                pred = mdl.predict([X])[0]
-                rigidity_score = float(pred)
-    except Exception as e:
-        logger.debug("sEMG model inference skipped/failed: %s", e)
-
+def _build_processed(
+    data: DeviceData,
+    tremor_score: float,
+    rigidity_score: float,
+    slowness_score: float,
+    gait_score: float,
+    signals: Optional[np.ndarray] = None,
+) -> ProcessedData:
+    """Round the scores and derive the critical event, rehab suggestion and analysis."""
     scores = {
         "tremor": round(float(tremor_score), 3),
         "rigidity": round(float(rigidity_score), 3),
@@ -258,8 +227,9 @@ async def process_data_with_ai(data: DeviceData) -> ProcessedData:
     # Compose ProcessedData (inherits DeviceData)
     processed = ProcessedData(
         timestamp=data.timestamp,
+        device_id=data.device_id,
         safety=data.safety,
-        tremor=data.tremor,
+        tremor=_processed_tremor(data.tremor, signals),
         rigidity=data.rigidity,
         analysis=analysis,
         scores=scores,
@@ -267,6 +237,209 @@ async def process_data_with_ai(data: DeviceData) -> ProcessedData:
         rehab_suggestion=rehab_suggestion,
     )
 
-    logger.debug(f"Technical scores: {scores}, critical_event={critical_event}, rehab={rehab_suggestion}")
+    logger.debug("Technical scores: %s, critical_event=%s, rehab=%s", scores, critical_event, rehab_suggestion)
     return processed
 
+
+async def process_data_with_ai(data: DeviceData, stream_key: Optional[str] = None) -> ProcessedData:
+    """Main processing pipeline.
+
+    `stream_key` identifies the device stream (e.g. ``uid:device_id``) whose
+    rolling window this packet joins; windowed model features are computed
+    over it. Without a key the packet is scored on its own.
+
+    Returns a `ProcessedData` instance containing original fields + `analysis`.
+    """
+    # Window state is updated here, on the event loop, in arrival order; the
+    # stateless scoring is micro-batched with concurrent calls and runs on
+    # the inference executor
+    signals = signal_row(data, device_windows.update(stream_key, data), tremor_features=tremor_estimators.update(stream_key, data.tremor))
+    return await inference_scheduler.submit(data, signals)
+
+
+def _score_packet(data: DeviceData, signals: np.ndarray) -> ProcessedData:
+    """Score one packet from its signal row (no shared state is modified)."""
+    pads_model = model_registry.get(PADS)
+    semg_model = model_registry.get(SEMG)
+
+    # Calculate scores
+    # Optionally use PADS / sEMG models if available for improved scores
+    tremor_score = _process_tremor(data.tremor, signals)
+    rigidity_score = _process_rigidity(data.rigidity, signals)
+    slowness_score = _process_slowness(data.safety)
+    gait_score = _process_gait(data.safety)
+
+    # If PADS model loaded and supports gait/slowness enrichment, attempt to call it
+    try:
+        if pads_model is not None:
+            # We expect pads model to provide gait/slowness adjustments; interfaces vary
+            # This is a best-effort invocation — if it fails, we keep heuristics
+            if isinstance(pads_model, dict) and "model" in pads_model and "features" in pads_model:
+                mdl = pads_model["model"]
+                # Windowed features (accel_mag_mean/std, EMG RMS, ...); others default to 0
+                X = _feature_plan(pads_model).fill(signals)
+                pred = mdl.predict(X.reshape(1, -1))[0]
+                # assume pred contains gait/slowness in [0,1]
+                gait_score = float(pred)
+    except Exception as e:
+        logger.debug("PADS model inference skipped/failed: %s", e)
+
+    # If sEMG model available, optionally refine rigidity/tremor
+    try:
+        if semg_model is not None:
+            if isinstance(semg_model, dict) and "model" in semg_model and "features" in semg_model:
+                mdl = semg_model["model"]
+                X = _feature_plan(semg_model).fill(signals)
+                pred = mdl.predict(X.reshape(1, -1))[0]
+                rigidity_score = float(pred)
+    except Exception as e:
+        logger.debug("sEMG model inference skipped/failed: %s", e)
+
+    return _build_processed(data, tremor_score, rigidity_score, slowness_score, gait_score, signals)
+
+
+# --- Batch scoring --------------------------------------------------------
+#
+# Same pipeline as `process_data_with_ai`, but each model sees one N x F
+# matrix and is called once, and the heuristics run as array expressions.
+# Every comparison and arithmetic step mirrors the scalar code above
+# (including `min(1.0, x)` keeping 1.0 for NaN), so both paths produce
+# identical `ProcessedData`.
+
+def _cap_one(x: np.ndarray) -> np.ndarray:
+    # Elementwise min(1.0, x) with Python's semantics
+    return np.where(x < 1.0, x, 1.0)
+
+
+def _tremor_scores(packets: Sequence[DeviceData], signals: np.ndarray) -> np.ndarray:
+    detected = np.array([p.tremor.tremor_detected not in ("no", False, 0, None) for p in packets])
+    amp = np.array([float(p.tremor.amplitude_g) for p in packets])
+    reported = np.where(detected, _cap_one(amp / 30.0), 0.0)
+    return np.where(signals[:, _TREMOR_ESTIMATED] > 0, _estimated_tremor_scores(signals), reported)
+
+
+def _rigidity_heuristic_scores(wrist: np.ndarray, arm: np.ndarray) -> np.ndarray:
+    avg_emg = (wrist + arm) / 2.0
+    return np.select(
+        [avg_emg < 30, avg_emg < 60, avg_emg < 100],
+        [np.zeros_like(avg_emg), (avg_emg - 30) / 30.0 * 0.4, 0.4 + (avg_emg - 60) / 40.0 * 0.3],
+        _cap_one(0.7 + (avg_emg - 100) / 100.0 * 0.3),
+    )
+
+
+def _rigidity_model_scores(rigidity_model, signals: np.ndarray, wrist: np.ndarray, arm: np.ndarray) -> Optional[np.ndarray]:
+    """One rigidity model call for the whole batch; None if unavailable or failed."""
+    if rigidity_model is None:
+        return None
+    try:
+        if isinstance(rigidity_model, dict) and "model" in rigidity_model and "features" in rigidity_model:
+            X = _feature_plan(rigidity_model).matrix(signals)
+            pred = rigidity_model["model"].predict(X)
+        else:
+            pred = rigidity_model.predict(np.column_stack((wrist, arm)))
+        return np.array([float(p) for p in pred])
+    except Exception as e:
+        logger.warning("Rigidity model inference failed: %s", e)
+        return None
+
+
+def _slowness_scores(ax: np.ndarray, ay: np.ndarray, az: np.ndarray) -> np.ndarray:
+    mag = np.sqrt(ax * ax + ay * ay + az * az)
+    return np.select([mag > 2.0, mag > 1.0, mag > 0.5], [0.0, 0.3, 0.6], 0.9)
+
+
+def _gait_scores(packets: Sequence[DeviceData], ax: np.ndarray, ay: np.ndarray, az: np.ndarray) -> np.ndarray:
+    fall = np.array([bool(p.safety.fall_detected) for p in packets])
+    deviation = np.sqrt(ax * ax + ay * ay + (az - 1.0) ** 2)
+    return np.where(fall, 1.0, _cap_one(deviation / 2.0))
+
+
+async def process_batch(packets: List[DeviceData], stream_keys: Optional[Sequence[Optional[str]]] = None) -> List[ProcessedData]:
+    """Score a batch of packets; element-for-element equal to `process_data_with_ai`.
+
+    `stream_keys[i]` is the device stream of `packets[i]`. Packets join their
+    rolling windows in list order, exactly as if they had been processed one
+    by one, so several packets from the same device in one batch are fine.
+    """
+    if not packets:
+        return []
+    if stream_keys is None:
+        stream_keys = [None] * len(packets)
+    signals = np.empty((len(packets), ROW_SIZE))
+    for i, (key, data) in enumerate(zip(stream_keys, packets)):
+        signal_row(data, device_windows.update(key, data), out=signals[i], tremor_features=tremor_estimators.update(key, data.tremor))
+    return await inference_executor.run(_score_batch, packets, signals)
+
+
+def _score_batch(packets: List[DeviceData], signals: np.ndarray) -> List[ProcessedData]:
+    """Score packets from their N x ROW_SIZE signal rows (no shared state is modified)."""
+    wrist = np.array([float(p.rigidity.emg_wrist) for p in packets])
+    arm = np.array([float(p.rigidity.emg_arm) for p in packets])
+    ax = np.array([float(p.safety.accel_x_g) for p in packets])
+    ay = np.array([float(p.safety.accel_y_g) for p in packets])
+    az = np.array([float(p.safety.accel_z_g) for p in packets])
+
+    # One version of each model for the whole batch, even if a reload lands meanwhile
+    rigidity_model = model_registry.get(RIGIDITY)
+    pads_model = model_registry.get(PADS)
+    semg_model = model_registry.get(SEMG)
+
+    tremor = _tremor_scores(packets, signals)
+    rigidity = _rigidity_model_scores(rigidity_model, signals, wrist, arm)
+    if rigidity is None:
+        rigidity = _rigidity_heuristic_scores(wrist, arm)
+    slowness = _slowness_scores(ax, ay, az)
+    gait = _gait_scores(packets, ax, ay, az)
+
+    try:
+        if isinstance(pads_model, dict) and "model" in pads_model and "features" in pads_model:
+            X = _feature_plan(pads_model).matrix(signals)
+            gait = np.array([float(p) for p in pads_model["model"].predict(X)])
+    except Exception as e:
+        logger.debug("PADS model inference skipped/failed: %s", e)
+
+    try:
+        if isinstance(semg_model, dict) and "model" in semg_model and "features" in semg_model:
+            X = _feature_plan(semg_model).matrix(signals)
+            rigidity = np.array([float(p) for p in semg_model["model"].predict(X)])
+    except Exception as e:
+        logger.debug("sEMG model inference skipped/failed: %s", e)
+
+    return [
+        _build_processed(data, t, r, s, g, row)
+        for data, t, r, s, g, row in zip(packets, tremor.tolist(), rigidity.tolist(), slowness.tolist(), gait.tolist(), signals)
+    ]
+
+
+# A resting packet: exercises every scoring path without raising alerts
+_WARM_UP_PACKET = {
+    "timestamp": "1970-01-01T00:00:00Z",
+    "device_id": "warm_up",
+    "safety": {"fall_detected": False, "accel_x_g": 0.02, "accel_y_g": -0.01, "accel_z_g": 0.98},
+    "tremor": {"frequency_hz": 5.0, "amplitude_g": 1.0, "tremor_detected": False},
+    "rigidity": {"emg_wrist": 10.0, "emg_arm": 12.0, "rigid": False},
+}
+
+
+async def warm_up(batch_size: int = 16):
+    """Run dummy inference so the first real packet does not pay cold-start costs.
+
+    Loads the models if needed and scores a synthetic packet on every
+    inference worker, then one batch. No device window is touched.
+    """
+    await asyncio.to_thread(model_registry.load_all)
+    packet = DeviceData(**_WARM_UP_PACKET)
+    signals = signal_row(packet)
+    await asyncio.gather(*(inference_executor.run(_score_packet, packet, signals) for _ in range(inference_executor.workers)))
+    await process_batch([packet] * batch_size)
+
+
+# Batches concurrent process_data_with_ai calls into one _score_batch call
+inference_scheduler = InferenceScheduler(
+    inference_executor,
+    _score_packet,
+    _score_batch,
+    max_batch=settings.INFERENCE_BATCH_MAX,
+    max_wait=settings.INFERENCE_BATCH_WINDOW_MS / 1000.0,
+    enabled=settings.INFERENCE_BATCHING,
+)
@@ -134,7 +134,7 @@ def generate_care_recommendations(data: ProcessedData) -> dict:
         else:
             recommended_game = GAME_RECOMMENDATIONS["general_wellness"]
     
-    logger.info(f"Generated {len(recommendations)} care recommendations and game suggestion: {recommended_game['name']}")
+    logger.debug("Generated %d care recommendations and game suggestion: %s", len(recommendations), recommended_game['name'])
     
     return {
         "care_recommendations": recommendations[:5],  # Limit to top 5 most relevant
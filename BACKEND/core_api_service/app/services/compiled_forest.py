@@ -0,0 +1,139 @@
+# File: BACKEND/core_api_service/app/services/compiled_forest.py
+#
+# Flat-array evaluation of sklearn tree ensembles.
+#
+# A fitted RandomForest is converted once into node tables shared by all of
+# its trees (feature, threshold, left/right child, leaf value), and rows are
+# routed through every tree at once with a few NumPy gathers per tree level.
+# This skips sklearn's per-call input validation and joblib thread dispatch,
+# which dominate the cost of scoring one row or a handful of rows.
+
+import logging
+from typing import Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledForest:
+    """
+    Pure-NumPy predictor equivalent to a fitted sklearn forest or single tree.
+
+    Supports single-output `RandomForestClassifier`/`RandomForestRegressor`,
+    `ExtraTrees*` and `DecisionTree*`. `predict` and `predict_proba` follow
+    sklearn's arithmetic step for step (float32 inputs, per-tree normalised
+    class probabilities, summed in tree order, then averaged), so results
+    are identical to the estimator's.
+
+    Leaves point to themselves, so every row can take exactly `depth`
+    steps without per-row termination checks.
+    """
+
+    def __init__(self, estimator: Any):
+        trees = list(getattr(estimator, "estimators_", None) or [estimator])
+        if getattr(estimator, "n_outputs_", 1) != 1:
+            raise ValueError("multi-output estimators are not supported")
+        self.is_classifier = hasattr(estimator, "classes_")
+        self.classes_ = np.asarray(estimator.classes_) if self.is_classifier else None
+        self.n_features_in_ = int(estimator.n_features_in_)
+        self.n_trees = len(trees)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for tree in trees:
+            t = tree.tree_
+            n = t.node_count
+            ids = np.arange(n)
+            leaf = t.children_left == -1
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(np.where(leaf, 0.0, t.threshold))
+            lefts.append(np.where(leaf, ids, t.children_left) + offset)
+            rights.append(np.where(leaf, ids, t.children_right) + offset)
+            if self.is_classifier:
+                proba = t.value[:, 0, : len(self.classes_)].astype(np.float64)
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                values.append(proba / normalizer)
+            else:
+                values.append(t.value[:, 0, :1].astype(np.float64))
+            roots.append(offset)
+            offset += n
+            depth = max(depth, int(t.max_depth))
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        # Children interleaved as [left0, right0, left1, right1, ...] so a step
+        # is one gather at 2 * node + went_right
+        self.children = np.column_stack((np.concatenate(lefts), np.concatenate(rights))).astype(np.intp).ravel()
+        # One contiguous leaf-value column per class (or the single regression output)
+        self.value = np.ascontiguousarray(np.concatenate(values).T)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+
+    def __setstate__(self, state: dict):
+        # Loaded with joblib mmap_mode the tables are np.memmap; use plain
+        # ndarray views of the same pages so every gather skips the subclass
+        # wrapping
+        self.__dict__.update({k: np.asarray(v) if isinstance(v, np.memmap) else v for k, v in state.items()})
+
+    @property
+    def node_count(self) -> int:
+        return len(self.feature)
+
+    def _check(self, X) -> np.ndarray:
+        # sklearn evaluates trees on float32 inputs; thresholds stay float64
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity")
+        return X
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index (into the flat tables) per tree and row, shape (n_trees, n)."""
+        X = self._check(X)
+        n, n_features = X.shape
+        flat = X.ravel()
+        row_base = (np.arange(n, dtype=np.intp) * n_features)[np.newaxis, :]
+        node = np.repeat(self.roots[:, np.newaxis], n, axis=1)
+        for _ in range(self.depth):
+            x = np.take(flat, row_base + np.take(self.feature, node))
+            # Inputs are finite, so "not x <= threshold" is "x > threshold"
+            went_right = x > np.take(self.threshold, node)
+            node = np.take(self.children, 2 * node + went_right)
+        return node
+
+    def _accumulate(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        # Add the trees' outputs one after another, in tree order, exactly like
+        # sklearn's accumulation loop. (sum() may switch to pairwise summation
+        # when the tree axis is contiguous; cumsum is always sequential.)
+        columns = [np.cumsum(np.take(column, leaves), axis=0)[-1] for column in self.value]
+        return np.column_stack(columns) / self.n_trees
+
+    def predict_proba(self, X) -> np.ndarray:
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._accumulate(X)
+
+    def predict(self, X) -> np.ndarray:
+        out = self._accumulate(X)
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(out, axis=1), axis=0)
+        return out[:, 0]
+
+
+def compile_estimator(estimator: Any) -> Optional[CompiledForest]:
+    """Compile a fitted tree ensemble, or return None if it is not one we support."""
+    if not (hasattr(estimator, "tree_") or hasattr(estimator, "estimators_")):
+        return None
+    try:
+        return CompiledForest(estimator)
+    except Exception as e:
+        logger.info("Not compiling %s: %s", type(estimator).__name__, e)
+        return None
+
@@ -0,0 +1,129 @@
+# File: BACKEND/core_api_service/app/services/dedup.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from ..config import settings
+
+
+class DedupClaim:
+    """The result of `DedupWindow.claim`: `prior` values of keys already
+    accepted, and the keys now in flight for the caller."""
+
+    __slots__ = ("prior", "_futures")
+
+    def __init__(self, prior: Dict[Hashable, Any], futures: Dict[Hashable, asyncio.Future]):
+        self.prior = prior
+        self._futures = futures
+
+
+class DedupWindow:
+    """
+    Remembers recently accepted keys for `window` seconds.
+
+    Entries are kept in insertion order, so expired keys are always at the
+    front and are trimmed in O(expired) on each call. The window is also
+    capped at `max_entries`; the oldest keys go first when it is full.
+
+    `claim` marks keys as in flight while their request is being handled, so
+    a concurrent retry waits for the first attempt's outcome instead of
+    being accepted a second time.
+    """
+
+    def __init__(self, window: float = 600.0, max_entries: int = 100000):
+        self.window = float(window)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.remembered = 0
+
+    def _trim(self, now: float):
+        entries = self._entries
+        cutoff = now - self.window
+        while entries:
+            key, (seen_at, _) = next(iter(entries.items()))
+            if seen_at > cutoff and len(entries) <= self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """Return the value stored for `key` if it was seen within the window."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.duplicates += 1
+            return entry[1]
+
+    async def claim(self, keys: Iterable[Hashable]) -> DedupClaim:
+        """Mark `keys` in flight, returning the values of those already accepted.
+
+        Keys another request has in flight are waited for first, holding no
+        claims (so requests claiming overlapping keys cannot deadlock); each
+        ends up remembered (returned in ``prior``) or released (claimed
+        here). Every claimed key must be `remember`ed or the claim
+        `release`d.
+        """
+        keys = list(dict.fromkeys(keys))
+        while True:
+            with self._lock:
+                waiting = [self._inflight[key] for key in keys if key in self._inflight]
+                if not waiting:
+                    self._trim(time.monotonic())
+                    prior = {}
+                    futures = {}
+                    loop = asyncio.get_running_loop()
+                    for key in keys:
+                        entry = self._entries.get(key)
+                        if entry is not None:
+                            prior[key] = entry[1]
+                        else:
+                            futures[key] = self._inflight[key] = loop.create_future()
+                    self.duplicates += len(prior)
+                    return DedupClaim(prior, futures)
+            await asyncio.wait(waiting)
+
+    def release(self, claim: DedupClaim):
+        """Give up the claimed keys not yet remembered (the request failed)."""
+        with self._lock:
+            for key, future in claim._futures.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                if not future.done():
+                    future.set_result(None)
+
+    def remember(self, key: Hashable, value: Any):
+        """Record `key` as accepted, with `value` returned to later duplicates."""
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now, value)
+            self.remembered += 1
+            self._trim(now)
+            future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "window_s": self.window,
+            "max_entries": self.max_entries,
+            "in_flight": len(self._inflight),
+            "remembered": self.remembered,
+            "duplicates": self.duplicates,
+        }
+
+
+# Shared window for ingest idempotency
+ingest_dedup = DedupWindow(
+    window=settings.DEDUP_WINDOW_SECONDS,
+    max_entries=settings.DEDUP_MAX_ENTRIES,
+)
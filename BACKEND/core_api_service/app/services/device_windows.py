@@ -0,0 +1,138 @@
+# File: BACKEND/core_api_service/app/services/device_windows.py
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+from ..config import settings
+
+# Ring buffer rows. Each slot stores the per-packet terms of the running sums,
+# so evicting a packet is a subtraction of its column.
+_WRIST_SQ, _ARM_SQ, _MAG, _MAG_SQ, _ENVELOPE, _ONSET = range(6)
+_ROWS = 6
+
+# A packet starts an EMG burst when its envelope exceeds this multiple of the
+# window's mean envelope (scale-free, so it works for raw and µV readings)
+BURST_FACTOR = 1.5
+
+WINDOW_FEATURES = (
+    "emg_wrist_rms",
+    "emg_arm_rms",
+    "emg_ratio",
+    "emg_burst_count",
+    "accel_mag_mean",
+    "accel_mag_std",
+)
+
+
+class RollingWindow:
+    """
+    Fixed-size ring buffer over one device's recent packets.
+
+    `update` is O(1): the new packet's terms are added to the running sums
+    and the evicted packet's terms subtracted. The sums are re-derived from
+    the buffer once per lap so float error cannot accumulate.
+    """
+
+    __slots__ = ("size", "_buf", "_sums", "_index", "_count", "_active")
+
+    def __init__(self, size: int):
+        self.size = max(1, int(size))
+        self._buf = np.zeros((_ROWS, self.size))
+        self._sums = np.zeros(_ROWS)
+        self._index = 0
+        self._count = 0
+        self._active = False
+
+    def update(self, emg_wrist: float, emg_arm: float, accel_x: float, accel_y: float) -> Dict[str, float]:
+        envelope = (abs(emg_wrist) + abs(emg_arm)) / 2.0
+        active = self._count > 0 and envelope > BURST_FACTOR * self._sums[_ENVELOPE] / self._count
+        onset = 1.0 if active and not self._active else 0.0
+        self._active = active
+        # Horizontal movement magnitude, as used by the PADS model mapping
+        mag = math.sqrt(accel_x * accel_x + accel_y * accel_y)
+
+        column = np.array((emg_wrist * emg_wrist, emg_arm * emg_arm, mag, mag * mag, envelope, onset))
+        i = self._index
+        self._sums += column - self._buf[:, i]
+        self._buf[:, i] = column
+        self._index = (i + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+        if self._index == 0:
+            self._sums = self._buf.sum(axis=1)
+        return self.features()
+
+    def features(self) -> Dict[str, float]:
+        n = self._count
+        if not n:
+            return dict.fromkeys(WINDOW_FEATURES, 0.0)
+        sums = self._sums
+        wrist_rms = math.sqrt(max(0.0, sums[_WRIST_SQ] / n))
+        arm_rms = math.sqrt(max(0.0, sums[_ARM_SQ] / n))
+        mag_mean = sums[_MAG] / n
+        return {
+            "emg_wrist_rms": wrist_rms,
+            "emg_arm_rms": arm_rms,
+            "emg_ratio": wrist_rms / max(0.0001, arm_rms),
+            "emg_burst_count": float(round(sums[_ONSET])),
+            "accel_mag_mean": mag_mean,
+            "accel_mag_std": math.sqrt(max(0.0, sums[_MAG_SQ] / n - mag_mean * mag_mean)),
+        }
+
+
+class DeviceWindowStore:
+    """Rolling windows keyed by device stream, least recently updated evicted first."""
+
+    def __init__(self, size: int = 32, max_devices: int = 10000):
+        self.size = max(1, int(size))
+        self.max_devices = max(1, int(max_devices))
+        self._windows: "OrderedDict[str, RollingWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def update(self, key: str, data) -> Dict[str, float]:
+        """Add `data` (a DeviceData) to the window for `key` and return its features.
+
+        Without a key the packet is treated as a window of its own.
+        """
+        args = (
+            float(data.rigidity.emg_wrist),
+            float(data.rigidity.emg_arm),
+            float(data.safety.accel_x_g),
+            float(data.safety.accel_y_g),
+        )
+        if not key:
+            return RollingWindow(1).update(*args)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = RollingWindow(self.size)
+                if len(self._windows) > self.max_devices:
+                    self._windows.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._windows.move_to_end(key)
+            return window.update(*args)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._windows),
+            "max_devices": self.max_devices,
+            "window_size": self.size,
+            "evicted": self.evicted,
+        }
+
+
+# Shared per-device windows for the AI pipeline
+device_windows = DeviceWindowStore(
+    size=settings.FEATURE_WINDOW_SIZE,
+    max_devices=settings.FEATURE_WINDOW_MAX_DEVICES,
+)
@@ -0,0 +1,160 @@
+# File: BACKEND/core_api_service/app/services/feature_registry.py
+#
+# Model input features, resolved once per model instead of once per packet.
+#
+# Every packet is first reduced to a fixed "signal row": its raw channels
+# plus the device's rolling-window and streaming tremor features. A model's feature list is then
+# compiled into a `FeaturePlan`, an array of column indices into that row
+# (and which columns to take the absolute value of), so building the model
+# input is a single gather. The API and tools/verify_hardware_packet.py
+# share this mapping.
+
+import logging
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .device_windows import WINDOW_FEATURES, RollingWindow
+from .tremor_estimator import NO_ESTIMATE, TREMOR_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Raw per-packet channels: (name, packet section, field)
+RAW_SIGNALS = (
+    ("accel_x_g", "safety", "accel_x_g"),
+    ("accel_y_g", "safety", "accel_y_g"),
+    ("accel_z_g", "safety", "accel_z_g"),
+    ("emg_wrist", "rigidity", "emg_wrist"),
+    ("emg_arm", "rigidity", "emg_arm"),
+    ("tremor_frequency_hz", "tremor", "frequency_hz"),
+    ("tremor_amplitude_g", "tremor", "amplitude_g"),
+)
+
+# Columns of the signal row. The last column is always 0 and backs unmapped features.
+SIGNALS = tuple(name for name, _, _ in RAW_SIGNALS) + WINDOW_FEATURES + TREMOR_FEATURES
+SIGNAL_INDEX = {name: i for i, name in enumerate(SIGNALS)}
+ZERO_COLUMN = len(SIGNALS)
+ROW_SIZE = len(SIGNALS) + 1
+_ACCEL_X, _ACCEL_Y = SIGNAL_INDEX["accel_x_g"], SIGNAL_INDEX["accel_y_g"]
+_EMG_WRIST, _EMG_ARM = SIGNAL_INDEX["emg_wrist"], SIGNAL_INDEX["emg_arm"]
+# Reads all raw channels of a DeviceData in one call
+_read_raw = attrgetter(*(f"{section}.{field}" for _, section, field in RAW_SIGNALS))
+
+IDENTITY = "identity"
+ABSOLUTE = "abs"
+
+# Model feature name -> (signal, transform). Signals map to themselves; the
+# aliases cover names used by the training scripts in tools/ (PADS, sEMG).
+FEATURES: Dict[str, Tuple[str, str]] = {name: (name, IDENTITY) for name in SIGNALS}
+FEATURES.update({
+    # Single-sample accelerometer summaries
+    "acc_x_mean": ("accel_x_g", IDENTITY),
+    "acc_y_mean": ("accel_y_g", IDENTITY),
+    "acc_z_mean": ("accel_z_g", IDENTITY),
+    "acc_x_rms": ("accel_x_g", ABSOLUTE),
+    "acc_y_rms": ("accel_y_g", ABSOLUTE),
+    "acc_z_rms": ("accel_z_g", ABSOLUTE),
+    # EMG channel 1 is the wrist electrode, channel 2 the forearm
+    "emg_ch1_mean": ("emg_wrist", IDENTITY),
+    "emg_ch2_mean": ("emg_arm", IDENTITY),
+    "emg_ch1_rms": ("emg_wrist_rms", IDENTITY),
+    "emg_ch2_rms": ("emg_arm_rms", IDENTITY),
+})
+
+
+def register_feature(name: str, signal: str, transform: str = IDENTITY):
+    """Map a model feature name onto a signal (plans compiled afterwards pick it up)."""
+    if signal not in SIGNAL_INDEX:
+        raise ValueError(f"unknown signal {signal!r}")
+    if transform not in (IDENTITY, ABSOLUTE):
+        raise ValueError(f"unknown transform {transform!r}")
+    FEATURES[name] = (signal, transform)
+
+
+class FeaturePlan:
+    """
+    A model's feature list compiled to column indices into the signal row.
+
+    Features the registry does not know are reported in `unmapped` and read
+    from the always-zero column, matching the old ``.get(f, 0.0)`` default.
+    """
+
+    __slots__ = ("features", "columns", "absolute", "unmapped")
+
+    def __init__(self, features: Iterable[str]):
+        self.features = tuple(features)
+        columns, absolute, unmapped = [], [], []
+        for i, name in enumerate(self.features):
+            entry = FEATURES.get(name)
+            if entry is None:
+                columns.append(ZERO_COLUMN)
+                unmapped.append(name)
+                continue
+            signal, transform = entry
+            columns.append(SIGNAL_INDEX[signal])
+            if transform == ABSOLUTE:
+                absolute.append(i)
+        self.columns = np.asarray(columns, dtype=np.intp)
+        self.absolute = np.asarray(absolute, dtype=np.intp)
+        self.unmapped = tuple(unmapped)
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def fill(self, signals: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Model input vector for one signal row (written into `out` if given)."""
+        out = np.take(signals, self.columns, out=out)
+        if self.absolute.size:
+            out[self.absolute] = np.abs(out[self.absolute])
+        return out
+
+    def matrix(self, signals: np.ndarray) -> np.ndarray:
+        """N x F model input for an N x ROW_SIZE block of signal rows."""
+        X = np.take(signals, self.columns, axis=1)
+        if self.absolute.size:
+            X[:, self.absolute] = np.abs(X[:, self.absolute])
+        return X
+
+
+def compile_plan(features: Sequence[str], model_name: str = "model") -> FeaturePlan:
+    plan = FeaturePlan(features)
+    if plan.unmapped:
+        logger.warning("%s: %d of %d features have no extractor and are fed as 0: %s", model_name, len(plan.unmapped), len(plan), ", ".join(plan.unmapped))
+    return plan
+
+
+def _section_value(packet: Any, section: str, field: str) -> float:
+    # Works for DeviceData and for plain (possibly incomplete) packet dicts
+    part = packet.get(section) if isinstance(packet, Mapping) else getattr(packet, section, None)
+    if part is None:
+        return 0.0
+    value = part.get(field) if isinstance(part, Mapping) else getattr(part, field, None)
+    return 0.0 if value is None else float(value)
+
+
+def signal_row(
+    packet: Any,
+    window_features: Optional[Mapping[str, float]] = None,
+    out: Optional[np.ndarray] = None,
+    tremor_features: Optional[Mapping[str, float]] = None,
+) -> np.ndarray:
+    """Fill the signal row for `packet` (a DeviceData or packet dict).
+
+    `window_features` come from the device's rolling window; without them
+    the packet is treated as a window of its own. `tremor_features` come
+    from the device's tremor estimator (all 0 when it has no estimate).
+    """
+    try:
+        raw = [float(v) for v in _read_raw(packet)]
+    except (AttributeError, TypeError):
+        raw = [_section_value(packet, section, field) for _, section, field in RAW_SIGNALS]
+    if window_features is None:
+        window_features = RollingWindow(1).update(raw[_EMG_WRIST], raw[_EMG_ARM], raw[_ACCEL_X], raw[_ACCEL_Y])
+    if tremor_features is None:
+        tremor_features = NO_ESTIMATE
+    values = raw + [window_features[name] for name in WINDOW_FEATURES] + [tremor_features[name] for name in TREMOR_FEATURES] + [0.0]
+    if out is None:
+        return np.array(values)
+    out[:] = values
+    return out
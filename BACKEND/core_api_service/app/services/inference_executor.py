@@ -0,0 +1,189 @@
+# File: BACKEND/core_api_service/app/services/inference_executor.py
+
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from ..config import settings
+from ..metrics import INFERENCE_QUEUE_SECONDS, INFERENCE_RUN_SECONDS
+from ..samples import SAMPLE_WINDOW, summarize
+
+logger = logging.getLogger(__name__)
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+MODES = (INLINE, THREAD, PROCESS)
+
+
+def _init_process_worker():
+    # With the compiled cache in place this maps the shared node tables read-only
+    from . import ai_processor  # noqa: F401
+    from .model_registry import model_registry
+    model_registry.load_all()
+    logger.info("Inference worker %d ready", os.getpid())
+
+
+def _run_in_process(fn: Callable, args: tuple, digests: Dict[str, str]):
+    """Process-pool entry point: follow the parent's model versions, then run `fn`."""
+    from .model_registry import model_registry
+    started = time.monotonic()
+    if model_registry.digests() != digests:
+        # The parent hot-reloaded a model; pick up the same file here
+        for name in model_registry.files:
+            model_registry.reload(name)
+    result = fn(*args)
+    return result, started, time.monotonic()
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound scoring off the asyncio event loop.
+
+    Modes:
+     - ``inline``: call on the event loop (the pre-executor behaviour).
+     - ``thread``: a thread pool. NumPy releases the GIL for most of the
+       array work, and the loop is never blocked for a whole batch.
+     - ``process``: a process pool whose workers preload the models (the
+       compiled forests are memory-mapped, so they are not copied per
+       worker). Arguments and results are pickled across.
+
+    Only stateless work should be submitted: per-device window state is
+    updated by the caller on the loop before dispatching. Time spent waiting
+    for a free worker and running are exported per mode as
+    `stancesense_inference_queue_seconds` / `..._run_seconds`.
+    """
+
+    def __init__(self, mode: str = THREAD, workers: int = 2):
+        if mode not in MODES:
+            raise ValueError(f"inference mode must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        self._pool: Optional[concurrent.futures.Executor] = None
+        self._pool_lock = threading.Lock()
+        self._inflight = 0
+        self.max_inflight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._queue_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._run_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._bind_metrics()
+
+    def _bind_metrics(self):
+        self._queue_histogram = INFERENCE_QUEUE_SECONDS.labels(self.mode)
+        self._run_histogram = INFERENCE_RUN_SECONDS.labels(self.mode)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _ensure_pool(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if self.mode == PROCESS:
+                        # spawn: never fork a process that is running an event loop and threads
+                        self._pool = concurrent.futures.ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                            initializer=_init_process_worker,
+                        )
+                    else:
+                        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._pool
+
+    async def start(self):
+        """Create the pool and, for processes, wait until every worker has loaded the models."""
+        if self.mode == INLINE:
+            return
+        pool = self._ensure_pool()
+        if self.mode == PROCESS:
+            loop = asyncio.get_running_loop()
+            started = time.monotonic()
+            await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(self.workers)))
+            logger.info("Started %d inference processes in %.1fs", self.workers, time.monotonic() - started)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run ``fn(*args)`` according to `mode` and return its result."""
+        self.submitted += 1
+        self._inflight += 1
+        self.max_inflight = max(self.max_inflight, self._inflight)
+        submitted = time.monotonic()
+        try:
+            if self.mode == INLINE:
+                result = fn(*args)
+                started = submitted
+                finished = time.monotonic()
+            elif self.mode == THREAD:
+                result, started, finished = await asyncio.get_running_loop().run_in_executor(self._ensure_pool(), self._timed, fn, args)
+            else:
+                from .model_registry import model_registry
+                result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                    self._ensure_pool(), _run_in_process, fn, args, model_registry.digests()
+                )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._inflight -= 1
+        self.completed += 1
+        # time.monotonic is system-wide, so worker-process timestamps compare directly
+        waited = max(0.0, started - submitted)
+        ran = finished - started
+        self._queue_histogram.observe(waited)
+        self._run_histogram.observe(ran)
+        self._queue_samples.append(waited)
+        self._run_samples.append(ran)
+        return result
+
+    @staticmethod
+    def _timed(fn: Callable, args: tuple):
+        started = time.monotonic()
+        result = fn(*args)
+        return result, started, time.monotonic()
+
+    async def reconfigure(self, mode: str, workers: Optional[int] = None):
+        """Switch mode/pool size at runtime; in-flight calls finish on the old pool."""
+        if mode not in MODES:
+            raise ValueError(f"inference mode must be one of {MODES}, got {mode!r}")
+        old = self._pool
+        with self._pool_lock:
+            self._pool = None
+            self.mode = mode
+            if workers is not None:
+                self.workers = max(1, int(workers))
+            self._bind_metrics()
+            self._queue_samples.clear()
+            self._run_samples.clear()
+        if old is not None:
+            await asyncio.to_thread(old.shutdown, True)
+        await self.start()
+
+    async def close(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await asyncio.to_thread(pool.shutdown, True)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "inflight": self._inflight,
+            "max_inflight": self.max_inflight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_wait": summarize(self._queue_samples),
+            "run_time": summarize(self._run_samples),
+        }
+
+
+# Shared executor for AI scoring
+inference_executor = InferenceExecutor(mode=settings.INFERENCE_MODE, workers=settings.INFERENCE_WORKERS)
@@ -0,0 +1,197 @@
+# File: BACKEND/core_api_service/app/services/inference_scheduler.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, List, Optional, Set
+
+import numpy as np
+
+from ..metrics import INFERENCE_BATCH_SIZE, INFERENCE_BATCH_WAIT_SECONDS
+from ..samples import SAMPLE_WINDOW, summarize
+from .inference_executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest inter-arrival gap in the moving average
+_GAP_ALPHA = 0.2
+
+
+class _Request:
+    __slots__ = ("item", "row", "future", "queued")
+
+    def __init__(self, item: Any, row: np.ndarray, future: asyncio.Future, queued: float):
+        self.item = item
+        self.row = row
+        self.future = future
+        self.queued = queued
+
+
+class InferenceScheduler:
+    """
+    Micro-batches concurrent single-item scoring calls into one model call.
+
+    `submit` queues an item with its signal row and returns its result once
+    the batch it joined has been scored on `executor`: ``score_one(item,
+    row)`` for a batch of one, ``score_batch(items, rows)`` otherwise. Both
+    must be pure and agree item for item.
+
+    A batch closes when it holds `max_batch` items, when its window expires
+    or, earlier, when no other batch is in flight (waiting longer would only
+    add latency). The window adapts to load: it is the time `max_batch`
+    items are expected to take to arrive at the current rate (a moving
+    average of inter-arrival gaps), capped at `max_wait`. When the scheduler
+    is idle, or arrivals are sparser than `max_wait` and a worker is free, a
+    request runs at once, so a lone client sees no added latency.
+
+    All state is touched on the event loop only.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        score_one: Callable,
+        score_batch: Callable,
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+        enabled: bool = True,
+    ):
+        self.executor = executor
+        self.score_one = score_one
+        self.score_batch = score_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait))
+        self.enabled = enabled
+        self._pending: List[_Request] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight = 0
+        self._last_arrival: Optional[float] = None
+        # Starts "sparse", so the first requests after startup run immediately
+        self._gap = float("inf")
+        self._window = self.max_wait
+        self.submitted = 0
+        self.immediate = 0
+        self.batches = 0
+        self.batched_items = 0
+        self._size_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._wait_samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def _observe_arrival(self, now: float):
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            self._gap = gap if self._gap == float("inf") else (1.0 - _GAP_ALPHA) * self._gap + _GAP_ALPHA * gap
+        self._last_arrival = now
+
+    def _idle(self) -> bool:
+        if self._pending:
+            return False
+        if self._inflight == 0:
+            return True
+        # Another batch is running, but the next arrival is unlikely within the window
+        return self._inflight < self.executor.workers and self._gap >= self.max_wait
+
+    def _adaptive_window(self) -> float:
+        return min(self.max_wait, self._gap * (self.max_batch - len(self._pending)))
+
+    async def submit(self, item: Any, row: np.ndarray) -> Any:
+        """Score `item` (with its signal row) as part of the next batch."""
+        self.submitted += 1
+        if not self.enabled:
+            return await self.executor.run(self.score_one, item, row)
+        now = time.monotonic()
+        self._observe_arrival(now)
+        if self._idle():
+            self.immediate += 1
+            self._record(1, 0.0)
+            self._inflight += 1
+            try:
+                return await self.executor.run(self.score_one, item, row)
+            finally:
+                self._batch_done()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Request(item, row, future, now))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._window = self._adaptive_window()
+            self._timer = asyncio.get_running_loop().call_later(self._window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        now = time.monotonic()
+        for request in batch:
+            self._record_wait(now - request.queued)
+        self._record(len(batch), None)
+        self._inflight += 1
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Request]):
+        try:
+            if len(batch) == 1:
+                results = [await self.executor.run(self.score_one, batch[0].item, batch[0].row)]
+            else:
+                rows = np.vstack([request.row for request in batch])
+                results = await self.executor.run(self.score_batch, [request.item for request in batch], rows)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        else:
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+        finally:
+            self._batch_done()
+
+    def _batch_done(self):
+        self._inflight -= 1
+        # A worker is free: waiting out the window would only add latency
+        if self._inflight == 0 and self._pending:
+            self._flush()
+
+    def _record(self, size: int, waited: Optional[float]):
+        self.batches += 1
+        self.batched_items += size
+        self._size_samples.append(size)
+        INFERENCE_BATCH_SIZE.observe(size)
+        if waited is not None:
+            self._record_wait(waited)
+
+    def _record_wait(self, waited: float):
+        self._wait_samples.append(waited)
+        INFERENCE_BATCH_WAIT_SECONDS.observe(waited)
+
+    async def close(self):
+        """Run whatever is pending and wait for in-flight batches."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> dict:
+        sizes = self._size_samples
+        return {
+            "enabled": self.enabled,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000.0, 3),
+            "window_ms": round(self._window * 1000.0, 3),
+            "arrival_gap_ms": round(self._gap * 1000.0, 3) if self._gap != float("inf") else None,
+            "pending": len(self._pending),
+            "inflight_batches": self._inflight,
+            "submitted": self.submitted,
+            "immediate": self.immediate,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0.0,
+            "max_recent_batch_size": max(sizes) if sizes else 0,
+            "batch_wait": summarize(self._wait_samples),
+        }
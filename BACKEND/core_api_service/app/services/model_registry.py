@@ -0,0 +1,346 @@
+# File: BACKEND/core_api_service/app/services/model_registry.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import warnings
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .compiled_forest import compile_estimator
+from .feature_registry import compile_plan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models"))
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "model_cache"))
+
+RIGIDITY = "rigidity"
+PADS = "pads"
+SEMG = "semg"
+MODEL_FILES = {
+    RIGIDITY: "rigidity_model_v0.joblib",
+    PADS: "pads_model.joblib",
+    SEMG: "semg_model.joblib",
+}
+
+# Bump when the compiled artifact layout changes so stale caches are ignored
+_CACHE_FORMAT = 1
+# Random rows compared between sklearn and the compiled forest before use
+_VALIDATION_ROWS = 64
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _estimator(artifact: Any) -> Any:
+    return artifact["model"] if isinstance(artifact, dict) and "model" in artifact else artifact
+
+
+def _warm_up(artifact: Any):
+    """Score one all-zero row; raises if the artifact cannot serve predictions."""
+    model = _estimator(artifact)
+    if isinstance(artifact, dict) and "features" in artifact:
+        n_features = len(artifact["features"])
+    else:
+        # Bare estimators are fed [emg_wrist, emg_arm]
+        n_features = 2
+    expected = getattr(model, "n_features_in_", n_features)
+    if expected != n_features:
+        raise ValueError(f"model expects {expected} features, artifact provides {n_features}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        pred = model.predict(np.zeros((1, n_features)))
+    if len(pred) != 1 or not np.isfinite(float(pred[0])):
+        raise ValueError(f"warm-up predict returned {pred!r}")
+
+
+class LoadedModel:
+    """One loaded version of a model artifact."""
+
+    __slots__ = ("artifact", "path", "signature", "digest", "compiled", "mmapped", "loaded_at")
+
+    def __init__(self, artifact: Any, path: str = "", signature=None, digest: str = "", compiled: bool = False, mmapped: bool = False):
+        self.artifact = artifact
+        self.path = path
+        self.signature = signature
+        self.digest = digest
+        self.compiled = compiled
+        self.mmapped = mmapped
+        self.loaded_at = time.time()
+
+    def info(self) -> dict:
+        return {
+            "file": os.path.basename(self.path) if self.path else None,
+            "version": self.artifact.get("version") if isinstance(self.artifact, dict) else None,
+            "digest": self.digest or None,
+            "compiled": self.compiled,
+            "mmapped": self.mmapped,
+            "loaded_at": round(self.loaded_at, 3),
+        }
+
+
+class ModelRegistry:
+    """
+    Current version of each model artifact in `model_dir`, hot-reloaded.
+
+    Nothing is read at import: `load_all` runs during the startup warm-up,
+    and the first `get` before that loads synchronously. A background task
+    polls the artifact files. When one changes, and has
+    then stayed unchanged for a poll interval (so a file still being copied
+    is not read), the new version is loaded in a worker thread, warmed up
+    with a predict, and swapped in with one reference assignment. Requests
+    that already fetched the previous version finish with it; a version
+    that fails to load or validate is logged and the old one kept.
+
+    With `compile` on, tree ensembles are compiled (see `compiled_forest`)
+    and checked against sklearn, and the compiled artifact is written once
+    to `cache_dir` under the source file's digest. Every process loads it
+    with ``joblib.load(mmap_mode="r")``, so uvicorn workers on a host share
+    the node tables as read-only page-cache pages instead of each holding a
+    private copy.
+    """
+
+    def __init__(self, model_dir: str, files: Dict[str, str], cache_dir: Optional[str] = None, compile: bool = True, poll_interval: float = 5.0):
+        self.model_dir = model_dir
+        self.files = dict(files)
+        self.cache_dir = cache_dir
+        self.compile = compile
+        self.poll_interval = float(poll_interval)
+        self._current: Dict[str, LoadedModel] = {}
+        self._seen: Dict[str, Optional[tuple]] = {}
+        self._failed: Dict[str, tuple] = {}
+        self._errors: Dict[str, str] = {}
+        # Startup load and the poller may race for the same file
+        self._load_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.reloads = 0
+        self.failures = 0
+        self.cache_hits = 0
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.model_dir, self.files[name])
+
+    def get(self, name: str) -> Any:
+        """The current artifact for `name`, or None if none is loaded.
+
+        Callers should fetch once per request and use that reference
+        throughout, so a concurrent swap cannot mix versions mid-request.
+        """
+        if not self._loaded:
+            self.load_all()
+        entry = self._current.get(name)
+        return entry.artifact if entry is not None else None
+
+    def digests(self) -> Dict[str, str]:
+        """Content digest of each served artifact (identifies the version across processes)."""
+        return {name: entry.digest for name, entry in self._current.items()}
+
+    def install(self, name: str, artifact: Any):
+        """Serve `artifact` for `name` (None unloads it), bypassing the files."""
+        if not self._loaded:
+            self.load_all()
+        if artifact is None:
+            self._current.pop(name, None)
+        else:
+            self._current[name] = LoadedModel(artifact)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load_all(self):
+        """Load every artifact present in `model_dir` (blocking; used at startup)."""
+        with self._init_lock:
+            if self._loaded:
+                return
+            for name in self.files:
+                self.reload(name)
+            self._loaded = True
+
+    def _needs_load(self, name: str, signature) -> bool:
+        if signature is None or self._failed.get(name) == signature:
+            return False
+        current = self._current.get(name)
+        return current is None or current.signature != signature
+
+    def reload(self, name: str) -> bool:
+        """Load `name` from disk if its file changed since the served version."""
+        path = self.path(name)
+        with self._load_lock:
+            signature = _file_signature(path)
+            if not self._needs_load(name, signature):
+                return False
+            previous = self._current.get(name)
+            try:
+                entry = self._load(path, signature)
+            except Exception as e:
+                self.failures += 1
+                self._failed[name] = signature
+                self._errors[name] = str(e)
+                logger.warning("Could not load %s model from %s: %s", name, path, e)
+                return False
+            self._current[name] = entry
+            self._errors.pop(name, None)
+        if previous is not None and previous.path:
+            self.reloads += 1
+            logger.info("Reloaded %s model from %s (%s -> %s)", name, path, previous.digest, entry.digest)
+        else:
+            logger.info("Loaded %s model from %s", name, path)
+        return True
+
+    def _cache_path(self, path: str, digest: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, f"{stem}-{digest}-v{_CACHE_FORMAT}.joblib")
+
+    def _load(self, path: str, signature) -> LoadedModel:
+        import joblib  # deferred: only needed once a model is actually read
+        digest = _file_digest(path)
+        cache_path = self._cache_path(path, digest) if self.compile else None
+        artifact = None
+        compiled = mmapped = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                artifact = joblib.load(cache_path, mmap_mode="r")
+                compiled = mmapped = True
+                self.cache_hits += 1
+            except Exception as e:
+                logger.warning("Ignoring unreadable compiled model %s: %s", cache_path, e)
+        if artifact is None:
+            artifact = joblib.load(path)
+            if self.compile:
+                compiled_artifact = self._compile(artifact, path)
+                if compiled_artifact is not None:
+                    artifact, compiled = compiled_artifact, True
+                    if cache_path:
+                        artifact, mmapped = self._write_cache(cache_path, artifact)
+        if isinstance(artifact, dict) and "features" in artifact:
+            # Resolve the feature list against the registry once, not per packet
+            artifact = {**artifact, "plan": compile_plan(artifact["features"], os.path.basename(path))}
+        _warm_up(artifact)
+        return LoadedModel(artifact, path, signature, digest, compiled, mmapped)
+
+    def _compile(self, artifact: Any, path: str) -> Any:
+        """The artifact with its estimator compiled, or None to keep sklearn."""
+        estimator = _estimator(artifact)
+        compiled = compile_estimator(estimator)
+        if compiled is None:
+            return None
+        X = np.random.default_rng(0).normal(size=(_VALIDATION_ROWS, compiled.n_features_in_)) * 10
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            expected = np.asarray(estimator.predict(X))
+        if not np.array_equal(expected, compiled.predict(X)):
+            logger.warning("Compiled %s disagrees with sklearn; serving it uncompiled", os.path.basename(path))
+            return None
+        logger.info("Compiled %s: %d trees, %d nodes, depth %d", os.path.basename(path), compiled.n_trees, compiled.node_count, compiled.depth)
+        return {**artifact, "model": compiled} if artifact is not estimator else compiled
+
+    def _write_cache(self, cache_path: str, artifact: Any) -> Tuple[Any, bool]:
+        """Persist a compiled artifact and reopen it memory-mapped."""
+        import joblib
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            joblib.dump(artifact, tmp)
+            # Atomic: concurrent workers compiling the same version just overwrite each other
+            os.replace(tmp, cache_path)
+            mapped = joblib.load(cache_path, mmap_mode="r")
+        except Exception as e:
+            logger.warning("Could not cache compiled model at %s: %s", cache_path, e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return artifact, False
+        self._prune_cache(cache_path)
+        return mapped, True
+
+    def _prune_cache(self, keep: str):
+        # Older versions of the same artifact; processes still mapping them keep their pages
+        prefix = os.path.basename(keep).rsplit("-", 2)[0] + "-"
+        directory = os.path.dirname(keep)
+        for name in os.listdir(directory):
+            full = os.path.join(directory, name)
+            if name.startswith(prefix) and name.endswith(".joblib") and full != keep:
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+
+    async def start(self):
+        """Start watching `model_dir` (no-op when `poll_interval` is 0)."""
+        if self.poll_interval <= 0 or self._task is not None:
+            return
+        self._stopping = False
+        for name in self.files:
+            self._seen[name] = _file_signature(self.path(name))
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            await asyncio.sleep(self.poll_interval)
+            for name in self.files:
+                signature = _file_signature(self.path(name))
+                stable = signature == self._seen.get(name)
+                self._seen[name] = signature
+                if stable and self._needs_load(name, signature):
+                    try:
+                        await asyncio.to_thread(self.reload, name)
+                    except Exception:
+                        logger.exception("Model reload for %s failed", name)
+
+    async def close(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "model_dir": self.model_dir,
+            "poll_interval_s": self.poll_interval,
+            "loaded": self._loaded,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "models": {name: entry.info() for name, entry in sorted(self._current.items())},
+            "errors": dict(self._errors),
+        }
+
+
+# Shared registry of the AI pipeline's models
+model_registry = ModelRegistry(
+    settings.MODEL_DIR or DEFAULT_MODEL_DIR,
+    MODEL_FILES,
+    cache_dir=settings.MODEL_CACHE_DIR or DEFAULT_CACHE_DIR,
+    compile=settings.COMPILED_MODELS,
+    poll_interval=settings.MODEL_RELOAD_INTERVAL,
+)
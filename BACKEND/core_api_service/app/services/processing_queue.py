@@ -0,0 +1,180 @@
+# File: BACKEND/core_api_service/app/services/processing_queue.py
+
+import asyncio
+import logging
+import math
+import time
+import zlib
+from collections import deque
+from typing import Awaitable, Callable, List, Optional
+
+from ..config import settings
+from ..metrics import STAGE_SECONDS
+from ..samples import SAMPLE_WINDOW, summarize
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised by `submit` when the queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"processing queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class QueueClosedError(Exception):
+    """Raised by `submit` once the queue is draining for shutdown."""
+
+
+class ProcessingQueue:
+    """
+    Bounded background job queue served by a fixed pool of async workers.
+
+    Jobs are sharded by key (the user id) so every job for one user is handled
+    by the same worker, in submission order. Capacity is counted in packets
+    (`weight`) across all shards; when it is exhausted `submit` raises
+    `QueueFullError` so the caller can push back on the client. A job heavier
+    than the whole capacity is still admitted into an empty queue, so it is
+    not turned away with a retry that can never succeed.
+
+    A caller that must do something between admission and queueing (persist
+    the packets) can `reserve` the capacity first, then `submit` with
+    ``reserved=True`` or give it back with `release`.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 2000):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._shards: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+        self._closed = False
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._service_samples = deque(maxlen=SAMPLE_WINDOW)
+        self._wait_histogram = STAGE_SECONDS.labels("queue_wait")
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Spawn the worker tasks. Safe to call more than once."""
+        if self._tasks:
+            return
+        self._closed = False
+        self._spawn_workers()
+        logger.info("Processing queue started: %d workers, capacity %d", self.workers, self.max_pending)
+
+    def _spawn_workers(self):
+        self._shards = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    def _shard_for(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.workers
+
+    def _retry_after(self) -> int:
+        service = self._service_samples
+        mean_service = (sum(service) / len(service)) if service else 0.05
+        return int(min(60, max(1, math.ceil(self._pending * mean_service / self.workers))))
+
+    def reserve(self, weight: int = 1):
+        """Claim capacity for `weight` packets; raises like `submit`."""
+        if self._closed:
+            self._rejected += weight
+            raise QueueClosedError("processing queue is shutting down")
+        if self._pending and self._pending + weight > self.max_pending:
+            self._rejected += weight
+            raise QueueFullError(self._retry_after())
+        self._pending += weight
+
+    def release(self, weight: int = 1):
+        """Give back capacity taken by `reserve` for a job that will not be submitted."""
+        self._pending -= weight
+
+    def submit(self, key: str, job: Callable[[], Awaitable], weight: int = 1, reserved: bool = False):
+        """Queue `job` (a zero-argument coroutine factory) behind earlier jobs for `key`.
+
+        With `reserved`, the capacity was already taken by `reserve`.
+        """
+        if not reserved:
+            self.reserve(weight)
+        elif self._closed:
+            # Drain has already queued the workers' stop markers
+            self.release(weight)
+            self._rejected += weight
+            raise QueueClosedError("processing queue is shutting down")
+        if not self._tasks:
+            # Lazily start when the app was not run through its startup event (e.g. tests)
+            self._spawn_workers()
+        self._submitted += weight
+        self._shards[self._shard_for(key or "")].put_nowait((time.monotonic(), weight, job))
+
+    async def _worker(self, index: int):
+        queue = self._shards[index]
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            enqueued_at, weight, job = item
+            started = time.monotonic()
+            self._wait_samples.append(started - enqueued_at)
+            self._wait_histogram.observe(started - enqueued_at)
+            try:
+                await job()
+            except Exception as e:
+                self._failed += weight
+                logger.exception("Processing job failed: %s", e)
+            finally:
+                self._service_samples.append(time.monotonic() - started)
+                self._pending -= weight
+                self._completed += weight
+                queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Stop accepting jobs and wait for queued ones to finish.
+
+        Workers still busy after `timeout` seconds are cancelled and the number
+        of abandoned packets is logged.
+        """
+        if not self._tasks:
+            self._closed = True
+            return
+        self._closed = True
+        logger.info("Draining processing queue: %d packets pending", self._pending)
+        for queue in self._shards:
+            queue.put_nowait(None)
+        done, not_done = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning("Processing queue drain timed out; %d packets abandoned", self._pending)
+        self._tasks = []
+        self._shards = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "capacity": self.max_pending,
+            "depth": self._pending,
+            "shard_depths": [q.qsize() for q in self._shards],
+            "closed": self._closed,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "wait": summarize(self._wait_samples),
+            "service": summarize(self._service_samples),
+        }
+
+
+# Single shared queue for ingest background processing
+processing_queue = ProcessingQueue(
+    workers=settings.PROCESSING_WORKERS,
+    max_pending=settings.PROCESSING_QUEUE_SIZE,
+)
@@ -0,0 +1,168 @@
+# File: BACKEND/core_api_service/app/services/profile_cache.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from ..config import settings
+
+# Per-user documents held in the cache
+KIND_CONSENT = "consent"
+KIND_USER = "user"
+_KINDS = (KIND_CONSENT, KIND_USER)
+
+_MISSING = object()
+
+
+class ProfileCache:
+    """
+    TTL cache for per-user Firestore documents (user profile, consent).
+
+    Found documents are kept for `ttl` seconds. Documents that do not exist
+    are cached too, for `negative_ttl` seconds, so users who never set a
+    preference do not cost a read on every alert. Read errors are never
+    cached. Writers call `invalidate(uid)` so this instance sees its own
+    writes immediately; other instances converge within the TTL. A load
+    that was already running when its key was invalidated is returned to
+    its caller but not cached, since it may have read the old document.
+    Entries are evicted least-recently-used beyond `max_entries`.
+    """
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 60.0, max_entries: int = 10000):
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Bumped by invalidate(); a load only stores if its key's is unchanged
+        self._generations: Dict[Hashable, int] = {}
+        # Sync routes run in the threadpool, so guard the LRU with a real lock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[Any, int]:
+        """The cached value (or `_MISSING`) and the key's current generation."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, found, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    if found:
+                        self.hits += 1
+                    else:
+                        self.negative_hits += 1
+                    return value, 0
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING, self._generations.get(key, 0)
+
+    def _store(self, key: Hashable, value: Any, found: bool, generation: int):
+        expires_at = time.monotonic() + (self.ttl if found else self.negative_ttl)
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return
+            self._entries[key] = (value, found, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, loader: Callable[[], Tuple[Any, bool]]) -> Any:
+        """Return the cached value for `key`, calling `loader` on a miss.
+
+        `loader` returns ``(value, found)``; ``found=False`` is cached for the
+        shorter negative TTL. Exceptions from `loader` propagate uncached.
+        """
+        value, generation = self._lookup(key)
+        if value is _MISSING:
+            value, found = loader()
+            self._store(key, value, found, generation)
+        return value
+
+    async def get_async(self, key: Hashable, loader: Callable[[], Tuple[Any, bool]]) -> Any:
+        """Like `get`, but runs a blocking `loader` in a worker thread on a miss."""
+        value, generation = self._lookup(key)
+        if value is _MISSING:
+            value, found = await asyncio.to_thread(loader)
+            self._store(key, value, found, generation)
+        return value
+
+    def invalidate(self, uid: str, kind: Optional[str] = None):
+        """Drop cached documents for `uid` (all kinds unless `kind` is given)."""
+        with self._lock:
+            for k in ((kind,) if kind else _KINDS):
+                self._entries.pop((uid, k), None)
+                self._generations[(uid, k)] = self._generations.get((uid, k), 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Shared cache for user profile and preference documents
+profile_cache = ProfileCache(
+    ttl=settings.PROFILE_CACHE_TTL,
+    negative_ttl=settings.PROFILE_CACHE_NEGATIVE_TTL,
+    max_entries=settings.PROFILE_CACHE_SIZE,
+)
+
+
+def consent_ref(db, uid: str):
+    # Path: users/{uid}/preferences/consent
+    return db.collection("users").document(uid).collection("preferences").document("consent")
+
+
+def _consent_loader(db, uid: str):
+    def load():
+        doc = consent_ref(db, uid).get()
+        if doc and doc.exists:
+            return bool(doc.to_dict().get("consent", False)), True
+        return False, False
+    return load
+
+
+def _user_loader(db, uid: str):
+    def load():
+        doc = db.collection("users").document(uid).get()
+        if doc.exists:
+            return doc.to_dict(), True
+        return None, False
+    return load
+
+
+def get_consent(db, uid: str) -> bool:
+    """The user's external-AI consent flag (False when never set)."""
+    return profile_cache.get((uid, KIND_CONSENT), _consent_loader(db, uid))
+
+
+async def get_consent_async(db, uid: str) -> bool:
+    """`get_consent` for the event loop: a cache miss is read in a worker thread."""
+    return await profile_cache.get_async((uid, KIND_CONSENT), _consent_loader(db, uid))
+
+
+def get_user_doc(db, uid: str) -> Optional[dict]:
+    """The user's profile document, or None if there is none."""
+    return profile_cache.get((uid, KIND_USER), _user_loader(db, uid))
+
+
+async def get_user_doc_async(db, uid: str) -> Optional[dict]:
+    """`get_user_doc` for the event loop: a cache miss is read in a worker thread."""
+    return await profile_cache.get_async((uid, KIND_USER), _user_loader(db, uid))
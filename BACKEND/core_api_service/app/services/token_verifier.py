@@ -0,0 +1,132 @@
+# File: BACKEND/core_api_service/app/services/token_verifier.py
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException
+
+from ..config import settings
+from ..metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Tokens accepted by the Node simulator instead of a real Firebase ID token
+SIMULATOR_TOKENS = ("simulator_test_token", "simulator_mode_bypass")
+SIMULATOR_UID = "simulator_user_test_123"
+
+# Stop serving a cached token this many seconds before its `exp`
+_EXPIRY_LEEWAY_S = 5.0
+
+
+class TokenVerifier:
+    """
+    Verifies Firebase ID tokens and remembers the ones that passed.
+
+    A verified token's claims are cached under the SHA-256 of the token until
+    shortly before the token's own `exp` (and never longer than `max_ttl`), so
+    repeated requests from one device session skip the RSA signature check.
+    Entries are evicted least-recently-used beyond `max_entries`.
+
+    Google's signing certificates are already cached locally by firebase_admin
+    (its cert fetcher honours the Cache-Control max-age of the cert endpoint),
+    so a cache miss costs one signature check rather than a network fetch.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_ttl: float = 3600.0):
+        self.max_entries = max(1, int(max_entries))
+        self.max_ttl = float(max_ttl)
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        # Sync routes run in the threadpool, so guard the LRU with a real lock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.failures = 0
+
+    def verify(self, id_token: str) -> dict:
+        """Return the decoded claims for `id_token`, verifying it on a cache miss."""
+        key = hashlib.sha256(id_token.encode("utf-8")).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return claims
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+
+        from firebase_admin import auth as fb_auth
+        try:
+            claims = fb_auth.verify_id_token(id_token)
+        except Exception:
+            self.failures += 1
+            raise
+
+        expires_at = min(float(claims.get("exp", now)), now + self.max_ttl) - _EXPIRY_LEEWAY_S
+        if expires_at > now:
+            with self._lock:
+                self._entries[key] = (claims, expires_at)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "failures": self.failures,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Single shared verifier for all routes
+token_verifier = TokenVerifier(
+    max_entries=settings.TOKEN_CACHE_SIZE,
+    max_ttl=settings.TOKEN_CACHE_MAX_TTL,
+)
+
+
+def verify_authorization(authorization: Optional[str], allow_simulator: bool = False) -> str:
+    """Resolve the user id for an ``Authorization`` header value.
+
+    Accepts ``Bearer <id_token>`` or a bare token. When `allow_simulator` is
+    set, the simulator bypass tokens map to the shared simulator user.
+    Raises HTTP 401 for missing or invalid tokens.
+    """
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Missing Authorization header")
+
+    if authorization.lower().startswith("bearer "):
+        id_token = authorization.split(" ", 1)[1]
+    else:
+        id_token = authorization
+
+    if allow_simulator and id_token in SIMULATOR_TOKENS:
+        return SIMULATOR_UID
+
+    try:
+        with stage("auth"):
+            decoded = token_verifier.verify(id_token)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+    uid = decoded.get("uid")
+    if not uid:
+        raise HTTPException(status_code=401, detail="Invalid token: no uid")
+    return uid
@@ -0,0 +1,203 @@
+# File: BACKEND/core_api_service/app/services/tremor_estimator.py
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+# Parkinsonian resting tremor band, as in tools/verify_hardware_packet.py
+TREMOR_BAND_HZ = (3.0, 7.0)
+
+TREMOR_FEATURES = (
+    "tremor_estimated",
+    "tremor_peak_hz",
+    "tremor_peak_amplitude_g",
+    "tremor_band_power",
+    "tremor_band_detected",
+)
+
+# Features of a packet without (enough) streamed samples
+NO_ESTIMATE = dict.fromkeys(TREMOR_FEATURES, 0.0)
+
+# Amplitude of a sinusoid from the summed power of its Hann-windowed bins:
+# an on-bin tone puts A*N/4 in its bin and A*N/8 in each neighbour
+_HANN_AMPLITUDE = math.sqrt(32.0 / 3.0)
+
+_tables: Dict[Tuple[int, int, int], np.ndarray] = {}
+_tables_lock = threading.Lock()
+
+
+def _twiddles(size: int, k_lo: int, k_hi: int) -> np.ndarray:
+    """exp(-2j*pi*k*n/size) for bins k_lo..k_hi and ring positions n, shared by all devices."""
+    key = (size, k_lo, k_hi)
+    table = _tables.get(key)
+    if table is None:
+        k = np.arange(k_lo, k_hi + 1)[:, None]
+        n = np.arange(size)[None, :]
+        table = np.exp(-2j * np.pi * k * n / size)
+        with _tables_lock:
+            table = _tables.setdefault(key, table)
+    return table
+
+
+class TremorEstimator:
+    """
+    Sliding spectral estimate of one device's accelerometer stream.
+
+    Keeps the last `window_s` seconds of samples in a ring buffer and the
+    DFT of that window at the integer bins covering the tremor band (bin
+    spacing 1 / `window_s` Hz), plus guard bins on both sides. Each sample
+    updates every bin by its difference with the sample it evicts, so the
+    work is O(bins) per sample and independent of the window length, like a
+    bank of sliding Goertzel filters. The bins are re-derived from the
+    buffer once per lap so float error cannot accumulate.
+
+    `estimate` applies a Hann window in the frequency domain (three-tap
+    convolution of neighbouring bins), so gravity and slow arm movement do
+    not leak into the band, then reports the interpolated peak frequency,
+    the amplitude of the peak and the power in the band. Tremor is detected
+    as in ``heuristic_tremor_check``: a peak inside the band with an
+    amplitude above `min_amplitude` g. A peak in a guard bin is energy from
+    outside the band.
+    """
+
+    __slots__ = (
+        "sample_rate", "size", "min_amplitude", "k_lo", "k_hi", "band_lo", "band_hi",
+        "_twiddle", "_buf", "_bins", "_index", "_count",
+    )
+
+    def __init__(self, sample_rate_hz: float, window_s: float = 2.0, min_amplitude: float = 0.5, band: Tuple[float, float] = TREMOR_BAND_HZ):
+        self.sample_rate = float(sample_rate_hz)
+        self.min_amplitude = float(min_amplitude)
+        self.size = max(8, int(round(window_s * self.sample_rate)))
+        resolution = self.sample_rate / self.size
+        # In-band Hann bins, one guard bin each side, and the raw neighbours the Hann taps read
+        self.band_lo = int(math.ceil(band[0] / resolution - 1e-9))
+        self.band_hi = int(math.floor(band[1] / resolution + 1e-9))
+        self.k_lo = max(0, self.band_lo - 2)
+        self.k_hi = min(self.size // 2, self.band_hi + 2)
+        self._twiddle = _twiddles(self.size, self.k_lo, self.k_hi)
+        self._buf = np.zeros(self.size)
+        self._bins = np.zeros(self.k_hi - self.k_lo + 1, dtype=complex)
+        self._index = 0
+        self._count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._count >= self.size
+
+    def update(self, samples: Sequence[float]):
+        x = np.asarray(samples, dtype=float)
+        for start in range(0, len(x), self.size):
+            chunk = x[start:start + self.size]
+            i = self._index
+            positions = np.arange(i, i + len(chunk)) % self.size
+            self._bins += self._twiddle[:, positions] @ (chunk - self._buf[positions])
+            self._buf[positions] = chunk
+            self._count = min(self.size, self._count + len(chunk))
+            self._index = (i + len(chunk)) % self.size
+            if i + len(chunk) >= self.size:
+                self._bins = self._twiddle @ self._buf
+
+    def spectrum(self) -> np.ndarray:
+        """Hann-windowed DFT magnitudes of the current window, bins k_lo+1 .. k_hi-1."""
+        # Bins are referenced to ring position 0; rotate them to the window start
+        k = np.arange(self.k_lo, self.k_hi + 1)
+        bins = self._bins * np.exp(2j * np.pi * k * self._index / self.size)
+        hann = 0.5 * bins[1:-1] - 0.25 * (bins[:-2] + bins[2:])
+        return np.abs(hann)
+
+    def estimate(self) -> Dict[str, float]:
+        if not self.ready:
+            return dict(NO_ESTIMATE)
+        mags = self.spectrum()
+        first = self.k_lo + 1
+        lo, hi = self.band_lo - first, self.band_hi - first
+        peak = lo - 1 + int(np.argmax(mags[max(0, lo - 1):hi + 2]))
+        if 0 < peak < len(mags) - 1:
+            left, mid, right = mags[peak - 1], mags[peak], mags[peak + 1]
+            # Hann-window peak interpolation
+            offset = 2.0 * (right - left) / max(1e-12, left + 2.0 * mid + right)
+        else:
+            offset = 0.0
+        resolution = self.sample_rate / self.size
+        peak_hz = (first + peak + offset) * resolution
+        n = float(self.size)
+        around = mags[max(0, peak - 2):peak + 3]
+        amplitude = _HANN_AMPLITUDE * math.sqrt(float(np.dot(around, around))) / n
+        band = mags[lo:hi + 1]
+        band_amplitude = _HANN_AMPLITUDE * math.sqrt(float(np.dot(band, band))) / n
+        in_band = self.band_lo * resolution <= peak_hz <= self.band_hi * resolution
+        return {
+            "tremor_estimated": 1.0,
+            "tremor_peak_hz": peak_hz,
+            "tremor_peak_amplitude_g": amplitude,
+            # Mean power of the band-limited signal (g^2)
+            "tremor_band_power": band_amplitude * band_amplitude / 2.0,
+            "tremor_band_detected": 1.0 if in_band and amplitude > self.min_amplitude else 0.0,
+        }
+
+
+class TremorEstimatorStore:
+    """Tremor estimators keyed by device stream, least recently updated evicted first."""
+
+    def __init__(self, window_s: float = 2.0, min_amplitude: float = 0.5, max_devices: int = 10000):
+        self.window_s = float(window_s)
+        self.min_amplitude = float(min_amplitude)
+        self.max_devices = max(1, int(max_devices))
+        self._estimators: "OrderedDict[str, TremorEstimator]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.samples = 0
+
+    def update(self, key: Optional[str], tremor) -> Dict[str, float]:
+        """Feed the samples carried by `tremor` (a TremorData) and return the estimate.
+
+        Packets without samples, or without a usable sample rate, return
+        `NO_ESTIMATE`. A device that changes its sample rate starts over.
+        """
+        samples = getattr(tremor, "samples_g", None)
+        rate = getattr(tremor, "sample_rate_hz", None)
+        # The upper guard bin must stay below Nyquist
+        if not samples or not rate or rate <= 2.0 * (TREMOR_BAND_HZ[1] + 2.0 / self.window_s):
+            return NO_ESTIMATE
+        self.samples += len(samples)
+        if not key:
+            estimator = TremorEstimator(rate, self.window_s, self.min_amplitude)
+            estimator.update(samples)
+            return estimator.estimate()
+        with self._lock:
+            estimator = self._estimators.get(key)
+            if estimator is None or estimator.sample_rate != float(rate):
+                estimator = self._estimators[key] = TremorEstimator(rate, self.window_s, self.min_amplitude)
+                if len(self._estimators) > self.max_devices:
+                    self._estimators.popitem(last=False)
+                    self.evicted += 1
+            self._estimators.move_to_end(key)
+            estimator.update(samples)
+            return estimator.estimate()
+
+    def reset(self, key: str):
+        with self._lock:
+            self._estimators.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._estimators),
+            "max_devices": self.max_devices,
+            "window_s": self.window_s,
+            "samples": self.samples,
+            "evicted": self.evicted,
+        }
+
+
+# Shared per-device tremor estimators for the AI pipeline
+tremor_estimators = TremorEstimatorStore(
+    window_s=settings.TREMOR_WINDOW_S,
+    min_amplitude=settings.TREMOR_MIN_AMPLITUDE_G,
+    max_devices=settings.FEATURE_WINDOW_MAX_DEVICES,
+)
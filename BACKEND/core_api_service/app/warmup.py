@@ -0,0 +1,100 @@
+# File: BACKEND/core_api_service/app/warmup.py
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupWarmup:
+    """
+    Startup work that has to finish before a worker takes traffic.
+
+    The app accepts connections as soon as it is imported; `start` runs the
+    warm-up phases as a background task. Phases run in order and the steps
+    of a phase run concurrently: coroutine functions are awaited, blocking
+    callables (imports, model loads) run in worker threads. `/ready`
+    answers 503 until every step has succeeded, so a load balancer only
+    routes to warm workers.
+    """
+
+    def __init__(self):
+        self.state = PENDING
+        self.steps: Dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def start(self, *phases: Dict[str, Callable]):
+        """Run `phases` (each a mapping of step name to callable) in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(*phases))
+
+    async def run(self, *phases: Dict[str, Callable]) -> bool:
+        self.state = RUNNING
+        self.started_at = time.monotonic()
+        for phase in phases:
+            for name in phase:
+                self.steps[name] = {"status": PENDING, "seconds": None}
+        ok = True
+        for phase in phases:
+            results = await asyncio.gather(*(self._step(name, fn) for name, fn in phase.items()))
+            if not all(results):
+                ok = False
+                break
+        self.finished_at = time.monotonic()
+        self.state = READY if ok else FAILED
+        elapsed = self.finished_at - self.started_at
+        if ok:
+            logger.info("Startup warm-up finished in %.2fs: %s", elapsed, {n: s["seconds"] for n, s in self.steps.items()})
+        else:
+            logger.error("Startup warm-up failed after %.2fs; staying unready: %s", elapsed, self.steps)
+        return ok
+
+    async def _step(self, name: str, fn: Callable) -> bool:
+        step = self.steps[name]
+        step["status"] = RUNNING
+        started = time.monotonic()
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                await fn()
+            else:
+                await asyncio.to_thread(fn)
+        except Exception as e:
+            logger.exception("Warm-up step %s failed", name)
+            step.update(status=FAILED, error=str(e))
+            return False
+        finally:
+            step["seconds"] = round(time.monotonic() - started, 3)
+        step["status"] = READY
+        return True
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        if self.started_at is None:
+            elapsed = None
+        else:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return {"status": self.state, "elapsed_s": elapsed, "steps": self.steps}
+
+
+# Startup warm-up of the API process (started from main.startup_event)
+startup_warmup = StartupWarmup()
@@ -0,0 +1,77 @@
+"""
+Benchmark: dict-based packet normalization vs. the single-pass decoder.
+
+Usage:
+    python tools/bench_decode.py [iterations]
+
+Compares, per packet:
+ - legacy path: json.loads -> routes.ingest._normalize_packet (dict copy + mutation) -> DeviceData(**packet)
+ - fast path:   models.decode.decode_packet (bytes -> validated, normalized DeviceData)
+
+and checks both paths produce identical model dumps before timing them.
+"""
+import json
+import os
+import sys
+import timeit
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.models.decode import decode_packet, decode_packet_list
+from app.models.schemas import DeviceData
+from app.routes.ingest import _normalize_packet
+
+
+SAMPLES = [
+    # Legacy hardware packet: yes/no flags and a short HH:MM timestamp
+    {
+        "timestamp": "19:37",
+        "safety": {"fall_detected": "no", "accel_x_g": 0.02, "accel_y_g": -0.01, "accel_z_g": 0.98},
+        "tremor": {"frequency_hz": 5, "amplitude_g": 14.3000021, "tremor_detected": "yes"},
+        "rigidity": {"emg_wrist": -0.88, "emg_arm": 9, "rigid": "yes"},
+    },
+    # Current firmware packet: booleans and ISO timestamp
+    {
+        "timestamp": "2025-11-16T10:00:00Z",
+        "device_id": "wrist_unit_001",
+        "safety": {"fall_detected": False, "accel_x_g": 0.98, "accel_y_g": 0.05, "accel_z_g": 0.15},
+        "tremor": {"frequency_hz": 4.5, "amplitude_g": 0.12, "tremor_detected": True},
+        "rigidity": {"emg_wrist": 450.0, "emg_arm": 380.0, "rigid": False},
+    },
+]
+
+
+def legacy_decode(raw: bytes) -> DeviceData:
+    return DeviceData(**_normalize_packet(json.loads(raw)))
+
+
+def bench(fn, raw: bytes, iterations: int) -> float:
+    """Return mean microseconds per call."""
+    return timeit.timeit(lambda: fn(raw), number=iterations) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f"{'packet':<10}{'legacy µs':>12}{'fast µs':>12}{'saved µs':>12}{'speedup':>10}")
+    for i, sample in enumerate(SAMPLES):
+        raw = json.dumps(sample).encode("utf-8")
+        assert legacy_decode(raw).model_dump() == decode_packet(raw).model_dump(), "decode paths disagree"
+        legacy = bench(legacy_decode, raw, iterations)
+        fast = bench(decode_packet, raw, iterations)
+        print(f"{'#' + str(i):<10}{legacy:>12.2f}{fast:>12.2f}{legacy - fast:>12.2f}{legacy / fast:>9.2f}x")
+
+    # Batch of 500 packets as a JSON array
+    batch = [SAMPLES[i % len(SAMPLES)] for i in range(500)]
+    raw = json.dumps(batch).encode("utf-8")
+    n = max(1, iterations // 500)
+    legacy = timeit.timeit(lambda: [DeviceData(**_normalize_packet(p)) for p in json.loads(raw)], number=n) / n / len(batch) * 1e6
+    fast = timeit.timeit(lambda: decode_packet_list(raw), number=n) / n / len(batch) * 1e6
+    print(f"{'batch/pkt':<10}{legacy:>12.2f}{fast:>12.2f}{legacy - fast:>12.2f}{legacy / fast:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
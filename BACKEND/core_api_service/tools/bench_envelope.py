@@ -0,0 +1,146 @@
+"""
+Allocation benchmark for the serialize-once processed packet envelope.
+
+Usage:
+    python tools/bench_envelope.py [--packets 2000]
+
+Replays the serialization done per processed packet by
+`_process_and_save_async` (two Firestore writes, the dashboard broadcast
+with care recommendations and, for alert packets, the alert snapshot, its
+Firestore write and its broadcast) the old way (a `model_dump` per consumer
+and `json.dumps` per message) and through `ProcessedEnvelope`.
+
+Checks that:
+ - both paths produce the same Firestore documents,
+ - both paths broadcast messages that decode to the same JSON, and the
+   envelope's are ASCII-escaped as json.dumps output is.
+Then prints, per packet, the memory held by its outputs (Firestore
+documents and messages, alive until written and sent), the peak traced
+memory while serializing it and the time taken, for normal and alert
+packets.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.models.envelope import ProcessedEnvelope
+from app.models.schemas import Alert, ProcessedData
+from app.services.care_recommendations import generate_care_recommendations
+
+
+def make_processed(rng: random.Random, i: int, fall: bool) -> ProcessedData:
+    scores = {"tremor": round(rng.random(), 3), "rigidity": round(rng.random(), 3), "fall": 1.0 if fall else round(rng.random() * 0.2, 3)}
+    return ProcessedData(
+        timestamp=f"2025-11-16T10:00:{i:06d}Z",
+        device_id="wrist_unit_001",
+        safety={"fall_detected": fall, "accel_x_g": rng.uniform(-2, 2), "accel_y_g": rng.uniform(-2, 2), "accel_z_g": rng.uniform(-1, 2)},
+        tremor={"frequency_hz": 5.0, "amplitude_g": rng.uniform(0, 40), "tremor_detected": rng.random() < 0.5},
+        rigidity={"emg_wrist": rng.uniform(0, 120), "emg_arm": rng.uniform(0, 120), "rigid": False},
+        analysis={"is_tremor_confirmed": scores["tremor"] > 0.5, "is_rigid": scores["rigidity"] > 0.7, "gait_stability_score": round(rng.random(), 3)},
+        scores=scores,
+    )
+
+
+def make_alert(processed: ProcessedData, snapshot: dict) -> Alert:
+    return Alert(
+        id=f"{processed.timestamp}_fall",
+        timestamp=processed.timestamp,
+        event_type="fall",
+        severity="critical",
+        type="fall",
+        message="Possible fall detected. Check on the patient.",
+        data_snapshot=snapshot,
+    )
+
+
+def legacy(processed: ProcessedData, care: dict, alert: bool):
+    """Serialization as done before the envelope: one dump per consumer."""
+    docs = [processed.model_dump(), processed.model_dump()]
+    processed_dict = processed.model_dump()
+    processed_dict["care_recommendations"] = care["care_recommendations"]
+    processed_dict["recommended_game"] = care["recommended_game"]
+    messages = [json.dumps({"type": "processed_data", "data": processed_dict})]
+    if alert:
+        alert_doc = make_alert(processed, processed.model_dump())
+        docs.append(alert_doc.model_dump())
+        messages.append(json.dumps({"type": "alert", "data": alert_doc.model_dump()}))
+    return docs, messages
+
+
+def enveloped(processed: ProcessedData, care: dict, alert: bool):
+    envelope = ProcessedEnvelope(processed)
+    docs = [envelope.data, envelope.data]
+    envelope.extend(care_recommendations=care["care_recommendations"], recommended_game=care["recommended_game"])
+    messages = [envelope.message_text]
+    if alert:
+        alert_envelope = envelope.alert(make_alert(processed, envelope.data))
+        docs.append(alert_envelope.data)
+        messages.append(alert_envelope.message_text)
+    return docs, messages
+
+
+def check_equivalence(packets, cares):
+    for processed, care in zip(packets, cares):
+        for alert in (False, True):
+            old_docs, old_messages = legacy(processed, care, alert)
+            new_docs, new_messages = enveloped(processed, care, alert)
+            assert old_docs == new_docs, (old_docs, new_docs)
+            assert [json.loads(m) for m in old_messages] == [json.loads(m) for m in new_messages], (old_messages, new_messages)
+            assert all(m.isascii() for m in new_messages), new_messages
+    print(f"PASS {len(packets)} packets: identical Firestore documents and broadcast JSON (ASCII, like json.dumps), with and without alerts")
+
+
+def measure(fn, packets, cares, alert: bool):
+    """Mean bytes held by a packet's outputs, and mean peak while serializing it."""
+    held = peak = 0
+    tracemalloc.start()
+    for processed, care in zip(packets, cares):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        out = fn(processed, care, alert)
+        after, top = tracemalloc.get_traced_memory()
+        held += after - before
+        peak += top - before
+        del out
+    tracemalloc.stop()
+    n = len(packets)
+
+    started = time.perf_counter()
+    for processed, care in zip(packets, cares):
+        fn(processed, care, alert)
+    elapsed = (time.perf_counter() - started) / n
+    return held / n, peak / n, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(21)
+    packets = [make_processed(rng, i, fall=rng.random() < 0.5) for i in range(args.packets)]
+    cares = [generate_care_recommendations(p) for p in packets]
+    check_equivalence(packets[:200], cares[:200])
+
+    for alert in (False, True):
+        label = "alert packet" if alert else "normal packet"
+        results = {name: measure(fn, packets, cares, alert) for name, fn in (("legacy", legacy), ("envelope", enveloped))}
+        for name, (retained, peak, elapsed) in results.items():
+            print(f"{label:<14} {name:<9} held {retained / 1024:6.2f} KiB  peak {peak / 1024:6.2f} KiB  "
+                  f"{elapsed * 1e6:6.1f} µs per packet")
+        (old_r, old_p, old_t), (new_r, new_p, new_t) = results["legacy"], results["envelope"]
+        print(f"{label:<14} envelope saves {100 * (1 - new_r / old_r):.0f}% held, {100 * (1 - new_p / old_p):.0f}% peak, "
+              f"{100 * (1 - new_t / old_t):.0f}% time")
+
+
+if __name__ == "__main__":
+    main()
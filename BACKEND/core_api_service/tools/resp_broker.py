@@ -0,0 +1,184 @@
+"""
+Minimal Redis-protocol (RESP) publish/subscribe broker, a local stand-in for
+Redis when running several API workers on one machine or in tests.
+
+Usage:
+    python tools/resp_broker.py [--host 127.0.0.1] [--port 6379] [--unix /tmp/stancesense-bus.sock]
+
+Then start the workers with PUBSUB_URL=redis://127.0.0.1:6379 (or
+unix:///tmp/stancesense-bus.sock). Supports:
+ - PUBLISH, SUBSCRIBE, UNSUBSCRIBE, PING, ECHO, QUIT,
+ - AUTH <password> and AUTH <username> <password> (with --password; the
+   username, as for Redis's default ACL user, is --user),
+ - multi-bulk and inline (telnet / redis-cli) commands,
+ - disconnecting a subscriber whose unsent output exceeds --max-output bytes,
+   as Redis does with its pubsub client output buffer limit.
+Only pub/sub: there is no keyspace. Use a real Redis across machines.
+"""
+import argparse
+import asyncio
+import os
+from typing import Dict, List, Optional, Set
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _push(kind: bytes, channel: bytes, last: bytes) -> bytes:
+    """A three-element pub/sub reply whose last element is already encoded."""
+    return b"*3\r\n" + _bulk(kind) + _bulk(channel) + last
+
+
+class RespBroker:
+    """Routes PUBLISHed messages to the connections SUBSCRIBEd to their channel."""
+
+    def __init__(self, password: Optional[str] = None, max_output: int = 32 << 20, username: str = "default"):
+        self.password = password.encode() if password else None
+        self.username = username.encode()
+        self.max_output = max_output
+        self._channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self._servers: List[asyncio.AbstractServer] = []
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    async def listen_tcp(self, host: str, port: int) -> int:
+        server = await asyncio.start_server(self._serve, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def listen_unix(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        self._servers.append(await asyncio.start_unix_server(self._serve, path))
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        # Closing the transport ends each connection's read loop
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readuntil(b"\r\n")
+        if not line.startswith(b"*"):
+            # Inline command: PING, SUBSCRIBE chan, ...
+            return line.split() or None
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = await reader.readuntil(b"\r\n")
+            if not header.startswith(b"$"):
+                raise ConnectionError("expected a bulk string")
+            args.append((await reader.readexactly(int(header[1:-2]) + 2))[:-2])
+        return args
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = asyncio.current_task()
+        subscribed: Set[bytes] = set()
+        authed = self.password is None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if not args:
+                    continue
+                name = args[0].upper()
+                if name == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                if name == b"AUTH":
+                    authed = (
+                        self.password is not None
+                        and len(args) in (2, 3)
+                        and args[-1] == self.password
+                        and (len(args) == 2 or args[1] == self.username)
+                    )
+                    writer.write(b"+OK\r\n" if authed else b"-WRONGPASS invalid password\r\n")
+                elif not authed:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name == b"PUBLISH" and len(args) == 3:
+                    writer.write(b":%d\r\n" % self._publish(args[1], args[2]))
+                elif name == b"SUBSCRIBE" and len(args) > 1:
+                    for channel in args[1:]:
+                        subscribed.add(channel)
+                        self._channels.setdefault(channel, set()).add(writer)
+                        writer.write(_push(b"subscribe", channel, b":%d\r\n" % len(subscribed)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args[1:] or sorted(subscribed):
+                        subscribed.discard(channel)
+                        self._leave(channel, writer)
+                        writer.write(_push(b"unsubscribe", channel, b":%d\r\n" % len(subscribed)))
+                elif name == b"PING":
+                    writer.write(b"*2\r\n" + _bulk(b"pong") + _bulk(b"") if subscribed else b"+PONG\r\n")
+                elif name == b"ECHO" and len(args) == 2:
+                    writer.write(_bulk(args[1]))
+                else:
+                    writer.write(b"-ERR unknown command or wrong number of arguments for '%s'\r\n" % args[0])
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._leave(channel, writer)
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def _leave(self, channel: bytes, writer: asyncio.StreamWriter):
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self._channels[channel]
+
+    def _publish(self, channel: bytes, payload: bytes) -> int:
+        self.published += 1
+        subscribers = self._channels.get(channel)
+        if not subscribers:
+            return 0
+        frame = _push(b"message", channel, _bulk(payload))
+        receivers = 0
+        for writer in list(subscribers):
+            if writer.transport.get_write_buffer_size() > self.max_output:
+                # Too far behind: cut it off rather than buffer without bound
+                self.dropped_subscribers += 1
+                self._leave(channel, writer)
+                writer.close()
+                continue
+            writer.write(frame)
+            receivers += 1
+        self.delivered += receivers
+        return receivers
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--unix", help="also listen on this Unix socket path")
+    parser.add_argument("--password")
+    parser.add_argument("--user", default="default", help="username accepted by AUTH <username> <password>")
+    parser.add_argument("--max-output", type=int, default=32 << 20)
+    args = parser.parse_args()
+
+    broker = RespBroker(password=args.password, max_output=args.max_output, username=args.user)
+    port = await broker.listen_tcp(args.host, args.port)
+    print(f"RESP broker on {args.host}:{port}", flush=True)
+    if args.unix:
+        await broker.listen_unix(args.unix)
+        print(f"RESP broker on unix://{args.unix}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await broker.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
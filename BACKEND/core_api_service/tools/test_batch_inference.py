@@ -0,0 +1,102 @@
+"""
+Parity test and benchmark for batched AI scoring.
+
+Usage:
+    python tools/test_batch_inference.py
+
+Scores the same random packet stream (several devices, falls, threshold
+edge values) through `process_data_with_ai` one packet at a time and
+through `process_batch` in chunks, and checks that every `ProcessedData`
+is identical. Then compares per-packet cost of the two paths.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.models.schemas import DeviceData
+from app.services import ai_processor
+from app.services.model_registry import RIGIDITY, model_registry
+
+# Values sitting exactly on the heuristic thresholds
+EMG_EDGES = (0.0, 30.0, 60.0, 100.0, 200.0)
+ACCEL_EDGES = (0.0, 0.5, 1.0, 2.0)
+
+
+def make_packet(rng: random.Random, i: int) -> DeviceData:
+    if rng.random() < 0.1:
+        wrist = arm = rng.choice(EMG_EDGES)
+        ax, ay, az = 0.0, 0.0, rng.choice(ACCEL_EDGES)
+    else:
+        scale = rng.choice((1.0, 10.0, 80.0))
+        wrist, arm = rng.uniform(0, 2) * scale, rng.uniform(0, 2) * scale
+        ax, ay, az = rng.uniform(-2, 2), rng.uniform(-2, 2), rng.uniform(-1, 2)
+    return DeviceData(
+        timestamp=f"2025-11-16T10:00:{i:06d}Z",
+        device_id=f"wrist_unit_{i % 3:03d}",
+        safety={"fall_detected": rng.random() < 0.05, "accel_x_g": ax, "accel_y_g": ay, "accel_z_g": az},
+        tremor={"frequency_hz": 5.0, "amplitude_g": rng.uniform(0, 40), "tremor_detected": rng.random() < 0.5},
+        rigidity={"emg_wrist": wrist, "emg_arm": arm, "rigid": False},
+    )
+
+
+def _key(prefix: str, packet: DeviceData) -> str:
+    return f"{prefix}:{packet.device_id}"
+
+
+async def check_parity(packets, label: str):
+    single = [await ai_processor.process_data_with_ai(p, stream_key=_key(f"single-{label}", p)) for p in packets]
+    batched = []
+    for start in range(0, len(packets), 37):
+        chunk = packets[start:start + 37]
+        batched.extend(await ai_processor.process_batch(chunk, stream_keys=[_key(f"batch-{label}", p) for p in chunk]))
+    assert len(single) == len(batched)
+    for i, (a, b) in enumerate(zip(single, batched)):
+        assert a.model_dump() == b.model_dump(), (i, a.model_dump(), b.model_dump())
+    events = sum(1 for p in single if p.critical_event)
+    print(f"PASS {label}: process_batch matches process_data_with_ai on {len(packets)} packets ({events} critical events)")
+
+
+async def bench(packets, batch_size: int):
+    chunk = packets[:batch_size]
+    keys = [_key("bench", p) for p in chunk]
+    rounds = max(1, 2000 // batch_size)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for p, key in zip(chunk, keys):
+            await ai_processor.process_data_with_ai(p, stream_key=key)
+    single = (time.perf_counter() - started) / (rounds * batch_size) * 1e6
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await ai_processor.process_batch(chunk, stream_keys=keys)
+    batched = (time.perf_counter() - started) / (rounds * batch_size) * 1e6
+    print(f"batch {batch_size:>4}: single {single:8.1f} µs/packet, batched {batched:8.1f} µs/packet ({single / batched:.1f}x)")
+
+
+async def main():
+    rng = random.Random(11)
+    packets = [make_packet(rng, i) for i in range(1000)]
+    rigidity_model = model_registry.get(RIGIDITY)
+    if rigidity_model is not None:
+        await check_parity(packets, "rigidity model")
+    # Heuristic rigidity fallback
+    model_registry.install(RIGIDITY, None)
+    try:
+        await check_parity(packets, "heuristics")
+    finally:
+        model_registry.install(RIGIDITY, rigidity_model)
+    print("rigidity model:", "loaded" if rigidity_model is not None else "not found (heuristics only)")
+    for batch_size in (1, 8, 64, 256):
+        await bench(packets, batch_size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
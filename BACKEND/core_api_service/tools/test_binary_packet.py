@@ -0,0 +1,140 @@
+"""
+Round-trip and rejection checks for the binary ingest format.
+
+Usage:
+    python tools/test_binary_packet.py [--packets 500]
+
+Checks that:
+ - packets encoded with `encode_records` decode to exactly the DeviceData
+   the JSON path (`decode_packet_list`) builds from the same packets, flags,
+   timestamps and sensor values included, and score identically,
+ - `decode_records` rejects a record with an unknown version, NaN or
+   infinite sensor values, a truncated record and a buffer that is not a
+   whole number of records,
+ - POST /ingest/binary answers those buffers with 400 and accepts the
+   well-formed one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.models.binary_packet import (
+    BINARY_CONTENT_TYPE,
+    RECORD_SIZE,
+    RECORD_VERSION,
+    decode_records,
+    encode_records,
+    records_to_device_data,
+)
+from app.models.decode import decode_packet_list
+from app.services.ai_processor import process_data_with_ai
+from _fakes import SIMULATOR_HEADERS
+
+DEVICE = "wrist_unit_001"
+HEADERS = {**SIMULATOR_HEADERS, "Content-Type": BINARY_CONTENT_TYPE, "X-Device-Id": DEVICE}
+
+
+def make_packets(rng: random.Random, count: int) -> list:
+    """JSON packets whose readings are exact in float32's shortest decimal form."""
+    def reading(low: float, high: float) -> float:
+        return round(rng.uniform(low, high), 3)
+
+    return [
+        {
+            "timestamp": f"2025-11-16T10:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000:03d}Z",
+            "device_id": DEVICE,
+            "safety": {"fall_detected": rng.random() < 0.1, "accel_x_g": reading(-2, 2), "accel_y_g": reading(-2, 2), "accel_z_g": reading(-1, 2)},
+            "tremor": {"frequency_hz": reading(0, 12), "amplitude_g": reading(0, 40), "tremor_detected": rng.random() < 0.5},
+            "rigidity": {"emg_wrist": reading(0, 500), "emg_arm": reading(0, 500), "rigid": rng.random() < 0.3},
+        }
+        for i in range(count)
+    ]
+
+
+def expect_rejected(name: str, buf: bytes, needle: str):
+    try:
+        decode_records(buf)
+    except ValueError as e:
+        assert needle in str(e), (name, str(e))
+        return str(e)
+    raise AssertionError(f"{name}: decode_records accepted the buffer")
+
+
+async def check_round_trip(count: int) -> bytes:
+    raw_packets = make_packets(random.Random(6), count)
+    from_json = decode_packet_list(json.dumps(raw_packets).encode())
+    buf = encode_records(from_json)
+    assert len(buf) == count * RECORD_SIZE, len(buf)
+
+    records = decode_records(buf)
+    assert records["seq"].tolist() == list(range(count))
+    from_binary = records_to_device_data(records, device_id=DEVICE)
+    for i, (a, b) in enumerate(zip(from_json, from_binary)):
+        assert a.model_dump() == b.model_dump(), (i, a.model_dump(), b.model_dump())
+    print(f"PASS {count} packets round-trip through {len(buf)} bytes to the same DeviceData as the JSON path")
+
+    scored_json = await asyncio.gather(*map(process_data_with_ai, from_json))
+    scored_binary = await asyncio.gather(*map(process_data_with_ai, from_binary))
+    assert [p.model_dump() for p in scored_json] == [p.model_dump() for p in scored_binary]
+    print("PASS binary and JSON packets score identically")
+    return buf
+
+
+def check_rejections(buf: bytes) -> dict:
+    wrong_version = bytearray(buf)
+    wrong_version[2 * RECORD_SIZE] = RECORD_VERSION + 1
+    records = decode_records(buf).copy()
+    records["amplitude_g"][4] = np.nan
+    with_nan = records.tobytes()
+    records["amplitude_g"][4] = 1.0
+    records["emg_arm"][7] = -np.inf
+    with_inf = records.tobytes()
+    bad = {
+        "wrong version": (bytes(wrong_version), f"unsupported record version {RECORD_VERSION + 1}"),
+        "NaN reading": (with_nan, "record 4 has a non-finite amplitude_g"),
+        "infinite reading": (with_inf, "record 7 has a non-finite emg_arm"),
+        "truncated record": (buf[:RECORD_SIZE - 4], "not a multiple"),
+        "partial trailing record": (buf[:3 * RECORD_SIZE + RECORD_SIZE // 2], "not a multiple"),
+    }
+    for name, (body, needle) in bad.items():
+        expect_rejected(name, body, needle)
+    print(f"PASS decode_records rejects: {', '.join(bad)}")
+    return {name: body for name, (body, _) in bad.items()}
+
+
+async def check_route(buf: bytes, bad: dict):
+    import httpx
+    from app.main import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        for name, body in bad.items():
+            response = await client.post("/ingest/binary", content=body, headers=HEADERS)
+            assert response.status_code == 400, (name, response.status_code, response.text)
+            assert "Invalid binary body" in response.json()["detail"], (name, response.json())
+        response = await client.post("/ingest/binary", content=buf[:10 * RECORD_SIZE], headers=HEADERS)
+        assert response.status_code == 202, response.text
+        assert response.json()["accepted"] == 10, response.json()
+    print(f"PASS /ingest/binary answers {len(bad)} malformed buffers with 400 and accepts a well-formed one")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=500)
+    args = parser.parse_args()
+
+    buf = await check_round_trip(args.packets)
+    await check_route(buf, check_rejections(buf))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
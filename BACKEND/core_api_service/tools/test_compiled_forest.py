@@ -0,0 +1,107 @@
+"""
+Parity test and latency benchmark for the compiled tree-ensemble engine.
+
+Usage:
+    python tools/test_compiled_forest.py
+
+Compiles the RandomForest in `models/rigidity_model_v0.joblib` (plus a few
+freshly trained classifiers/regressors covering multi-class, regression
+and ExtraTrees) with `app.services.compiled_forest` and checks that
+`predict`/`predict_proba` are identical to sklearn's on random rows and on
+rows placed exactly on, and one float32 step either side of, the split
+thresholds. Then times single-row and small-batch prediction.
+"""
+import os
+import sys
+import time
+import warnings
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from app.services.ai_processor import RIGIDITY_MODEL_PATH
+from app.services.compiled_forest import CompiledForest
+
+# Models are pickled with a newer sklearn and fitted on DataFrames; neither matters here
+warnings.filterwarnings("ignore")
+
+
+def edge_rows(estimator, rng, n):
+    """Rows whose features sit on split thresholds and their float32 neighbours."""
+    trees = getattr(estimator, "estimators_", None) or [estimator]
+    splits = [(f, t) for tree in trees for f, t in zip(tree.tree_.feature, tree.tree_.threshold) if f >= 0]
+    rows = rng.normal(size=(n, estimator.n_features_in_)) * 10
+    for row in rows:
+        for _ in range(3):
+            f, t = splits[rng.integers(len(splits))]
+            t32 = np.float32(t)
+            row[f] = rng.choice([t, t32, np.nextafter(t32, np.float32(-np.inf)), np.nextafter(t32, np.float32(np.inf))])
+    return rows
+
+
+def check(name, estimator, X):
+    compiled = CompiledForest(estimator)
+    expected = estimator.predict(X)
+    got = compiled.predict(X)
+    assert np.array_equal(expected, got), f"{name}: predict differs on {np.sum(expected != got)} rows"
+    if hasattr(estimator, "predict_proba"):
+        assert np.array_equal(estimator.predict_proba(X), compiled.predict_proba(X)), f"{name}: predict_proba differs"
+    for row in X[:50]:
+        assert np.array_equal(estimator.predict([row]), compiled.predict([row])), f"{name}: single-row predict differs"
+    print(f"PASS {name}: {len(X)} rows identical ({compiled.n_trees} trees, {compiled.node_count} nodes, depth {compiled.depth})")
+    return compiled
+
+
+def bench(name, estimator, compiled, X):
+    for n in (1, 8, 64, 256):
+        rows = X[:n]
+        rounds = 50 if n < 64 else 20
+        started = time.perf_counter()
+        for _ in range(rounds):
+            estimator.predict(rows)
+        sk = (time.perf_counter() - started) / rounds * 1e6
+        started = time.perf_counter()
+        for _ in range(rounds * 10):
+            compiled.predict(rows)
+        fast = (time.perf_counter() - started) / (rounds * 10) * 1e6
+        print(f"{name:<22} n={n:<4} sklearn {sk:9.1f} µs/call, compiled {fast:8.1f} µs/call ({sk / fast:6.1f}x)")
+
+
+def main():
+    rng = np.random.default_rng(5)
+    models = []
+    if os.path.exists(RIGIDITY_MODEL_PATH):
+        models.append(("rigidity_model_v0", joblib.load(RIGIDITY_MODEL_PATH)["model"]))
+
+    X_train = rng.normal(size=(600, 6))
+    y_class = (X_train[:, 0] + X_train[:, 1] * X_train[:, 2] > 0).astype(int) + (X_train[:, 3] > 1)
+    y_reg = X_train[:, 0] * 2 + np.sin(X_train[:, 1])
+    models.append(("rf_classifier_3class", RandomForestClassifier(n_estimators=50, max_depth=12, random_state=0).fit(X_train, y_class)))
+    models.append(("rf_regressor", RandomForestRegressor(n_estimators=50, random_state=0).fit(X_train, y_reg)))
+    models.append(("extra_trees", ExtraTreesClassifier(n_estimators=30, random_state=0).fit(X_train, y_class)))
+    models.append(("decision_tree_regressor", DecisionTreeRegressor(random_state=0).fit(X_train, y_reg)))
+
+    compiled = {}
+    for name, estimator in models:
+        X = np.vstack([rng.normal(size=(2000, estimator.n_features_in_)) * 10, edge_rows(estimator, rng, 2000)])
+        compiled[name] = check(name, estimator, X)
+
+    try:
+        compiled[models[0][0]].predict([[float("nan")] * models[0][1].n_features_in_])
+        raise AssertionError("NaN input was accepted")
+    except ValueError:
+        print("PASS non-finite input rejected like sklearn")
+
+    for name, estimator in models[:2]:
+        bench(name, estimator, compiled[name], rng.normal(size=(256, estimator.n_features_in_)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Checks duplicate suppression on the ingest path.
+
+Usage:
+    python tools/test_dedup.py
+
+Covers `app.services.dedup.DedupWindow` on a fake clock, then the ingest
+routes in-process:
+ - a remembered key is reported as a duplicate until `window` seconds have
+   passed, and the window never holds more than `max_entries` keys,
+ - a claim on a key already in flight waits for the first request and then
+   sees its outcome: the remembered value, or the key free again when the
+   first request released its claim,
+ - requests claiming overlapping key sets in opposite orders do not
+   deadlock,
+ - concurrent copies of one packet and of one batch are accepted once, and
+   a packet whose first attempt was rejected (429) is accepted on retry.
+"""
+import asyncio
+import os
+import sys
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app.services.dedup as dedup_module
+from app.services.dedup import DedupWindow
+from _fakes import SIMULATOR_HEADERS, FakeClock, make_packet, patched
+
+DEVICE = "wrist_unit_007"
+
+async def test_window(clock: FakeClock):
+    window = DedupWindow(window=60, max_entries=1000)
+    window.remember("k", {"id": "1"})
+    clock.now += 59
+    assert window.lookup("k") == {"id": "1"}
+    claim = await window.claim(["k", "new"])
+    assert claim.prior == {"k": {"id": "1"}}, claim.prior
+    window.release(claim)
+    clock.now += 2
+    assert window.lookup("k") is None and window.stats()["entries"] == 0, window.stats()
+
+    capped = DedupWindow(window=60, max_entries=100)
+    for i in range(250):
+        capped.remember(i, {"id": str(i)})
+    assert capped.stats()["entries"] == 100, capped.stats()
+    assert capped.lookup(149) is None and capped.lookup(150) == {"id": "150"}
+    print("PASS keys are duplicates for `window` seconds only, and the oldest go first beyond max_entries")
+
+
+async def test_in_flight():
+    window = DedupWindow(window=60)
+    first = await window.claim(["k"])
+    assert first.prior == {} and window.stats()["in_flight"] == 1
+    second = asyncio.create_task(window.claim(["k"]))
+    await asyncio.sleep(0.01)
+    assert not second.done(), "a claim on an in-flight key did not wait"
+    window.remember("k", {"id": "1"})
+    assert (await second).prior == {"k": {"id": "1"}}
+    window.release(first)
+
+    failed = await window.claim(["f"])
+    retry = asyncio.create_task(window.claim(["f"]))
+    await asyncio.sleep(0.01)
+    assert not retry.done()
+    window.release(failed)
+    claim = await retry
+    assert claim.prior == {} and window.stats()["in_flight"] == 1, window.stats()
+    window.release(claim)
+    assert window.stats()["in_flight"] == 0, window.stats()
+    print("PASS a claim on an in-flight key waits for the first request: remembered it is a duplicate, released it is free")
+
+
+async def test_overlapping_claims():
+    window = DedupWindow(window=60)
+    keys = [f"k{i}" for i in range(20)]
+
+    async def request(order, accept: bool):
+        claim = await window.claim(order)
+        try:
+            await asyncio.sleep(0)
+            if accept:
+                for key in order:
+                    if key not in claim.prior:
+                        window.remember(key, {"id": key})
+            return len(order) - len(claim.prior)
+        finally:
+            window.release(claim)
+
+    requests = [request(keys if i % 2 else keys[::-1], accept=i % 3 != 0) for i in range(30)]
+    fresh = await asyncio.wait_for(asyncio.gather(*requests), timeout=5)
+    assert sum(n for i, n in enumerate(fresh) if i % 3 != 0) == len(keys), fresh
+    assert window.stats()["in_flight"] == 0, window.stats()
+    print(f"PASS {len(requests)} requests claiming overlapping keys in opposite orders finish; each key accepted once")
+
+
+async def test_routes():
+    import httpx
+    from app.main import app
+    from app.services.processing_queue import processing_queue
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        submitted = processing_queue.stats()["submitted"]
+        responses = await asyncio.gather(*(client.post("/ingest/data", json=make_packet(DEVICE), headers=SIMULATOR_HEADERS) for _ in range(5)))
+        statuses = sorted(r.json()["status"] for r in responses)
+        assert statuses == ["accepted"] + ["duplicate"] * 4, statuses
+        assert len({r.json()["id"] for r in responses}) == 1
+        assert processing_queue.stats()["submitted"] == submitted + 1, processing_queue.stats()
+
+        batch = [make_packet(DEVICE, f"2025-11-16T10:00:0{i}Z") for i in range(1, 4)]
+        responses = await asyncio.gather(*(client.post("/ingest/batch", json=order, headers=SIMULATOR_HEADERS) for order in (batch, batch[::-1]) * 3))
+        assert sum(r.json()["accepted"] for r in responses) == len(batch), [r.json() for r in responses]
+
+        packet = make_packet(DEVICE, "2025-11-16T10:00:09Z")
+        room = processing_queue.max_pending - processing_queue.stats()["depth"]
+        gate = asyncio.Event()
+        processing_queue.submit("hold", gate.wait, weight=room)
+        try:
+            rejected = await client.post("/ingest/data", json=packet, headers=SIMULATOR_HEADERS)
+        finally:
+            gate.set()
+        await asyncio.sleep(0.05)
+        retried = await client.post("/ingest/data", json=packet, headers=SIMULATOR_HEADERS)
+        assert rejected.status_code == 429 and retried.json()["status"] == "accepted", (rejected.status_code, retried.json())
+    print("PASS concurrent copies of a packet or batch are accepted once; a retry after a 429 is accepted")
+
+
+async def main():
+    with patched(dedup_module, "time", FakeClock()) as clock:
+        await test_window(clock)
+    await test_in_flight()
+    await test_overlapping_claims()
+    await test_routes()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Test harness for the per-device rolling feature windows.
+
+Usage:
+    python tools/test_device_windows.py
+
+Feeds a random packet stream through `app.services.device_windows` and
+checks every incremental feature against a brute-force recomputation over
+the same window, then times `DeviceWindowStore.update` and shows the
+rigidity model seeing non-zero windowed features.
+"""
+import math
+import os
+import random
+import sys
+import timeit
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from app.models.schemas import DeviceData
+from app.services.device_windows import BURST_FACTOR, WINDOW_FEATURES, DeviceWindowStore
+
+
+def make_packet(rng: random.Random) -> DeviceData:
+    burst = rng.random() < 0.15
+    return DeviceData(
+        timestamp="2025-11-16T10:00:00Z",
+        device_id="wrist_unit_001",
+        safety={"fall_detected": False, "accel_x_g": rng.uniform(-1, 1), "accel_y_g": rng.uniform(-1, 1), "accel_z_g": 0.98},
+        tremor={"frequency_hz": 5.0, "amplitude_g": 0.1, "tremor_detected": False},
+        rigidity={"emg_wrist": rng.uniform(0, 4) * (4 if burst else 1), "emg_arm": rng.uniform(0, 4) * (4 if burst else 1), "rigid": False},
+    )
+
+
+def brute_force(history, size):
+    """Recompute the window features from scratch over the last `size` packets."""
+    window = history[-size:]
+    wrist = np.array([p.rigidity.emg_wrist for p in window])
+    arm = np.array([p.rigidity.emg_arm for p in window])
+    mag = np.array([math.hypot(p.safety.accel_x_g, p.safety.accel_y_g) for p in window])
+    wrist_rms = float(np.sqrt(np.mean(wrist ** 2)))
+    arm_rms = float(np.sqrt(np.mean(arm ** 2)))
+    return {
+        "emg_wrist_rms": wrist_rms,
+        "emg_arm_rms": arm_rms,
+        "emg_ratio": wrist_rms / max(0.0001, arm_rms),
+        "accel_mag_mean": float(mag.mean()),
+        "accel_mag_std": float(mag.std()),
+    }
+
+
+def brute_force_onsets(history, size):
+    """Replay burst detection over the whole stream; count onsets in the last window."""
+    onsets = []
+    envelopes = []
+    active = False
+    for p in history:
+        envelope = (abs(p.rigidity.emg_wrist) + abs(p.rigidity.emg_arm)) / 2.0
+        recent = envelopes[-size:]
+        now = bool(recent) and envelope > BURST_FACTOR * (sum(recent) / len(recent))
+        onsets.append(1 if now and not active else 0)
+        active = now
+        envelopes.append(envelope)
+    return sum(onsets[-size:])
+
+
+def main():
+    size = 16
+    rng = random.Random(7)
+    store = DeviceWindowStore(size=size, max_devices=4)
+    history = []
+    for i in range(500):
+        packet = make_packet(rng)
+        history.append(packet)
+        features = store.update("u1:wrist_unit_001", packet)
+        expected = brute_force(history, size)
+        for name, value in expected.items():
+            assert math.isclose(features[name], value, rel_tol=1e-9, abs_tol=1e-9), (i, name, features[name], value)
+        assert features["emg_burst_count"] == brute_force_onsets(history, size), (i, features)
+    assert set(features) == set(WINDOW_FEATURES)
+    print(f"PASS incremental features match brute force over 500 packets (window {size})")
+    print("last window:", {k: round(v, 4) for k, v in features.items()})
+
+    for n in range(6):
+        store.update(f"u{n}:dev", history[n])
+    assert store.stats()["devices"] == 4 and store.stats()["evicted"] >= 2, store.stats()
+    print("PASS least recently updated device windows evicted:", store.stats())
+
+    packet = history[-1]
+    bench_store = DeviceWindowStore(size=32)
+    n = 50000
+    per_update = timeit.timeit(lambda: bench_store.update("u1:dev", packet), number=n) / n * 1e6
+    print(f"update: {per_update:.2f} µs/packet (window 32)")
+
+    from app.services import ai_processor
+    from app.services.feature_registry import signal_row
+    from app.services.model_registry import RIGIDITY, model_registry
+    rigidity_model = model_registry.get(RIGIDITY)
+    if isinstance(rigidity_model, dict):
+        signals = signal_row(packet, features)
+        plan = ai_processor._feature_plan(rigidity_model)
+        print("rigidity model input:", {f: round(float(v), 4) for f, v in zip(plan.features, plan.fill(signals))})
+        print("rigidity score:", ai_processor._process_rigidity(packet.rigidity, signals))
+
+
+if __name__ == "__main__":
+    main()
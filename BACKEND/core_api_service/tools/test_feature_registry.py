@@ -0,0 +1,108 @@
+"""
+Test harness for the model feature registry and compiled feature plans.
+
+Usage:
+    python tools/test_feature_registry.py
+
+Checks that `FeaturePlan.fill`/`matrix` produce exactly the vectors the
+per-packet name lookups used to build (rigidity/PADS window features,
+sEMG raw channels, and the single-sample mapping of
+tools/verify_hardware_packet.py), that unknown features are reported, and
+times plan filling against the old lookups.
+"""
+import os
+import random
+import sys
+import timeit
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from app.models.schemas import DeviceData
+from app.services.device_windows import WINDOW_FEATURES, DeviceWindowStore
+from app.services.feature_registry import ROW_SIZE, FeaturePlan, signal_row
+
+AXES = ["acc_x", "acc_y", "acc_z", "gyr_x", "gyr_y", "gyr_z"]
+PADS_FEATURES = [f"{a}_{s}" for a in AXES for s in ("mean", "std", "rms", "domfreq")] + [
+    f"emg_ch{c}_{s}" for c in (1, 2) for s in ("rms", "mean", "std")
+]
+
+
+def make_packet(rng: random.Random) -> DeviceData:
+    return DeviceData(
+        timestamp="2025-11-16T10:00:00Z",
+        device_id="wrist_unit_001",
+        safety={"fall_detected": False, "accel_x_g": rng.uniform(-2, 2), "accel_y_g": rng.uniform(-2, 2), "accel_z_g": rng.uniform(-2, 2)},
+        tremor={"frequency_hz": rng.uniform(0, 12), "amplitude_g": rng.uniform(0, 30), "tremor_detected": True},
+        rigidity={"emg_wrist": rng.uniform(-50, 50), "emg_arm": rng.uniform(-50, 50), "rigid": False},
+    )
+
+
+def legacy_tool_mapping(packet: dict, expected_features):
+    """The single-sample mapping verify_hardware_packet.py used before the registry."""
+    safety, rig = packet.get("safety", {}), packet.get("rigidity", {})
+    values = {"acc_x": safety.get("accel_x_g"), "acc_y": safety.get("accel_y_g"), "acc_z": safety.get("accel_z_g")}
+    feats = {}
+    for name in AXES:
+        v = values.get(name)
+        feats[f"{name}_mean"] = float(v) if v is not None else 0.0
+        feats[f"{name}_std"] = 0.0
+        feats[f"{name}_rms"] = abs(float(v)) if v is not None else 0.0
+        feats[f"{name}_domfreq"] = 0.0
+    wrist, arm = rig.get("emg_wrist"), rig.get("emg_arm")
+    feats["emg_ch1_rms"] = abs(float(wrist)) if wrist is not None else 0.0
+    feats["emg_ch1_mean"] = float(wrist) if wrist is not None else 0.0
+    feats["emg_ch1_std"] = 0.0
+    feats["emg_ch2_rms"] = abs(float(arm)) if arm is not None else 0.0
+    feats["emg_ch2_mean"] = float(arm) if arm is not None else 0.0
+    feats["emg_ch2_std"] = 0.0
+    return [float(feats.get(f, 0.0)) for f in expected_features]
+
+
+def main():
+    rng = random.Random(3)
+    store = DeviceWindowStore(size=16)
+    window_plan = FeaturePlan(list(WINDOW_FEATURES) + ["not_a_feature"])
+    semg_plan = FeaturePlan(["emg_wrist", "emg_arm", "emg_ch3"])
+    pads_plan = FeaturePlan(PADS_FEATURES)
+
+    packets = [make_packet(rng) for _ in range(500)]
+    rows = np.empty((len(packets), ROW_SIZE))
+    for i, packet in enumerate(packets):
+        features = store.update("u1:wrist_unit_001", packet)
+        signal_row(packet, features, out=rows[i])
+        legacy = [float(features.get(f, 0.0)) for f in window_plan.features]
+        assert window_plan.fill(rows[i]).tolist() == legacy, (i, legacy)
+        assert semg_plan.fill(rows[i]).tolist() == [packet.rigidity.emg_wrist, packet.rigidity.emg_arm, 0.0]
+        raw = packet.model_dump()
+        assert pads_plan.fill(signal_row(raw)).tolist() == legacy_tool_mapping(raw, PADS_FEATURES), i
+    assert np.array_equal(window_plan.matrix(rows), np.vstack([window_plan.fill(r) for r in rows]))
+    assert np.array_equal(pads_plan.matrix(rows[:, :]), np.vstack([pads_plan.fill(r) for r in rows]))
+    print(f"PASS plans reproduce the window, sEMG and verification-tool mappings on {len(packets)} packets")
+
+    assert window_plan.unmapped == ("not_a_feature",)
+    assert semg_plan.unmapped == ("emg_ch3",)
+    unmapped = set(pads_plan.unmapped)
+    assert unmapped == {f for f in PADS_FEATURES if f.endswith(("_std", "_domfreq")) or f.startswith("gyr")}, unmapped
+    print(f"PASS unmapped features reported ({len(unmapped)} of {len(PADS_FEATURES)} PADS features have no single-packet source)")
+
+    incomplete = {"rigidity": {"emg_wrist": 3.0}}
+    assert pads_plan.fill(signal_row(incomplete))[PADS_FEATURES.index("emg_ch1_rms")] == 3.0
+    print("PASS incomplete packet dicts read missing channels as 0")
+
+    features = store.update("u1:wrist_unit_001", packets[-1])
+    row = signal_row(packets[-1], features)
+    out = np.empty(len(window_plan))
+    n = 50000
+    legacy = timeit.timeit(lambda: [float(features.get(f, 0.0)) for f in window_plan.features], number=n) / n * 1e6
+    plan = timeit.timeit(lambda: window_plan.fill(row, out=out), number=n) / n * 1e6
+    build = timeit.timeit(lambda: signal_row(packets[-1], features, out=row), number=n) / n * 1e6
+    print(f"per model: name lookups {legacy:.2f} µs, plan.fill {plan:.2f} µs (signal row, once per packet: {build:.2f} µs)")
+
+
+if __name__ == "__main__":
+    main()
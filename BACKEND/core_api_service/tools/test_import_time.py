@@ -0,0 +1,93 @@
+"""
+Import-time budget check for the API process.
+
+Usage:
+    python tools/test_import_time.py [--budget-ms 400] [--runs 3]
+
+Imports `app.main` in fresh interpreters (what uvicorn, tests and the
+tools do) and checks that:
+ - no model artifact is read and google.cloud.firestore, firebase_admin,
+   joblib and sklearn are not imported; they belong to the startup warm-up,
+ - the import, on top of the FastAPI/pydantic/NumPy baseline every worker
+   pays anyway, stays within `--budget-ms` (best of `--runs`),
+ - after startup, /ready answers 503 until the warm-up has run and 200
+   afterwards.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFERRED_MODULES = ("google.cloud.firestore", "firebase_admin", "joblib", "sklearn")
+
+PROBE = """
+import json, sys, time
+import warnings
+warnings.simplefilter("ignore")
+started = time.perf_counter()
+import fastapi, pydantic, numpy
+baseline = time.perf_counter() - started
+started = time.perf_counter()
+import app.main
+from app.services.model_registry import model_registry
+app_import = time.perf_counter() - started
+print(json.dumps({
+    "baseline_ms": baseline * 1000.0,
+    "app_ms": app_import * 1000.0,
+    "loaded": model_registry.loaded,
+    "imported": [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def measure() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def check_readiness():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.warmup import startup_warmup
+
+    with TestClient(app) as client:
+        first = client.get("/ready")
+        deadline = time.monotonic() + 60
+        while not startup_warmup.ready and time.monotonic() < deadline:
+            time.sleep(0.05)
+        after = client.get("/ready")
+    assert after.status_code == 200, after.json()
+    steps = after.json()["steps"]
+    print(f"PASS /ready {first.status_code} at startup, 200 after warm-up ({after.json()['elapsed_s']}s):",
+          {name: step["seconds"] for name, step in steps.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(max(1, args.runs))]
+    best = min(results, key=lambda r: r["app_ms"])
+    assert not any(r["loaded"] for r in results), "importing app.main loaded the models"
+    imported = sorted({m for r in results for m in r["imported"]})
+    assert not imported, f"importing app.main pulled in {imported}"
+    print(f"PASS no models loaded and none of {', '.join(DEFERRED_MODULES)} imported")
+
+    print(f"baseline (fastapi, pydantic, numpy) {best['baseline_ms']:.0f} ms, app.main on top {best['app_ms']:.0f} ms")
+    assert best["app_ms"] <= args.budget_ms, f"app.main import took {best['app_ms']:.0f} ms, budget {args.budget_ms:.0f} ms"
+    print(f"PASS import within the {args.budget_ms:.0f} ms budget")
+
+    check_readiness()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Test harness and benchmark for the inference micro-batching scheduler.
+
+Usage:
+    python tools/test_inference_scheduler.py [--users 32] [--packets 100]
+
+Checks that:
+ - concurrent `process_data_with_ai` calls are merged into batches and
+   return exactly what unbatched scoring returns, packet for packet,
+ - a lone sequential client is never held back (every call takes the
+   immediate path),
+ - a failing batch raises in every caller that joined it.
+Then compares throughput and per-call latency with batching on and off
+for `--users` concurrent device streams on the thread executor.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from app.models.schemas import DeviceData
+from app.services import ai_processor
+from app.services.inference_executor import THREAD, inference_executor
+from app.services.inference_scheduler import InferenceScheduler
+
+scheduler = ai_processor.inference_scheduler
+
+
+def make_packet(rng: random.Random, i: int) -> DeviceData:
+    scale = rng.choice((1.0, 10.0, 80.0))
+    return DeviceData(
+        timestamp=f"2025-11-16T10:00:{i:06d}Z",
+        device_id="wrist_unit_001",
+        safety={"fall_detected": rng.random() < 0.03, "accel_x_g": rng.uniform(-2, 2), "accel_y_g": rng.uniform(-2, 2), "accel_z_g": rng.uniform(-1, 2)},
+        tremor={"frequency_hz": 5.0, "amplitude_g": rng.uniform(0, 40), "tremor_detected": rng.random() < 0.5},
+        rigidity={"emg_wrist": rng.uniform(0, 2) * scale, "emg_arm": rng.uniform(0, 2) * scale, "rigid": False},
+    )
+
+
+async def stream(prefix: str, uid: int, packets, latencies: list):
+    out = []
+    for packet in packets:
+        started = time.perf_counter()
+        out.append(await ai_processor.process_data_with_ai(packet, stream_key=f"{prefix}:{uid}"))
+        latencies.append(time.perf_counter() - started)
+    return [p.model_dump() for p in out]
+
+
+def _reset_counters():
+    scheduler.submitted = scheduler.immediate = scheduler.batches = scheduler.batched_items = 0
+    scheduler._size_samples.clear()
+    scheduler._wait_samples.clear()
+
+
+async def run_streams(prefix: str, streams, batching: bool):
+    scheduler.enabled = batching
+    _reset_counters()
+    latencies = []
+    started = time.perf_counter()
+    results = await asyncio.gather(*(stream(prefix, uid, packets, latencies) for uid, packets in enumerate(streams)))
+    elapsed = time.perf_counter() - started
+    return results, latencies, elapsed, scheduler.stats()
+
+
+def _ms(samples, q):
+    ordered = sorted(samples)
+    return ordered[int(q * (len(ordered) - 1))] * 1000.0
+
+
+async def check_failures():
+    def boom_one(item, row):
+        raise RuntimeError(f"one {item}")
+
+    def boom_batch(items, rows):
+        raise RuntimeError(f"batch of {len(items)}")
+
+    failing = InferenceScheduler(inference_executor, boom_one, boom_batch, max_batch=8, max_wait=0.01)
+    results = await asyncio.gather(*(failing.submit(i, np.zeros(3)) for i in range(20)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results), results
+    assert failing.stats()["inflight_batches"] == 0 and failing.stats()["pending"] == 0
+    print(f"PASS failures reach every caller: {sorted({str(r) for r in results})}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--packets", type=int, default=100)
+    args = parser.parse_args()
+
+    await inference_executor.reconfigure(THREAD, 2)
+    rng = random.Random(19)
+    streams = [[make_packet(rng, i) for i in range(args.packets)] for _ in range(args.users)]
+
+    batched, b_lat, b_elapsed, b_stats = await run_streams("batched", streams, batching=True)
+    direct, d_lat, d_elapsed, d_stats = await run_streams("direct", streams, batching=False)
+    assert batched == direct, "batched results differ from unbatched scoring"
+    assert b_stats["batches"] < b_stats["submitted"] and b_stats["mean_batch_size"] > 1, b_stats
+    print(f"PASS {b_stats['submitted']} concurrent calls scored in {b_stats['batches']} model calls "
+          f"(mean batch {b_stats['mean_batch_size']}, max {b_stats['max_recent_batch_size']}), identical to unbatched")
+
+    n = args.users * args.packets
+    for label, lat, elapsed in (("unbatched", d_lat, d_elapsed), ("batched", b_lat, b_elapsed)):
+        print(f"{label:<10} {n / elapsed:8.0f} packets/s | call latency p50 {_ms(lat, 0.5):6.2f} ms p99 {_ms(lat, 0.99):6.2f} ms")
+    print(f"batch wait p95 {b_stats['batch_wait']['p95_ms']} ms, adaptive window {b_stats['window_ms']} ms "
+          f"(max {b_stats['max_wait_ms']} ms), arrival gap {b_stats['arrival_gap_ms']} ms")
+
+    _, lone_batched, _, lone_stats = await run_streams("lone-b", streams[:1], batching=True)
+    _, lone_direct, _, _ = await run_streams("lone-d", streams[:1], batching=False)
+    assert lone_stats["immediate"] == lone_stats["submitted"], lone_stats
+    print(f"PASS lone client always takes the immediate path: p50 {_ms(lone_batched, 0.5):.3f} ms "
+          f"vs {_ms(lone_direct, 0.5):.3f} ms unbatched")
+
+    await check_failures()
+    await inference_executor.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
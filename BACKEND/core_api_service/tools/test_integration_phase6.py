@@ -235,6 +235,55 @@ async def test_rag_alert_system():
     
     print()
 
+async def test_batch_ingestion():
+    """Test multi-packet batch ingestion (JSON array and NDJSON)"""
+    print("📦 TEST 6: Batch Sensor Ingestion")
+    print("-" * 80)
+    
+    packets = []
+    for i in range(200):
+        packets.append({
+            "timestamp": datetime.utcnow().isoformat(),
+            "device_id": "integration_test_device",
+            "safety": {"fall_detected": False, "accel_x_g": 0.02 * i, "accel_y_g": 0.05, "accel_z_g": 0.98},
+            "tremor": {"frequency_hz": 4.5, "amplitude_g": 0.12, "tremor_detected": i % 2 == 0},
+            "rigidity": {"emg_wrist": 40.0 + i, "emg_arm": 35.0, "rigid": False}
+        })
+    
+    try:
+        import time
+        async with httpx.AsyncClient() as client:
+            start_time = time.time()
+            response = await client.post(
+                f"{FASTAPI_URL}/ingest/batch",
+                json=packets,
+                headers={"Authorization": f"Bearer {AUTH_TOKEN}"}
+            )
+            elapsed = time.time() - start_time
+            
+            if response.status_code == 202:
+                result = response.json()
+                print(f"✅ JSON array batch accepted: {result.get('accepted')} packets in {elapsed:.3f}s")
+                print(f"   Rejected: {len(result.get('rejected', []))}")
+            else:
+                print(f"❌ Failed: {response.status_code} - {response.text}")
+            
+            ndjson = "\n".join(json.dumps(p) for p in packets[:50])
+            response = await client.post(
+                f"{FASTAPI_URL}/ingest/batch",
+                content=ndjson,
+                headers={"Authorization": f"Bearer {AUTH_TOKEN}", "Content-Type": "application/x-ndjson"}
+            )
+            
+            if response.status_code == 202:
+                print(f"✅ NDJSON batch accepted: {response.json().get('accepted')} packets")
+            else:
+                print(f"❌ Failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    
+    print()
+
 async def main():
     print("Starting comprehensive integration tests...\n")
     
@@ -244,6 +293,7 @@ async def main():
     await test_analytics_endpoints()
     await test_sensor_ingestion()
     await test_rag_alert_system()
+    await test_batch_ingestion()
     
     print("=" * 80)
     print("INTEGRATION TEST SUMMARY")
@@ -0,0 +1,125 @@
+"""
+Delivery, sampling and rate-limit checks for the queued JSON event log.
+
+Usage:
+    python tools/test_logging.py [--events 20000]
+
+`app.logging_setup` installs the root handler, so each case runs in a child
+process with LOG_FORMAT=json and parses what it wrote to stderr. Checks
+that:
+ - every event queued before `shutdown_logging` is written out, in order,
+   even when the process exits straight after a burst,
+ - records logged after shutdown are written synchronously,
+ - event fields are rendered on the listener thread, never on the caller's,
+   and not at all when the level is disabled,
+ - debug events are sampled 1-in-LOG_DEBUG_SAMPLE_EVERY and rate limited,
+ - `warning_limited` collapses repeats into one line with ``suppressed=N``.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_BURST = """
+import logging, sys, threading
+sys.path.insert(0, sys.argv[1])
+from app.logging_setup import configure_logging, get_event_logger, shutdown_logging
+
+configure_logging()
+events = get_event_logger("burst")
+caller = threading.get_ident()
+rendered_on = set()
+
+class Probe:
+    def __str__(self):
+        rendered_on.add(threading.get_ident())
+        return "probe"
+
+never = Probe()
+for i in range(int(sys.argv[2])):
+    events.info("burst.event", seq=i, probe=Probe())
+    events.debug("burst.hidden", probe=never)
+shutdown_logging()
+logging.getLogger("burst").warning("after shutdown")
+print("caller_rendered=%s listener_rendered=%s" % (caller in rendered_on, bool(rendered_on - {caller})))
+"""
+
+_LIMITS = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+from app.logging_setup import configure_logging, get_event_logger, shutdown_logging
+
+configure_logging()
+events = get_event_logger("limits")
+for i in range(1000):
+    events.debug("limits.sampled", seq=i)
+for i in range(50):
+    events.warning_limited("limits.repeated", interval=0.2, seq=i)
+time.sleep(0.25)
+events.warning_limited("limits.repeated", interval=0.2, seq=50)
+shutdown_logging()
+"""
+
+
+def run(script: str, *args: str, **env: str) -> subprocess.CompletedProcess:
+    environ = {**os.environ, "LOG_FORMAT": "json", **env}
+    return subprocess.run([sys.executable, "-c", script, ROOT, *args], capture_output=True, text=True, check=True, env=environ)
+
+
+def records(stderr: str, logger: str) -> list:
+    out = []
+    for line in stderr.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("logger") == logger:
+            out.append(record)
+    return out
+
+
+def test_flush_on_shutdown(count: int):
+    result = run(_BURST, str(count), LOG_LEVEL="INFO")
+    logged = records(result.stderr, "burst")
+    events = [r for r in logged if r.get("event") == "burst.event"]
+    assert [r["seq"] for r in events] == list(range(count)), (len(events), count)
+    assert all(r["probe"] == "probe" for r in events)
+    assert not any(r.get("event") == "burst.hidden" for r in logged)
+    assert logged[-1].get("message") == "after shutdown", logged[-1]
+    print(f"PASS all {count} events queued before shutdown_logging were written, in order; later records still logged")
+    assert "caller_rendered=False listener_rendered=True" in result.stdout, result.stdout
+    print("PASS fields rendered on the listener thread only, and not at all for a disabled level")
+
+
+def test_sampling_and_limits():
+    result = run(_LIMITS, LOG_LEVEL="DEBUG", LOG_DEBUG_SAMPLE_EVERY="10", LOG_DEBUG_RATE_PER_SEC="1000")
+    logged = records(result.stderr, "limits")
+    sampled = [r["seq"] for r in logged if r.get("event") == "limits.sampled"]
+    assert sampled == list(range(9, 1000, 10)), sampled[:12]
+    repeated = [r for r in logged if r.get("event") == "limits.repeated"]
+    assert [r["seq"] for r in repeated] == [0, 50] and repeated[1]["suppressed"] == 49, repeated
+    print(f"PASS debug sampled 1-in-10 ({len(sampled)} of 1000), warning_limited collapsed 49 repeats into suppressed=49")
+
+    result = run(_LIMITS, LOG_LEVEL="DEBUG", LOG_DEBUG_SAMPLE_EVERY="1", LOG_DEBUG_RATE_PER_SEC="5")
+    sampled = [r for r in records(result.stderr, "limits") if r.get("event") == "limits.sampled"]
+    assert 1 <= len(sampled) <= 10, len(sampled)
+    print(f"PASS debug rate limit: {len(sampled)} of 1000 events at 5/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    test_flush_on_shutdown(args.events)
+    test_sampling_and_limits()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Checks the stage latency histograms and the Prometheus /metrics endpoint.
+
+Usage:
+    python tools/test_metrics.py
+
+Checks that:
+ - histogram buckets are cumulative, end in ``le="+Inf"`` equal to
+   ``_count``, and bucket-interpolated quantiles are within one bucket of
+   the exact percentiles,
+ - `stage()` times a block into its stage's histogram and counts the
+   stages that raise,
+ - label values are escaped, so the exposition stays parseable,
+ - after ingesting a packet, GET /metrics serves the decode / persist /
+   queue / AI / broadcast stages, the packet counters and per-route request
+   counts labelled by route template (not the raw path), in Prometheus text
+   format.
+"""
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.metrics import LATENCY_BUCKETS, STAGE_ERRORS, STAGE_SECONDS, Counter, Histogram, Registry, stage
+from _fakes import SIMULATOR_HEADERS, make_packet
+
+# name{labels} value, as Prometheus parses a sample line
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*",?)*\})? (\S+)$')
+
+
+def parse(text: str) -> dict:
+    """Sample lines of an exposition as {(name, labels): value}; fails on a malformed line."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("# HELP ") or line.startswith("# TYPE "):
+            continue
+        match = _SAMPLE.match(line)
+        assert match, f"malformed exposition line: {line!r}"
+        name, labels, value = match.groups()
+        samples[(name, labels or "")] = float(value)
+    return samples
+
+
+def bucket_index(value: float) -> int:
+    return next((i for i, upper in enumerate(LATENCY_BUCKETS) if value <= upper), len(LATENCY_BUCKETS))
+
+
+def test_histogram():
+    rng = random.Random(12)
+    values = [rng.lognormvariate(-5, 1.5) for _ in range(20000)]
+    histogram = Histogram("test_latency_seconds", "Test.", ["stage"])
+    child = histogram.labels("x")
+    for value in values:
+        child.observe(value)
+    registry = Registry()
+    registry.register(histogram)
+    samples = parse(registry.render())
+
+    buckets = [v for (name, _), v in samples.items() if name == "test_latency_seconds_bucket"]
+    assert buckets == sorted(buckets), "bucket counts are not cumulative"
+    assert samples[("test_latency_seconds_bucket", '{stage="x",le="+Inf"}')] == len(values)
+    assert samples[("test_latency_seconds_count", '{stage="x"}')] == len(values)
+    assert abs(samples[("test_latency_seconds_sum", '{stage="x"}')] - sum(values)) < 1e-6
+
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        estimate = child.quantile(q)
+        assert abs(bucket_index(estimate) - bucket_index(exact)) <= 1, (q, exact, estimate)
+    summary = child.summary()
+    print(f"PASS histogram buckets cumulative, +Inf == count, quantiles within a bucket: {summary}")
+
+
+def test_stage():
+    before = STAGE_SECONDS.labels("test_stage")._count
+    with stage("test_stage"):
+        time.sleep(0.01)
+    try:
+        with stage("test_stage"):
+            raise KeyError("boom")
+    except KeyError:
+        pass
+    child = STAGE_SECONDS.labels("test_stage")
+    assert child._count == before + 2 and child._sum >= 0.01, (child._count, child._sum)
+    assert STAGE_ERRORS.labels("test_stage").value == 1
+    print("PASS stage() times blocks into its histogram and counts the ones that raise")
+
+
+def test_escaping():
+    counter = Counter("test_requests_total", "Test.", ["route"])
+    counter.labels('/a "quoted"\\path\nnext').inc(3)
+    registry = Registry()
+    registry.register(counter)
+    samples = parse(registry.render())
+    assert samples == {("test_requests_total", '{route="/a \\"quoted\\"\\\\path\\nnext"}'): 3.0}, samples
+    print("PASS label values are escaped")
+
+
+async def test_endpoint():
+    import httpx
+    from app.main import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        ingest = await client.post("/ingest/data", json=make_packet("wrist_unit_012"), headers=SIMULATOR_HEADERS)
+        assert ingest.status_code == 202, ingest.text
+        await client.get("/ingest/stats/some_user", headers=SIMULATOR_HEADERS)
+        for _ in range(100):
+            response = await client.get("/metrics")
+            samples = parse(response.text)
+            if samples.get(("stancesense_stage_duration_seconds_count", '{stage="broadcast"}')):
+                break
+            await asyncio.sleep(0.05)
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4"), response.headers
+    for name in ("decode", "raw_persist", "queue_wait", "ai_process", "broadcast"):
+        key = ("stancesense_stage_duration_seconds_count", f'{{stage="{name}"}}')
+        assert samples.get(key, 0) >= 1, (name, sorted(labels for n, labels in samples if n == key[0]))
+    assert samples[("stancesense_ingest_packets_total", '{endpoint="data",result="accepted"}')] >= 1
+    routes = {labels for name, labels in samples if name == "stancesense_http_requests_total"}
+    assert '{method="POST",route="/ingest/data",status="202"}' in routes, routes
+    assert any('route="/ingest/stats/{user_id}"' in labels for labels in routes), routes
+    assert not any("some_user" in labels for labels in routes), routes
+    print(f"PASS /metrics serves stage histograms, packet counters and {len(routes)} route-template request series")
+
+
+def main():
+    test_histogram()
+    test_stage()
+    test_escaping()
+    asyncio.run(test_endpoint())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Test harness for the hot-reloading model registry.
+
+Usage:
+    python tools/test_model_registry.py
+
+Runs `app.services.model_registry.ModelRegistry` over a temporary model
+directory and checks that:
+ - artifacts are compiled, cached once and served memory-mapped,
+ - a second registry (another worker process) maps the cached file
+   instead of compiling again,
+ - a new artifact version is picked up while predictions keep running,
+   and requests holding the old version finish with it,
+ - corrupt or inconsistent artifacts are rejected and the served
+   version is kept.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from app.services.device_windows import WINDOW_FEATURES
+from app.services.model_registry import ModelRegistry
+
+FILES = {"rigidity": "rigidity_model_v0.joblib"}
+
+
+def train(seed: int, n_estimators: int):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(400, len(WINDOW_FEATURES))) * 10
+    y = (X[:, 0] + X[:, 1] * (seed % 3 - 1) > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=6, random_state=seed).fit(X, y)
+    return {"model": model, "features": list(WINDOW_FEATURES), "version": f"seed{seed}"}
+
+
+def publish(directory: str, artifact):
+    """Deploy an artifact the safe way: write aside, then rename over."""
+    tmp = os.path.join(directory, "incoming.tmp")
+    joblib.dump(artifact, tmp)
+    os.replace(tmp, os.path.join(directory, FILES["rigidity"]))
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert predicate(), "timed out"
+
+
+async def main():
+    probe = np.random.default_rng(1).normal(size=(200, len(WINDOW_FEATURES))) * 10
+    with tempfile.TemporaryDirectory() as model_dir, tempfile.TemporaryDirectory() as cache_dir:
+        v1 = train(1, 40)
+        publish(model_dir, v1)
+
+        registry = ModelRegistry(model_dir, FILES, cache_dir=cache_dir, poll_interval=0.05)
+        registry.load_all()
+        info = registry.stats()["models"]["rigidity"]
+        assert info["compiled"] and info["mmapped"], info
+        served = registry.get("rigidity")
+        assert isinstance(served["model"].threshold.base, np.memmap)
+        assert np.array_equal(served["model"].predict(probe), v1["model"].predict(probe))
+        cached = os.listdir(cache_dir)
+        print(f"PASS compiled, cached ({cached[0]}, {os.path.getsize(os.path.join(cache_dir, cached[0]))} bytes) and served memory-mapped")
+
+        worker2 = ModelRegistry(model_dir, FILES, cache_dir=cache_dir, poll_interval=0)
+        worker2.load_all()
+        assert worker2.stats()["cache_hits"] == 1 and worker2.get("rigidity")["model"].threshold.base.filename.endswith(cached[0])
+        print("PASS second worker maps the cached compiled model instead of recompiling")
+
+        # Keep scoring while a new version is published
+        errors, scored = [], [0]
+
+        async def traffic():
+            while not stop.is_set():
+                artifact = registry.get("rigidity")
+                try:
+                    artifact["model"].predict(probe[:1])
+                    scored[0] += 1
+                except Exception as e:
+                    errors.append(e)
+                await asyncio.sleep(0.001)
+
+        stop = asyncio.Event()
+        await registry.start()
+        load = asyncio.create_task(traffic())
+        in_flight = registry.get("rigidity")
+        v2 = train(2, 60)
+        publish(model_dir, v2)
+        await wait_for(lambda: registry.stats()["models"]["rigidity"]["version"] == "seed2")
+        assert np.array_equal(registry.get("rigidity")["model"].predict(probe), v2["model"].predict(probe))
+        assert np.array_equal(in_flight["model"].predict(probe), v1["model"].predict(probe))
+        assert len(os.listdir(cache_dir)) == 1, os.listdir(cache_dir)
+        print(f"PASS hot reload to seed2 with {scored[0]} predictions running, 0 errors; in-flight reference kept seed1")
+
+        with open(os.path.join(model_dir, FILES["rigidity"]), "wb") as f:
+            f.write(b"not a joblib file")
+        await wait_for(lambda: registry.stats()["failures"] == 1)
+        bad = dict(v2, features=list(WINDOW_FEATURES)[:3], version="bad")
+        publish(model_dir, bad)
+        await wait_for(lambda: registry.stats()["failures"] == 2)
+        stats = registry.stats()
+        assert stats["models"]["rigidity"]["version"] == "seed2", stats
+        print("PASS corrupt and inconsistent artifacts rejected, still serving seed2:", stats["errors"]["rigidity"])
+
+        os.remove(os.path.join(model_dir, FILES["rigidity"]))
+        await asyncio.sleep(0.2)
+        assert registry.get("rigidity")["version"] == "seed2"
+        print("PASS removing the file keeps the served model")
+
+        stop.set()
+        await load
+        await registry.close()
+        assert not errors, errors
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""
+Ordering, backpressure and drain checks for the ingest processing queue.
+
+Usage:
+    python tools/test_processing_queue.py
+
+Drives `app.services.processing_queue.ProcessingQueue` with jobs that block
+on an event. Checks that:
+ - jobs for one key run in submission order, different keys concurrently,
+ - a full queue raises `QueueFullError` with a Retry-After estimate, and
+   capacity comes back as jobs finish,
+ - a job heavier than the whole capacity is admitted into an empty queue
+   but refused while other work is pending,
+ - `reserve` / `release` hold and return capacity without queueing,
+ - `drain` finishes queued jobs and later submits raise `QueueClosedError`,
+ - POST /ingest/data answers 429 with a Retry-After header while the shared
+   queue is saturated, and 202 once it has room again.
+"""
+import asyncio
+import os
+import sys
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.processing_queue import ProcessingQueue, QueueClosedError, QueueFullError
+from _fakes import SIMULATOR_HEADERS, make_packet
+
+
+def blocking_job(gate: asyncio.Event, log: list, name: str):
+    async def job():
+        log.append(("start", name))
+        await gate.wait()
+        log.append(("end", name))
+    return job
+
+
+async def test_ordering():
+    queue = ProcessingQueue(workers=4, max_pending=100)
+    await queue.start()
+    gate = asyncio.Event()
+    log = []
+    for i in range(3):
+        queue.submit("u1", blocking_job(gate, log, f"u1-{i}"))
+    queue.submit("u2", blocking_job(gate, log, "u2-0"))
+    await asyncio.sleep(0.05)
+    started = [name for kind, name in log if kind == "start"]
+    if queue._shard_for("u1") != queue._shard_for("u2"):
+        assert sorted(started) == ["u1-0", "u2-0"], started
+    gate.set()
+    await queue.drain(timeout=5)
+    u1 = [name for kind, name in log if kind == "start" and name.startswith("u1")]
+    assert u1 == ["u1-0", "u1-1", "u1-2"], u1
+    print("PASS jobs for one key run in order, other keys alongside")
+
+
+async def test_backpressure():
+    queue = ProcessingQueue(workers=2, max_pending=10)
+    gate = asyncio.Event()
+    log = []
+    for i in range(5):
+        queue.submit(f"u{i}", blocking_job(gate, log, str(i)), weight=2)
+    try:
+        queue.submit("u9", blocking_job(gate, log, "over"))
+    except QueueFullError as e:
+        retry_after = e.retry_after
+    else:
+        raise AssertionError("a full queue accepted another job")
+    assert 1 <= retry_after <= 60, retry_after
+    stats = queue.stats()
+    assert stats["depth"] == 10 and stats["rejected"] == 1, stats
+
+    gate.set()
+    await asyncio.sleep(0.05)
+    assert queue.stats()["depth"] == 0, queue.stats()
+    queue.submit("u9", blocking_job(gate, log, "after"), weight=10)
+    await queue.drain(timeout=5)
+    assert ("end", "after") in log
+    print(f"PASS a full queue raises QueueFullError (Retry-After {retry_after}s) until jobs finish")
+
+
+async def test_oversized_job():
+    queue = ProcessingQueue(workers=2, max_pending=10)
+    gate = asyncio.Event()
+    log = []
+    queue.submit("u1", blocking_job(gate, log, "small"))
+    try:
+        queue.submit("u2", blocking_job(gate, log, "big"), weight=25)
+    except QueueFullError:
+        pass
+    else:
+        raise AssertionError("an oversized job was admitted next to pending work")
+    gate.set()
+    await asyncio.sleep(0.05)
+    queue.submit("u2", blocking_job(gate, log, "big"), weight=25)
+    assert queue.stats()["depth"] == 25, queue.stats()
+    await queue.drain(timeout=5)
+    assert ("end", "big") in log
+    print("PASS a job heavier than the capacity runs once the queue is empty")
+
+
+async def test_reserve_release():
+    queue = ProcessingQueue(workers=1, max_pending=4)
+    queue.reserve(3)
+    try:
+        queue.reserve(2)
+    except QueueFullError:
+        pass
+    else:
+        raise AssertionError("reserve exceeded the capacity")
+    queue.release(3)
+    queue.reserve(4)
+    gate = asyncio.Event()
+    gate.set()
+    log = []
+    queue.submit("u1", blocking_job(gate, log, "reserved"), weight=4, reserved=True)
+    await queue.drain(timeout=5)
+    assert log == [("start", "reserved"), ("end", "reserved")], log
+    assert queue.stats()["depth"] == 0, queue.stats()
+    print("PASS reserve holds capacity, release returns it, a reserved submit does not count twice")
+
+
+async def test_drain():
+    queue = ProcessingQueue(workers=2, max_pending=100)
+    await queue.start()
+    log = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        log.append("done")
+
+    for i in range(6):
+        queue.submit(f"u{i}", slow)
+    await queue.drain(timeout=5)
+    assert log == ["done"] * 6, log
+    for attempt in (lambda: queue.submit("u1", slow), lambda: queue.reserve(1)):
+        try:
+            attempt()
+        except QueueClosedError:
+            continue
+        raise AssertionError("a draining queue accepted work")
+    print("PASS drain finishes queued jobs and refuses new ones")
+
+
+async def test_http_429():
+    import httpx
+    from app.main import app
+    from app.services.processing_queue import processing_queue
+
+    gate = asyncio.Event()
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        room = processing_queue.max_pending - processing_queue.stats()["depth"]
+        processing_queue.submit("hold", blocking_job(gate, [], "hold"), weight=room)
+        try:
+            response = await client.post("/ingest/data", json=make_packet(), headers=SIMULATOR_HEADERS)
+        finally:
+            gate.set()
+        assert response.status_code == 429, (response.status_code, response.text)
+        assert int(response.headers["Retry-After"]) >= 1, response.headers
+        await asyncio.sleep(0.05)
+        response = await client.post("/ingest/data", json=make_packet(timestamp="2025-11-16T10:00:01Z"), headers=SIMULATOR_HEADERS)
+        assert response.status_code == 202, (response.status_code, response.text)
+    print("PASS /ingest/data answers 429 with Retry-After while the queue is full, 202 once it has room")
+
+
+async def main():
+    for test in (test_ordering, test_backpressure, test_oversized_job, test_reserve_release, test_drain, test_http_429):
+        await test()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
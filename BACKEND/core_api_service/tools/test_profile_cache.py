@@ -0,0 +1,172 @@
+"""
+TTL, invalidation and eviction checks for the profile / consent cache.
+
+Usage:
+    python tools/test_profile_cache.py
+
+The loaders read from the in-memory Firestore in tools/_fakes.py, and the
+cache runs on a fake clock. Checks that:
+ - a found document is read once per `ttl`, then read again,
+ - a missing document is cached for the shorter `negative_ttl`,
+ - loader errors propagate and are never cached,
+ - `invalidate` drops one kind or every kind for a user, and a load that
+   was running when its key was invalidated is not cached,
+ - entries beyond `max_entries` are evicted least-recently-used,
+ - the async getters read a miss in a worker thread and share the cache
+   with the sync ones.
+"""
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app.services.profile_cache as cache_module
+from app.services.profile_cache import (
+    KIND_CONSENT,
+    KIND_USER,
+    ProfileCache,
+    get_consent,
+    get_consent_async,
+    get_user_doc,
+)
+from _fakes import FakeClock, InMemoryFirestore, patched
+
+
+def test_ttl(clock: FakeClock, db: InMemoryFirestore):
+    cache_module.profile_cache = ProfileCache(ttl=300, negative_ttl=60)
+    db.docs["users/u1"] = {"name": "Ada"}
+    db.reads = 0
+    for _ in range(5):
+        assert get_user_doc(db, "u1") == {"name": "Ada"}
+    assert db.reads == 1, db.reads
+    db.docs["users/u1"] = {"name": "Ada L."}
+    clock.now += 299
+    assert get_user_doc(db, "u1") == {"name": "Ada"}
+    clock.now += 2
+    assert get_user_doc(db, "u1") == {"name": "Ada L."} and db.reads == 2, db.reads
+
+    # Never set: cached as "no consent" for the negative TTL only
+    for _ in range(3):
+        assert get_consent(db, "u1") is False
+    assert db.reads == 3, db.reads
+    db.docs["users/u1/preferences/consent"] = {"consent": True}
+    clock.now += 61
+    assert get_consent(db, "u1") is True and db.reads == 4, db.reads
+    stats = cache_module.profile_cache.stats()
+    assert stats["negative_hits"] == 2, stats
+    print(f"PASS found documents expire after ttl, missing ones after negative_ttl: {stats}")
+
+
+def test_errors(db: InMemoryFirestore):
+    cache_module.profile_cache = ProfileCache(ttl=300, negative_ttl=60)
+    db.reads = 0
+    db.fail = True
+    for _ in range(2):
+        try:
+            get_consent(db, "u2")
+        except ConnectionError:
+            continue
+        raise AssertionError("a failed read returned a value")
+    db.fail = False
+    assert get_consent(db, "u2") is False and db.reads == 3, db.reads
+    print("PASS read errors propagate and are not cached")
+
+
+def test_invalidate(db: InMemoryFirestore):
+    cache = cache_module.profile_cache = ProfileCache(ttl=300, negative_ttl=60)
+    db.docs["users/u3"] = {"name": "Grace"}
+    db.docs["users/u3/preferences/consent"] = {"consent": False}
+    db.reads = 0
+    get_user_doc(db, "u3")
+    get_consent(db, "u3")
+    db.docs["users/u3/preferences/consent"] = {"consent": True}
+    cache.invalidate("u3", KIND_CONSENT)
+    assert get_consent(db, "u3") is True
+    get_user_doc(db, "u3")
+    assert db.reads == 3, db.reads
+    cache.invalidate("u3")
+    get_user_doc(db, "u3")
+    get_consent(db, "u3")
+    assert db.reads == 5 and cache.stats()["invalidations"] == 2, (db.reads, cache.stats())
+    print("PASS invalidate drops one kind, or every kind, for a user")
+
+
+def test_invalidate_during_load():
+    cache = ProfileCache(ttl=300, negative_ttl=60)
+    key = ("u6", KIND_CONSENT)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        started.set()
+        release.wait(5)
+        return True, True  # read before the revocation landed
+
+    reader = threading.Thread(target=cache.get, args=(key, slow_load))
+    reader.start()
+    assert started.wait(5)
+    cache.invalidate("u6", KIND_CONSENT)
+    release.set()
+    reader.join(5)
+    assert cache.get(key, lambda: (False, True)) is False, "the value loaded before invalidate was cached"
+    assert cache.get(key, lambda: (True, True)) is False
+    print("PASS a load overtaken by invalidate is not cached")
+
+
+def test_lru():
+    cache = ProfileCache(ttl=300, negative_ttl=60, max_entries=3)
+    loads = []
+
+    def loader(uid):
+        def load():
+            loads.append(uid)
+            return {"uid": uid}, True
+        return load
+
+    for uid in ("a", "b", "c"):
+        cache.get((uid, KIND_USER), loader(uid))
+    cache.get(("a", KIND_USER), loader("a"))  # now most recently used
+    cache.get(("d", KIND_USER), loader("d"))  # evicts b
+    for uid in ("a", "c", "d"):
+        cache.get((uid, KIND_USER), loader(uid))
+    assert loads == ["a", "b", "c", "d"], loads
+    cache.get(("b", KIND_USER), loader("b"))
+    assert loads[-1] == "b" and cache.stats()["entries"] == 3, (loads, cache.stats())
+    print("PASS entries beyond max_entries are evicted least-recently-used")
+
+
+async def test_async(db: InMemoryFirestore):
+    cache_module.profile_cache = ProfileCache(ttl=300, negative_ttl=60)
+    db.docs["users/u4/preferences/consent"] = {"consent": True}
+    db.reads = 0
+    db.read_threads.clear()
+    assert await get_consent_async(db, "u4") is True
+    assert threading.get_ident() not in db.read_threads, "the read ran on the event loop thread"
+    assert get_consent(db, "u4") is True
+    assert await get_consent_async(db, "u5") is False
+    assert await get_consent_async(db, "u5") is False
+    assert db.reads == 2, db.reads
+    print("PASS async getters read misses off the event loop and share the cache with sync ones")
+
+
+def main():
+    clock = FakeClock()
+    db = InMemoryFirestore()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(patched(cache_module, "time", clock))
+        stack.enter_context(patched(cache_module, "profile_cache", cache_module.profile_cache))
+        test_ttl(clock, db)
+        test_errors(db)
+        test_invalidate(db)
+        test_invalidate_during_load()
+        test_lru()
+        asyncio.run(test_async(db))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Test harness for the streaming tremor estimator.
+
+Usage:
+    python tools/test_tremor_estimator.py
+
+Checks that:
+ - the sliding bins equal an FFT of the last window (Hann-windowed), for
+   arbitrary packet sizes and across many ring-buffer laps,
+ - on synthetic accelerometer streams (gravity, slow arm drift, noise and
+   a tone swept over 1-12 Hz and 0.1-2 g) tremor detection agrees with
+   `heuristic_tremor_check` from tools/verify_hardware_packet.py given the
+   true frequency and amplitude, away from the band and threshold edges,
+ - packets carrying `samples_g` are scored from the estimate, identically
+   by `process_data_with_ai` and `process_batch`, and packets without
+   samples score as before.
+Then prints the per-sample update cost.
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from app.models.schemas import DeviceData
+from app.services import ai_processor
+from app.services.tremor_estimator import TREMOR_BAND_HZ, TremorEstimator
+from verify_hardware_packet import heuristic_tremor_check
+
+MIN_AMPLITUDE_G = 0.5
+
+
+def stream(freq: float, amp: float, rate: float, seconds: float, rng: np.random.Generator) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    drift = 0.2 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 6.3))
+    tone = amp * np.sin(2 * np.pi * freq * t + rng.uniform(0, 6.3))
+    return 1.0 + drift + tone + rng.normal(0, 0.02, len(t))
+
+
+def feed(estimator: TremorEstimator, x: np.ndarray, rng: np.random.Generator):
+    start = 0
+    while start < len(x):
+        n = int(rng.integers(1, 60))
+        estimator.update(x[start:start + n])
+        start += n
+
+
+def check_sliding_bins(rng):
+    for rate in (50.0, 100.0, 64.0):
+        estimator = TremorEstimator(rate, window_s=2.0)
+        x = stream(5.0, 0.7, rate, 30.0, rng)
+        feed(estimator, x, rng)
+        window = x[-estimator.size:]
+        hann = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(estimator.size) / estimator.size)
+        expected = np.abs(np.fft.rfft(window * hann))[estimator.k_lo + 1:estimator.k_hi]
+        assert np.allclose(estimator.spectrum(), expected, rtol=1e-9, atol=1e-9), (rate, estimator.spectrum(), expected)
+    print("PASS sliding bins match an FFT of the last window at 50, 64 and 100 Hz")
+
+
+def check_against_heuristic(rng):
+    agree = total = skipped = 0
+    freq_errors, amp_errors = [], []
+    # Bin spacing of a 2 s window
+    resolution = 0.5
+    for rate in (50.0, 100.0):
+        for freq in np.arange(1.0, 12.01, 0.25):
+            for amp in (0.1, 0.3, 0.45, 0.6, 0.8, 1.2, 2.0):
+                estimator = TremorEstimator(rate, window_s=2.0, min_amplitude=MIN_AMPLITUDE_G)
+                feed(estimator, stream(freq, amp, rate, 4.0, rng), rng)
+                estimate = estimator.estimate()
+                detected = bool(estimate["tremor_band_detected"])
+                expected = heuristic_tremor_check({"frequency_hz": freq, "amplitude_g": amp})["heuristic_tremor"]
+                # Within one bin of a band edge, or 10% of the threshold, either answer is defensible
+                ambiguous = min(abs(freq - TREMOR_BAND_HZ[0]), abs(freq - TREMOR_BAND_HZ[1])) < resolution or abs(amp - MIN_AMPLITUDE_G) < 0.1 * MIN_AMPLITUDE_G
+                if ambiguous:
+                    skipped += 1
+                    continue
+                total += 1
+                agree += detected == expected
+                assert detected == expected, (rate, freq, amp, estimate)
+                if TREMOR_BAND_HZ[0] <= freq <= TREMOR_BAND_HZ[1]:
+                    freq_errors.append(abs(estimate["tremor_peak_hz"] - freq))
+                    amp_errors.append(abs(estimate["tremor_peak_amplitude_g"] - amp) / amp)
+    print(f"PASS detection agrees with heuristic_tremor_check on {agree}/{total} streams ({skipped} edge cases skipped); "
+          f"in band: max frequency error {max(freq_errors):.3f} Hz, max amplitude error {max(amp_errors) * 100:.1f}%")
+
+
+def packet(i: int, samples=None, rate=None) -> DeviceData:
+    return DeviceData(
+        timestamp=f"2025-11-16T10:00:{i:06d}Z",
+        device_id="wrist_unit_001",
+        safety={"fall_detected": False, "accel_x_g": 0.02, "accel_y_g": -0.01, "accel_z_g": 0.98},
+        tremor={"frequency_hz": 0.0, "amplitude_g": 14.3, "tremor_detected": True, "samples_g": samples, "sample_rate_hz": rate},
+        rigidity={"emg_wrist": 10.0, "emg_arm": 12.0, "rigid": False},
+    )
+
+
+async def check_pipeline(rng):
+    rate = 50.0
+    x = stream(5.0, 0.8, rate, 6.0, rng)
+    packets = [packet(i, x[i * 25:(i + 1) * 25].tolist(), rate) for i in range(len(x) // 25)]
+    single = [await ai_processor.process_data_with_ai(p, stream_key="tremor-single") for p in packets]
+    batched = await ai_processor.process_batch(packets, stream_keys=["tremor-batch"] * len(packets))
+    assert [p.model_dump() for p in single] == [p.model_dump() for p in batched]
+    first, last = single[0], single[-1]
+    # Until a full window has streamed in, the device's own fields are used (samples dropped)
+    assert first.tremor.samples_g is None and first.tremor.amplitude_g == 14.3 and first.scores["tremor"] == round(14.3 / 30.0, 3)
+    assert abs(last.tremor.frequency_hz - 5.0) < 0.1 and abs(last.tremor.amplitude_g - 0.8) < 0.05 and last.tremor.tremor_detected
+    assert abs(last.scores["tremor"] - 0.8) < 0.03 and last.analysis.is_tremor_confirmed, last.scores
+    legacy = await ai_processor.process_data_with_ai(packet(0))
+    assert legacy.scores["tremor"] == round(14.3 / 30.0, 3) and legacy.tremor.frequency_hz == 0.0
+    print(f"PASS pipeline scores streamed samples ({last.tremor.frequency_hz} Hz, {last.tremor.amplitude_g} g -> "
+          f"tremor {last.scores['tremor']}), single and batched agree, packets without samples unchanged")
+
+
+def time_updates(rng):
+    for rate, per_packet in ((50.0, 25), (100.0, 50), (400.0, 200)):
+        estimator = TremorEstimator(rate, window_s=2.0)
+        x = stream(5.0, 0.7, rate, 60.0, rng)
+        chunks = [x[i:i + per_packet] for i in range(0, len(x), per_packet)]
+        started = time.perf_counter()
+        for chunk in chunks:
+            estimator.update(chunk)
+            estimator.estimate()
+        per_chunk = (time.perf_counter() - started) / len(chunks)
+        bins = estimator.k_hi - estimator.k_lo + 1
+        print(f"{rate:5.0f} Hz, {per_packet:3d} samples/packet, {bins} bins, window {estimator.size}: "
+              f"{per_chunk * 1e6:6.1f} µs per packet ({per_chunk / per_packet * 1e9:5.0f} ns per sample)")
+
+
+def main():
+    rng = np.random.default_rng(20)
+    check_sliding_bins(rng)
+    check_against_heuristic(rng)
+    asyncio.run(check_pipeline(rng))
+    time_updates(rng)
+
+
+if __name__ == "__main__":
+    main()
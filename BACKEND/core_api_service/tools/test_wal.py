@@ -0,0 +1,220 @@
+"""
+Test harness for the raw packet write-ahead log and its replicator.
+
+Usage:
+    python tools/test_wal.py
+
+Runs `app.comms.wal` in a temporary directory and checks that:
+ - concurrent appends are group-committed and read back in order,
+ - segments rotate at `segment_bytes` and survive a reopen,
+ - a torn record at the end of the log is truncated on open,
+ - the replicator retries while the sink fails, resumes from its
+   checkpoint after a restart and deletes replicated segments,
+ - `max_bytes` drops the oldest segments instead of filling the disk,
+ - processes sharing one directory each lock a log of their own, and a
+   log left behind is taken over by the next process to open,
+ - after a restart with fewer workers, the replicator copies the
+   worker-N logs nobody reopened and deletes them.
+Also prints append latency with and without fsync.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.comms.wal import WalReplicator, WriteAheadLog
+
+
+def _payload(i: int) -> bytes:
+    return f'{{"uid":"u1","doc_id":"{i}","packet":{{"n":{i}}}}}'.encode()
+
+
+def _read_all(wal: WriteAheadLog):
+    records, _ = wal.read((0, 0), 1_000_000)
+    return records
+
+
+async def test_group_commit_and_reopen(directory):
+    wal = WriteAheadLog(directory, segment_bytes=4096)
+    wal.open()
+    await asyncio.gather(*(wal.append([_payload(i)]) for i in range(200)))
+    stats = wal.stats()
+    assert stats["appended"] == 200, stats
+    assert stats["syncs"] < 200, f"appends were not grouped: {stats}"
+    assert stats["segments"] > 1, f"no rotation: {stats}"
+    wal.close()
+
+    reopened = WriteAheadLog(directory, segment_bytes=4096)
+    reopened.open()
+    records = _read_all(reopened)
+    assert records == [_payload(i) for i in range(200)]
+    reopened.close()
+    print(f"PASS group commit: 200 appends in {stats['syncs']} fsyncs, {stats['segments']} segments, order kept after reopen")
+
+
+async def test_torn_tail(directory):
+    wal = WriteAheadLog(directory)
+    await wal.append([_payload(i) for i in range(5)])
+    wal.close()
+    segment = sorted(n for n in os.listdir(directory) if n.endswith(".wal"))[-1]
+    with open(os.path.join(directory, segment), "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x00\x00\x00\x00partial")
+
+    reopened = WriteAheadLog(directory)
+    reopened.open()
+    assert _read_all(reopened) == [_payload(i) for i in range(5)]
+    await reopened.append([_payload(5)])
+    assert _read_all(reopened)[-1] == _payload(5)
+    reopened.close()
+    print("PASS torn tail: partial record truncated, appends continue")
+
+
+class FlakySink:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.stored = []
+
+    async def __call__(self, records):
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.stored.extend(records)
+        return True
+
+
+async def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert predicate(), "timed out"
+
+
+async def test_replicator_resume(directory):
+    wal = WriteAheadLog(directory, segment_bytes=2048)
+    await wal.append([_payload(i) for i in range(100)])
+
+    sink = FlakySink(failures=2)
+    replicator = WalReplicator(wal, sink, batch_size=30, poll_interval=0.01)
+    await replicator.start()
+    await _wait_for(lambda: len(sink.stored) >= 60)
+    await replicator.close(timeout=5)
+    assert replicator.stats()["failures"] == 2
+    checkpoint = wal.load_checkpoint()
+    wal.close()
+
+    # Restart: a new log and replicator pick up from the checkpoint
+    wal = WriteAheadLog(directory, segment_bytes=2048)
+    await wal.append([_payload(i) for i in range(100, 120)])
+    resumed = FlakySink(failures=0)
+    replicator = WalReplicator(wal, resumed, batch_size=30, poll_interval=0.01)
+    await replicator.start()
+    await _wait_for(lambda: len(sink.stored) + len(resumed.stored) >= 120)
+    await replicator.close(timeout=5)
+    assert sink.stored + resumed.stored == [_payload(i) for i in range(120)]
+    assert wal.stats()["segments"] == 1, wal.stats()
+    wal.close()
+    print(f"PASS replicator: retried 2 failures, resumed at {checkpoint}, replicated 120 records exactly once")
+
+
+async def test_max_bytes(directory):
+    wal = WriteAheadLog(directory, segment_bytes=1024, max_bytes=4096)
+    for i in range(200):
+        await wal.append([_payload(i)])
+    stats = wal.stats()
+    assert stats["bytes"] <= 4096 + 1024, stats
+    assert stats["dropped_segments"] > 0, stats
+    records = _read_all(wal)
+    assert records[-1] == _payload(199)
+    wal.close()
+    print(f"PASS max_bytes: dropped {stats['dropped_segments']} old segments, kept newest {len(records)} records")
+
+
+_OTHER_WORKER = """
+import asyncio, sys
+sys.path.insert(0, sys.argv[1])
+from app.comms.wal import WriteAheadLog
+wal = WriteAheadLog(sys.argv[2])
+asyncio.run(wal.append([b"other"]))
+print(wal.directory)
+wal.close()
+"""
+
+
+async def test_shared_directory(directory):
+    first = WriteAheadLog(directory)
+    await first.append([_payload(0)])
+    # Another worker process with the same WAL_DIR
+    other = subprocess.run([sys.executable, "-c", _OTHER_WORKER, ROOT, directory], capture_output=True, text=True, check=True)
+    assert other.stdout.strip() == os.path.join(directory, "worker-1"), other.stdout
+    second = WriteAheadLog(directory)
+    second.open()
+    assert second.directory == os.path.join(directory, "worker-1"), second.directory
+    assert _read_all(second) == [b"other"] and _read_all(first) == [_payload(0)]
+    # The first worker exits; a new one takes over its log
+    first.close()
+    third = WriteAheadLog(directory)
+    third.open()
+    assert third.directory == directory and _read_all(third) == [_payload(0)]
+    for wal in (second, third):
+        wal.close()
+    print("PASS shared directory: each process locks its own log (worker-1 for the second), an abandoned log is taken over")
+
+
+async def test_orphaned_worker_log(directory):
+    # Two workers write, then only one comes back
+    first, second = WriteAheadLog(directory), WriteAheadLog(directory)
+    await first.append([_payload(i) for i in range(0, 50)])
+    await second.append([_payload(i) for i in range(50, 80)])
+    assert second.directory == os.path.join(directory, "worker-1"), second.directory
+    first.close()
+    second.close()
+
+    wal = WriteAheadLog(directory)
+    sink = FlakySink(failures=1)
+    replicator = WalReplicator(wal, sink, batch_size=20, poll_interval=0.01)
+    await replicator.start()
+    await wal.append([_payload(80)])
+    await _wait_for(lambda: len(sink.stored) >= 81)
+    await replicator.close(timeout=5)
+    assert sorted(sink.stored) == sorted(_payload(i) for i in range(81)), len(sink.stored)
+    assert not os.path.exists(second.directory), os.listdir(directory)
+    stats = replicator.stats()
+    assert stats["orphans_drained"] == 1 and stats["orphans_pending"] == 0, stats
+    wal.close()
+    print("PASS orphaned worker-1 log replicated and deleted after a restart with one worker")
+
+
+async def bench(directory, fsync: bool):
+    wal = WriteAheadLog(directory, fsync=fsync)
+    wal.open()
+    payload = _payload(0) * 6  # ~ size of a JSON raw packet record
+    started = time.monotonic()
+    for i in range(200):
+        await wal.append([payload])
+    sequential = (time.monotonic() - started) / 200 * 1e3
+    started = time.monotonic()
+    await asyncio.gather(*(wal.append([payload]) for _ in range(2000)))
+    concurrent = (time.monotonic() - started) / 2000 * 1e3
+    stats = wal.stats()
+    wal.close()
+    print(f"fsync={fsync!s:<5} sequential {sequential:.3f} ms/append, concurrent {concurrent:.3f} ms/append, {stats['records_per_sync']} records/sync")
+
+
+async def main():
+    for test in (test_group_commit_and_reopen, test_torn_tail, test_replicator_resume, test_max_bytes, test_shared_directory, test_orphaned_worker_log):
+        with tempfile.TemporaryDirectory() as directory:
+            await test(directory)
+    for fsync in (True, False):
+        with tempfile.TemporaryDirectory() as directory:
+            await bench(directory, fsync)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
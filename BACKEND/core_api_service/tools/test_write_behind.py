@@ -0,0 +1,145 @@
+"""
+Test harness for the write-behind Firestore writer.
+
+Usage:
+    python tools/test_write_behind.py
+
+Runs `app.comms.write_behind.WriteBehindWriter` against the in-memory
+Firestore client in tools/_fakes.py (WriteBatch with a configurable commit
+delay) and checks that:
+ - writes are coalesced into commits of at most 500 operations,
+ - a partial batch is flushed after the flush interval,
+ - urgent writes (alerts) are flushed without waiting for the interval,
+ - close() commits everything still pending,
+ - a failed commit is counted and does not stop the writer,
+ - writes are dropped (not queued) while no client is available.
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.comms.write_behind import WriteBehindWriter, FIRESTORE_MAX_BATCH_OPS
+from _fakes import InMemoryFirestore
+
+
+def _ref(db, i, kind="sensor_data"):
+    return db.collection("artifacts", "stancesense", "users", "u1", kind).document(str(i))
+
+
+async def test_coalesces_to_firestore_limit():
+    db = InMemoryFirestore()
+    writer = WriteBehindWriter(lambda: db, flush_interval=0.05)
+    await writer.start()
+    for i in range(1200):
+        assert writer.set(_ref(db, i), {"i": i})
+    await writer.close(timeout=5)
+    sizes = [n for _, n in db.commits]
+    assert sum(sizes) == 1200 and len(db.docs) == 1200, sizes
+    assert max(sizes) <= FIRESTORE_MAX_BATCH_OPS, sizes
+    assert len(sizes) <= 4, sizes
+    assert db.single_writes == 0
+    print(f"PASS coalesce: 1200 writes in {len(sizes)} commits {sizes}")
+
+
+async def test_interval_flush():
+    db = InMemoryFirestore()
+    writer = WriteBehindWriter(lambda: db, flush_interval=0.1)
+    await writer.start()
+    started = time.monotonic()
+    for i in range(3):
+        writer.set(_ref(db, i), {"i": i})
+    while not db.commits and time.monotonic() - started < 2:
+        await asyncio.sleep(0.01)
+    waited = db.commits[0][0] - started
+    assert db.commits[0][1] == 3, db.commits
+    assert 0.09 <= waited < 0.5, waited
+    await writer.close(timeout=5)
+    print(f"PASS interval: partial batch of 3 flushed after {waited * 1000:.0f} ms")
+
+
+async def test_urgent_flush():
+    db = InMemoryFirestore()
+    writer = WriteBehindWriter(lambda: db, flush_interval=5.0)
+    await writer.start()
+    writer.set(_ref(db, "raw"), {"kind": "raw"})
+    started = time.monotonic()
+    writer.set(_ref(db, "fall", kind="alerts"), {"kind": "alert"}, urgent=True)
+    while not db.commits and time.monotonic() - started < 2:
+        await asyncio.sleep(0.005)
+    waited = db.commits[0][0] - started
+    assert waited < 0.2, waited
+    assert db.commits[0][1] == 2, db.commits
+    await writer.close(timeout=5)
+    print(f"PASS urgent: alert flushed after {waited * 1000:.0f} ms (interval 5000 ms)")
+
+
+async def test_close_flushes_pending():
+    db = InMemoryFirestore()
+    writer = WriteBehindWriter(lambda: db, flush_interval=10.0)
+    await writer.start()
+    for i in range(10):
+        writer.set(_ref(db, i), {"i": i})
+    await writer.close(timeout=5)
+    assert len(db.docs) == 10
+    assert not writer.set(_ref(db, 99), {"i": 99}), "closed writer must reject writes"
+    stats = writer.stats()
+    assert stats["written"] == 10 and stats["dropped"] == 1, stats
+    print("PASS close: pending writes committed, later writes rejected")
+
+
+async def test_failed_commit_is_counted():
+    db = InMemoryFirestore()
+    db.fail_next = True
+    writer = WriteBehindWriter(lambda: db, flush_interval=0.01)
+    await writer.start()
+    writer.set(_ref(db, 1), {"i": 1})
+    await asyncio.sleep(0.1)
+    writer.set(_ref(db, 2), {"i": 2})
+    await writer.close(timeout=5)
+    stats = writer.stats()
+    assert stats["failed"] == 1 and stats["written"] == 1, stats
+    print("PASS failure: failed commit counted, writer kept running")
+
+
+async def test_no_client_drops():
+    writer = WriteBehindWriter(lambda: None, flush_interval=0.01)
+    await writer.start()
+    db = InMemoryFirestore()
+    writer.set(_ref(db, 1), {"i": 1})
+    await writer.close(timeout=5)
+    stats = writer.stats()
+    assert stats["dropped"] == 1 and stats["written"] == 0 and not db.docs, stats
+    print("PASS demo mode: writes dropped without a client")
+
+
+async def main():
+    await test_coalesces_to_firestore_limit()
+    await test_interval_flush()
+    await test_urgent_flush()
+    await test_close_flushes_pending()
+    await test_failed_commit_is_counted()
+    await test_no_client_drops()
+
+    # Throughput and stats with a commit latency closer to a real round trip
+    db = InMemoryFirestore(commit_delay=0.02)
+    writer = WriteBehindWriter(lambda: db, flush_interval=0.05)
+    await writer.start()
+    started = time.monotonic()
+    for i in range(5000):
+        writer.set(_ref(db, i), {"i": i})
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    await writer.close(timeout=10)
+    elapsed = time.monotonic() - started
+    print(f"5000 writes in {len(db.commits)} commits, {elapsed * 1000:.0f} ms total")
+    print("stats:", writer.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
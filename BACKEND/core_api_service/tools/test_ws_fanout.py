@@ -0,0 +1,216 @@
+"""
+Test harness for the frontend WebSocket fan-out (per-client send queues).
+
+Usage:
+    python tools/test_ws_fanout.py [--clients 50] [--messages 200]
+
+Uses in-memory sockets with configurable send delays. Checks that:
+ - `broadcast` returns without waiting on any socket, and fast clients get
+   every message, in order, while one client is slow and one is stalled,
+ - the stalled client is evicted after the send timeout and a client whose
+   send raises is evicted at once,
+ - alerts are sent before queued data messages and are never dropped,
+ - the slow client policies behave: ``conflate`` keeps the newest message
+   per key, ``drop`` keeps the newest `max_queue` messages, ``disconnect``
+   evicts the client.
+Then compares broadcast latency and fast-client delivery latency with the
+previous sequential broadcast.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.comms.websocket_manager import CONFLATE, DISCONNECT, DROP, ConnectionManager
+
+
+class FakeSocket:
+    """Records what is sent; each send takes `delay` seconds (None: never completes)."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+        self.arrivals = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.fail:
+            raise ConnectionResetError("peer gone")
+        if self.delay is None:
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(message)
+        self.arrivals.append(time.perf_counter())
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def data(i: int, device: str = "d0") -> str:
+    return json.dumps({"type": "processed_data", "data": {"i": i, "device_id": device, "sent": time.perf_counter()}})
+
+
+def alert(i: int) -> str:
+    return json.dumps({"type": "alert", "data": {"i": i}})
+
+
+async def settle(seconds: float = 0.05):
+    await asyncio.sleep(seconds)
+
+
+async def sequential_broadcast(sockets, message: str):
+    """The previous ConnectionManager.broadcast: await each send in turn."""
+    for socket in sockets:
+        try:
+            await socket.send_text(message)
+        except Exception:
+            pass
+
+
+def _ms(samples, q):
+    ordered = sorted(samples)
+    return ordered[int(q * (len(ordered) - 1))] * 1000.0
+
+
+def delivery_latencies(sockets):
+    out = []
+    for socket in sockets:
+        for message, arrived in zip(socket.received, socket.arrivals):
+            out.append(arrived - json.loads(message)["data"]["sent"])
+    return out
+
+
+async def check_isolation(n_clients: int, n_messages: int):
+    manager = ConnectionManager(max_queue=n_messages, policy=CONFLATE, send_timeout=0.3)
+    fast = [FakeSocket() for _ in range(n_clients)]
+    slow, stalled, broken = FakeSocket(delay=0.02), FakeSocket(delay=None), FakeSocket(fail=True)
+    for socket in fast + [slow, stalled, broken]:
+        await manager.connect(socket)
+
+    broadcast_times = []
+    for i in range(n_messages):
+        started = time.perf_counter()
+        await manager.broadcast(data(i, device=f"d{i % 4}"), key=f"d{i % 4}")
+        broadcast_times.append(time.perf_counter() - started)
+        await asyncio.sleep(0.001)
+    await settle(0.5)
+
+    expected = list(range(n_messages))
+    assert all([json.loads(m)["data"]["i"] for m in s.received] == expected for s in fast), "fast clients missed messages"
+    assert broken.closed_with == 1011 and stalled.closed_with == 1008, (broken.closed_with, stalled.closed_with)
+    assert broken not in manager.active_connections and stalled not in manager.active_connections
+    assert slow in manager.active_connections and 0 < len(slow.received) < n_messages
+    # Conflated: the slow client ends with the newest message of every device
+    last = {}
+    for message in slow.received:
+        body = json.loads(message)["data"]
+        last[body["device_id"]] = body["i"]
+    assert sorted(last.values()) == expected[-4:], last
+    stats = manager.stats()
+    print(f"PASS {n_clients} fast clients got all {n_messages} messages in order; slow client got "
+          f"{len(slow.received)} (conflated {stats['conflated']}, newest per device kept); "
+          f"stalled and broken clients evicted ({stats['evicted']})")
+    await manager.close()
+    return broadcast_times, delivery_latencies(fast)
+
+
+async def check_alert_priority():
+    manager = ConnectionManager(max_queue=100, max_alerts=3, policy=DROP)
+    socket = FakeSocket(delay=0.01)
+    await manager.connect(socket)
+    for i in range(20):
+        await manager.broadcast(data(i))
+    await manager.broadcast(alert(0), priority=True)
+    await settle(0.1)
+    kinds = [json.loads(m)["type"] for m in socket.received]
+    # The first data message was already being sent when the alert arrived
+    assert kinds.index("alert") <= 1, kinds
+    # An alert backlog larger than max_alerts disconnects rather than drops
+    stuck = FakeSocket(delay=None)
+    await manager.connect(stuck)
+    for i in range(5):
+        await manager.broadcast(alert(i), priority=True)
+    assert stuck not in manager.active_connections and manager.stats()["dropped"] == 0
+    print(f"PASS alert sent at position {kinds.index('alert')} behind 20 queued data messages; "
+          f"alert backlog over max_alerts disconnects instead of dropping")
+    await manager.close()
+
+
+async def check_policies():
+    drop = ConnectionManager(max_queue=5, policy=DROP)
+    socket = FakeSocket(delay=None)
+    await drop.connect(socket)
+    await drop.broadcast(data(0))
+    await settle()
+    for i in range(1, 12):
+        await drop.broadcast(data(i), key="d0")
+    client = drop._clients[socket]
+    # One message is in flight on the stalled socket; the queue keeps the newest 5
+    assert [json.loads(m)["data"]["i"] for m in client.data.values()] == list(range(7, 12)), list(client.data.values())
+    assert drop.stats()["dropped"] == 6
+    await drop.close()
+
+    conflate = ConnectionManager(max_queue=5, policy=CONFLATE)
+    socket = FakeSocket(delay=None)
+    await conflate.connect(socket)
+    await conflate.broadcast(data(0, "d0"), key="d0")
+    await settle()
+    for i in range(1, 12):
+        await conflate.broadcast(data(i, f"d{i % 2}"), key=f"d{i % 2}")
+    client = conflate._clients[socket]
+    assert sorted(json.loads(m)["data"]["i"] for m in client.data.values()) == [10, 11], list(client.data.values())
+    await conflate.close()
+
+    disconnect = ConnectionManager(max_queue=5, policy=DISCONNECT)
+    socket = FakeSocket(delay=None)
+    await disconnect.connect(socket)
+    for i in range(12):
+        await disconnect.broadcast(data(i))
+    await settle()
+    assert socket not in disconnect.active_connections and socket.closed_with == 1008
+    await disconnect.close()
+    print("PASS policies: drop keeps the newest messages, conflate the newest per key, disconnect evicts")
+
+
+async def compare_sequential(n_clients: int, n_messages: int, queued_times, queued_latencies):
+    fast = [FakeSocket() for _ in range(n_clients)]
+    slow = FakeSocket(delay=0.02)
+    sockets = [slow] + fast
+    times = []
+    for i in range(n_messages // 4):
+        started = time.perf_counter()
+        await sequential_broadcast(sockets, data(i))
+        times.append(time.perf_counter() - started)
+    latencies = delivery_latencies(fast)
+    print(f"{'sequential':<11} broadcast call p50 {_ms(times, 0.5):7.3f} ms p99 {_ms(times, 0.99):7.3f} ms | "
+          f"fast client delivery p50 {_ms(latencies, 0.5):7.3f} ms p99 {_ms(latencies, 0.99):7.3f} ms")
+    print(f"{'per-client':<11} broadcast call p50 {_ms(queued_times, 0.5):7.3f} ms p99 {_ms(queued_times, 0.99):7.3f} ms | "
+          f"fast client delivery p50 {_ms(queued_latencies, 0.5):7.3f} ms p99 {_ms(queued_latencies, 0.99):7.3f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    broadcast_times, latencies = await check_isolation(args.clients, args.messages)
+    await check_alert_priority()
+    await check_policies()
+    await compare_sequential(args.clients, args.messages, broadcast_times, latencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
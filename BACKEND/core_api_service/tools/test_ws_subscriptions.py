@@ -0,0 +1,163 @@
+"""
+Test harness for topic-based frontend WebSocket subscriptions.
+
+Usage:
+    python tools/test_ws_subscriptions.py [--users 2000] [--messages 5000]
+
+Checks that:
+ - `publish` reaches only the connections subscribed to the (user id,
+   message type) topic, plus anonymous "all users" connections,
+ - subscribe/unsubscribe requests narrow and widen subscriptions, and a
+   request for a user the connection may not see is refused,
+ - disconnecting removes a connection from the topic index,
+ - through the real endpoint: a bad token and a missing one are refused at
+   the handshake, a simulator-token dashboard receives its own user's
+   packets, and with WS_ALLOW_ANONYMOUS on a dashboard without a token
+   receives everything.
+Then compares the cost of publishing to `--users` one-patient dashboards
+with broadcasting to all of them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.comms.websocket_manager import ALL_USERS, ConnectionManager
+from app.config import settings
+from _fakes import SIMULATOR_HEADERS, patched
+from test_ws_fanout import FakeSocket, settle
+
+
+def kinds(socket: FakeSocket):
+    return [json.loads(m)["type"] for m in socket.received]
+
+
+async def check_routing():
+    manager = ConnectionManager()
+    alice, bob, carer, demo = FakeSocket(), FakeSocket(), FakeSocket(), FakeSocket()
+    await manager.connect(alice, user_id="alice", allowed_users=["alice"])
+    await manager.connect(bob, user_id="bob", allowed_users=["bob"])
+    await manager.connect(carer, user_id="carer", allowed_users=["carer", "alice", "bob"])
+    await manager.connect(demo)
+
+    await manager.publish('{"type":"processed_data","data":{"user":"alice"}}', "alice", "processed_data")
+    await manager.publish('{"type":"alert","data":{"user":"bob"}}', "bob", "alert", priority=True)
+    await settle()
+    assert kinds(alice) == ["processed_data"] and kinds(bob) == ["alert"], (alice.received, bob.received)
+    assert sorted(kinds(carer)) == ["alert", "processed_data"] and sorted(kinds(demo)) == ["alert", "processed_data"]
+
+    # The carer narrows to alice's alerts only
+    manager.handle_message(carer, json.dumps({"action": "unsubscribe"}))
+    manager.handle_message(carer, json.dumps({"action": "subscribe", "user_ids": ["alice"], "types": ["alert"]}))
+    await settle()
+    reply = json.loads(carer.received[-1])
+    assert reply["type"] == "subscriptions" and reply["topics"] == [{"user_id": "alice", "type": "alert"}], reply
+    carer.received.clear()
+    await manager.publish('{"type":"processed_data"}', "alice", "processed_data")
+    await manager.publish('{"type":"alert"}', "alice", "alert")
+    await manager.publish('{"type":"alert"}', "bob", "alert")
+    await settle()
+    assert kinds(carer) == ["alert"], carer.received
+
+    # Refused: another patient, an unknown type, the wildcard, malformed JSON
+    for request in (
+        {"action": "subscribe", "user_ids": ["bob"]},
+        {"action": "subscribe", "user_ids": ["alice"], "types": ["everything"]},
+        {"action": "subscribe", "user_ids": [ALL_USERS]},
+        "not json",
+    ):
+        manager.handle_message(alice, request if isinstance(request, str) else json.dumps(request))
+    await settle()
+    errors = [json.loads(m) for m in alice.received if json.loads(m)["type"] == "error"]
+    assert len(errors) == 4, alice.received
+    assert ("alice", "processed_data") in manager._clients[alice].topics and ("bob", "processed_data") not in manager._clients[alice].topics
+
+    manager.disconnect(demo)
+    manager.disconnect(carer)
+    assert not any(demo_client.websocket in (demo, carer) for subscribers in manager._topics.values() for demo_client in subscribers)
+    await manager.close()
+    assert manager.stats()["topics"] == 0
+    print("PASS publish reaches only subscribed connections; subscribe/unsubscribe narrow and widen; "
+          f"{len(errors)} disallowed or malformed requests refused; disconnect cleans the topic index")
+
+
+async def check_endpoint():
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+
+    from app.main import app
+
+    packet = {
+        "timestamp": "2025-11-16T10:00:00Z",
+        "device_id": "wrist_unit_001",
+        "safety": {"fall_detected": True, "accel_x_g": 0.1, "accel_y_g": 0.1, "accel_z_g": 3.0},
+        "tremor": {"frequency_hz": 5.0, "amplitude_g": 14.3, "tremor_detected": True},
+        "rigidity": {"emg_wrist": 10.0, "emg_arm": 12.0, "rigid": False},
+    }
+    with TestClient(app) as client:
+        for url in ("/ws/frontend-data?token=not-a-real-token", "/ws/frontend-data"):
+            try:
+                with client.websocket_connect(url):
+                    raise AssertionError(f"{url} accepted")
+            except WebSocketDisconnect as e:
+                assert e.code == 1008, (url, e.code)
+        with patched(settings, "WS_ALLOW_ANONYMOUS", True), \
+                client.websocket_connect("/ws/frontend-data?token=simulator_test_token") as own, \
+                client.websocket_connect("/ws/frontend-data") as anonymous:
+            own.send_text(json.dumps({"action": "subscribe", "user_ids": ["someone_else"]}))
+            assert json.loads(own.receive_text())["type"] == "error"
+            response = client.post("/ingest/data", json=packet, headers=SIMULATOR_HEADERS)
+            assert response.status_code == 202, response.text
+            # An alert for the packet, if any, may overtake it
+            for dashboard in (own, anonymous):
+                received = {json.loads(dashboard.receive_text())["type"] for _ in range(2)}
+                assert "processed_data" in received, received
+    print("PASS endpoint: bad or missing token refused (1008), simulator dashboard gets its own packets, "
+          "tokenless dashboard gets all only with WS_ALLOW_ANONYMOUS")
+
+
+async def compare_fanout(n_users: int, n_messages: int):
+    results = {}
+    for mode in ("broadcast", "publish"):
+        manager = ConnectionManager(max_queue=n_messages)
+        sockets = [FakeSocket(delay=None) for _ in range(n_users)]
+        for i, socket in enumerate(sockets):
+            await manager.connect(socket, user_id=f"u{i}", allowed_users=[f"u{i}"])
+        message = '{"type":"processed_data","data":{}}'
+        started = time.perf_counter()
+        for i in range(n_messages):
+            if mode == "broadcast":
+                await manager.broadcast(message)
+            else:
+                await manager.publish(message, f"u{i % n_users}", "processed_data")
+        elapsed = time.perf_counter() - started
+        queued = manager.stats()["queued"]
+        results[mode] = elapsed
+        print(f"{mode:<9} {n_messages} messages to {n_users} one-patient dashboards: "
+              f"{elapsed / n_messages * 1e6:8.2f} µs per message, {queued} queued sends")
+        # Stalled sockets: drop the queues without waiting on them
+        for socket in sockets:
+            manager.disconnect(socket)
+    print(f"publish is {results['broadcast'] / results['publish']:.0f}x cheaper than broadcast-to-all")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    await check_routing()
+    await check_endpoint()
+    await compare_fanout(args.users, args.messages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,258 @@
+"""
+Test harness and benchmark for rate-limited, delta-encoded dashboard updates.
+
+Usage:
+    python tools/test_ws_updates.py [--devices 3] [--seconds 2]
+
+Checks that:
+ - `merge_patch` deltas rebuild every state exactly,
+ - with a per-stream rate cap a dashboard gets at most that many updates
+   per device per second and always ends on the newest state, while every
+   alert arrives,
+ - a dashboard that opts into deltas and acknowledges what it applied ends
+   on exactly the state a full-message dashboard ends on,
+ - updates conflated away are never rendered,
+ - the server negotiates permessage-deflate with a client that offers it.
+Then prints, for rising packet rates, the bytes per second a dashboard
+receives (uncapped full messages as before, capped full, capped deltas, and
+capped deltas after per-message deflate) and the messages rendered per
+second by the capped manager.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import zlib
+from typing import List
+
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.comms.state_updates import merge_patch
+from app.comms.websocket_manager import ConnectionManager
+from app.models.envelope import ProcessedEnvelope
+from app.models.schemas import DeviceData
+from app.services.ai_processor import process_batch
+from app.services.care_recommendations import generate_care_recommendations
+from bench_envelope import make_processed
+
+
+def apply_patch(state: dict, patch: dict) -> dict:
+    """Client side of a JSON merge patch."""
+    out = dict(state)
+    for key, value in patch.items():
+        if value is None:
+            out.pop(key, None)
+        elif isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = apply_patch(out[key], value)
+        else:
+            out[key] = value
+    return out
+
+
+class Dashboard:
+    """A dashboard socket that applies full and delta updates and acknowledges them."""
+
+    def __init__(self, manager: ConnectionManager, ack: bool):
+        self.manager = manager
+        self.ack = ack
+        self.states = {}
+        self.seqs = {}
+        self.alerts = 0
+        self.updates = 0
+        self.chars = 0
+        self.wire = 0
+        self.arrivals = {}
+        self._deflate = zlib.compressobj(wbits=-15)
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, message: str):
+        raw = message.encode("utf-8")
+        self.chars += len(raw)
+        # permessage-deflate with context takeover drops the 4-byte sync flush tail
+        self.wire += len(self._deflate.compress(raw) + self._deflate.flush(zlib.Z_SYNC_FLUSH)) - 4
+        body = json.loads(message)
+        if body["type"] == "alert":
+            self.alerts += 1
+            return
+        if body["type"] == "subscriptions":
+            return
+        self.updates += 1
+        if body["type"] == "processed_data_delta":
+            key = body["key"]
+            assert self.seqs[key] == body["base"], (self.seqs[key], body["base"])
+            state = apply_patch(self.states[key], body["data"])
+        else:
+            key = body.get("key") or body["data"]["device_id"]
+            state = body["data"]
+        self.states[key] = state
+        self.arrivals.setdefault(key, []).append(time.perf_counter())
+        if self.ack and "seq" in body:
+            self.seqs[key] = body["seq"]
+            self.manager.handle_message(self, json.dumps({"action": "ack", "key": key, "seq": body["seq"]}))
+
+
+async def envelopes_for(rng: random.Random, count: int, device: str) -> List[ProcessedEnvelope]:
+    """`count` packets from `device`, scored by the ingest pipeline's batch scorer."""
+    packets = [
+        DeviceData(**make_processed(rng, i, fall=False).model_dump(include={"timestamp", "safety", "tremor", "rigidity"}), device_id=device)
+        for i in range(count)
+    ]
+    envelopes = []
+    for processed in await process_batch(packets, stream_keys=[f"u0:{device}"] * count):
+        envelope = ProcessedEnvelope(processed)
+        care = generate_care_recommendations(processed)
+        envelope.extend(care_recommendations=care["care_recommendations"], recommended_game=care["recommended_game"])
+        envelopes.append(envelope)
+    return envelopes
+
+
+async def check_merge_patch(rng: random.Random):
+    states = [envelope.message_data for envelope in await envelopes_for(rng, 200, "d0")]
+    states.append({"only": {"nested": [1, 2]}, "gone": None})
+    state = states[0]
+    for new in states[1:]:
+        state = apply_patch(state, merge_patch(state, new))
+        assert state == {k: v for k, v in new.items() if v is not None} or state == new, (state, new)
+    print(f"PASS merge patches rebuild {len(states) - 1} consecutive states")
+
+
+async def run_stream(rate_hz: float, devices: int, seconds: float, max_rate_hz: float):
+    """Publish `devices` streams at `rate_hz` each, with an alert every 20th packet."""
+    rng = random.Random(24)
+    uncapped = ConnectionManager(max_queue=10000)
+    capped = ConnectionManager(max_queue=10000, max_rate_hz=max_rate_hz)
+    legacy = Dashboard(uncapped, ack=False)
+    full, delta = Dashboard(capped, ack=False), Dashboard(capped, ack=True)
+    await uncapped.connect(legacy)
+    await capped.connect(full)
+    await capped.connect(delta)
+    capped.handle_message(delta, json.dumps({"action": "subscribe", "deltas": True}))
+    renders = {uncapped: 0, capped: 0}
+    latest = {}
+    alerts = 0
+    packets = int(rate_hz * seconds)
+    streams = [await envelopes_for(rng, packets, f"d{d}") for d in range(devices)]
+    started = time.perf_counter()
+    for i in range(packets):
+        for d in range(devices):
+            envelope = streams[d][i]
+            # Keyed as ingest keys it: on the device the scored packet carries
+            device = envelope.processed.device_id
+            key = f"processed:u0:{device}"
+            latest[key] = envelope.message_data
+
+            for manager in (uncapped, capped):
+                def render(envelope=envelope, manager=manager):
+                    renders[manager] += 1
+                    return envelope.message_text
+
+                await manager.publish_state("u0", "processed_data", key, render=render, state=lambda envelope=envelope: envelope.message_data)
+            if i % 20 == 0:
+                alerts += 1
+                for manager in (uncapped, capped):
+                    await manager.publish(json.dumps({"type": "alert", "data": {"device": device, "i": i}}), "u0", "alert", priority=True)
+        # Keep to the packet rate in real time
+        await asyncio.sleep(max(0.0, started + (i + 1) / rate_hz - time.perf_counter()))
+    await asyncio.sleep(2.0 / max_rate_hz)
+    elapsed = time.perf_counter() - started
+
+    for dashboard in (legacy, full, delta):
+        assert dashboard.alerts == alerts, (dashboard.alerts, alerts)
+    keyed = {f"processed:u0:d{d}": f"d{d}" for d in range(devices)}
+    for key, device in keyed.items():
+        assert full.states[device] == latest[key] and delta.states[key] == latest[key], key
+        # At most one update per interval per device (plus the first, sent at once)
+        assert len(full.arrivals[device]) <= max_rate_hz * elapsed + 1, (len(full.arrivals[device]), elapsed)
+    stats = capped.stats()
+    await uncapped.close()
+    await capped.close()
+    return {
+        "packets": packets * devices,
+        "legacy": legacy.chars / elapsed,
+        "full": full.chars / elapsed,
+        "delta": delta.chars / elapsed,
+        "deflate": delta.wire / elapsed,
+        "updates": full.updates / elapsed,
+        "renders": renders[capped] / elapsed,
+        "deltas_sent": stats["deltas_sent"],
+        "elapsed": elapsed,
+    }
+
+
+def check_deflate():
+    import uvicorn
+    import websockets
+    from fastapi import FastAPI, WebSocket
+
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def endpoint(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text(json.dumps({"type": "processed_data", "data": {"x": "y" * 1000}}))
+        await websocket.close()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # Same WebSocket settings as the Dockerfile / app.main entry point
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, ws="websockets", ws_per_message_deflate=True, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    async def client():
+        async with websockets.connect(f"ws://127.0.0.1:{port}/ws", compression="deflate") as ws:
+            message = await ws.recv()
+            return ws.response_headers.get("Sec-WebSocket-Extensions", ""), len(message)
+
+    try:
+        extensions, size = asyncio.run(client())
+    finally:
+        server.should_exit = True
+        thread.join()
+    assert "permessage-deflate" in extensions, extensions
+    print(f"PASS server negotiated {extensions!r} ({size} byte message)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--max-rate", type=float, default=5.0)
+    args = parser.parse_args()
+
+    await check_merge_patch(random.Random(1))
+    rows = []
+    for rate in (10.0, 50.0, 200.0):
+        rows.append((rate, await run_stream(rate, args.devices, args.seconds, args.max_rate)))
+    print(f"PASS capped dashboards end on the newest state of every device (full and delta), at most "
+          f"{args.max_rate:g} updates/s per device, every alert delivered")
+    print(f"{'packets/s':>10} {'uncapped full':>14} {'capped full':>12} {'capped delta':>13} {'+ deflate':>10}  "
+          f"{'updates/s':>9} {'renders/s':>9}   (bytes/s to one dashboard)")
+    for rate, r in rows:
+        print(f"{rate * args.devices:>10.0f} {r['legacy']:>14.0f} {r['full']:>12.0f} {r['delta']:>13.0f} "
+              f"{r['deflate']:>10.0f}  {r['updates']:>9.1f} {r['renders']:>9.1f}")
+    top = rows[-1][1]
+    assert top["renders"] < top["packets"] / top["elapsed"] / 2, top
+    print(f"PASS conflated updates are not rendered: {top['renders']:.1f} renders/s for "
+          f"{top['packets'] / top['elapsed']:.0f} packets/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    check_deflate()
@@ -5,6 +5,7 @@ Usage: run as script to test a sample packet, or import `verify_packet` to use f
 """
 
 import os
+import sys
 import math
 import json
 import joblib
@@ -13,6 +14,11 @@ from typing import Dict, Any
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 MODEL_DIR = os.path.join(ROOT, "models")
+# Ensure package root is on sys.path so 'app' imports resolve when running this script
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.feature_registry import FeaturePlan, signal_row
 
 
 def heuristic_fall_check(safety: Dict[str, Any]) -> Dict[str, Any]:
@@ -71,13 +77,14 @@ def map_packet_to_model_features(packet: Dict[str, Any], expected_features):
     """Create a one-row feature dict from the packet, filling missing features with zeros.
     Mapping rules:
     - If packet contains 'timeseries' (list of rows), compute same features used in training (mean/std/rms/dominant freq).
-    - Else, map single accel values to acc_*_mean and emg values to emg_*_rms where possible.
+    - Else, use the API's feature registry (app/services/feature_registry.py): single-sample
+      channels plus rolling-window features over this one packet, so the models see the
+      same inputs here as in the ingest pipeline.
     """
-    feats = {}
     # if timeseries present we reuse extraction used during training (approximate)
     if 'timeseries' in packet:
+        feats = {}
         try:
-            import numpy as np
             rows = np.asarray(packet['timeseries'], dtype=float)
             if rows.ndim == 1:
                 rows = rows.reshape(1, -1)
@@ -91,41 +98,16 @@ def map_packet_to_model_features(packet: Dict[str, Any], expected_features):
                 feats[f"{name}_domfreq"] = float(0.0)
         except Exception:
             pass
-    else:
-        # map accel single-sample readings if present
-        safety = packet.get('safety', {})
-        ax = safety.get('accel_x_g')
-        ay = safety.get('accel_y_g')
-        az = safety.get('accel_z_g')
-        names = ["acc_x","acc_y","acc_z","gyr_x","gyr_y","gyr_z"]
-        # set means from single values if available
-        for name in names:
-            if name.startswith('acc'):
-                mapping = {'acc_x': ax, 'acc_y': ay, 'acc_z': az}
-                v = mapping.get(name)
-                feats[f"{name}_mean"] = float(v) if v is not None else 0.0
-                feats[f"{name}_std"] = 0.0
-                feats[f"{name}_rms"] = abs(float(v)) if v is not None else 0.0
-                feats[f"{name}_domfreq"] = 0.0
-            else:
-                feats[f"{name}_mean"] = 0.0
-                feats[f"{name}_std"] = 0.0
-                feats[f"{name}_rms"] = 0.0
-                feats[f"{name}_domfreq"] = 0.0
-        # map EMG
-        rig = packet.get('rigidity', {})
-        wrist = rig.get('emg_wrist')
-        arm = rig.get('emg_arm')
-        feats['emg_ch1_rms'] = abs(float(wrist)) if wrist is not None else 0.0
-        feats['emg_ch1_mean'] = float(wrist) if wrist is not None else 0.0
-        feats['emg_ch1_std'] = 0.0
-        feats['emg_ch2_rms'] = abs(float(arm)) if arm is not None else 0.0
-        feats['emg_ch2_mean'] = float(arm) if arm is not None else 0.0
-        feats['emg_ch2_std'] = 0.0
-
-    # Align to expected features
-    row = {f: float(feats.get(f, 0.0)) for f in expected_features}
-    return row
+        # Align to expected features
+        return {f: float(feats.get(f, 0.0)) for f in expected_features}
+
+    plan = FeaturePlan(expected_features)
+    return dict(zip(plan.features, plan.fill(signal_row(packet)).tolist()))
+
+
+def unmapped_features(expected_features):
+    """Model features the registry has no extractor for (fed to the model as 0)."""
+    return list(FeaturePlan(expected_features).unmapped)
 
 
 def verify_packet(packet: Dict[str, Any]) -> Dict[str, Any]:
@@ -146,6 +128,7 @@ def verify_packet(packet: Dict[str, Any]) -> Dict[str, Any]:
             features = rig_model.get('features', None) if isinstance(rig_model, dict) else None
             if features:
                 X = np.array([map_packet_to_model_features(packet, features)[f] for f in features]).reshape(1, -1)
+                out['rigidity_model_unmapped'] = unmapped_features(features)
                 clf = rig_model.get('model', rig_model)
                 pred = clf.predict(X)[0]
             else:
@@ -166,6 +149,8 @@ def verify_packet(packet: Dict[str, Any]) -> Dict[str, Any]:
             else:
                 row = map_packet_to_model_features(packet, features)
                 X = np.array([row[f] for f in features], dtype=float).reshape(1, -1)
+                if 'timeseries' not in packet:
+                    out['pads_model_unmapped'] = unmapped_features(features)
                 clf = pads_model.get('model', pads_model) if isinstance(pads_model, dict) else pads_model
                 pred = clf.predict(X)[0]
                 out['pads_model_pred'] = int(pred)
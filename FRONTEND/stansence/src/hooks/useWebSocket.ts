@@ -1,4 +1,5 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
+import { getIdToken } from '../services/authService';
 
 export interface ProcessedData {
   timestamp: string;
@@ -109,7 +110,9 @@ export function useWebSocket(url?: string): UseWebSocketReturn {
   const [hasReceivedData, setHasReceivedData] = useState(false);
 
   useEffect(() => {
-    const connect = () => {
+    let cancelled = false;
+
+    const connect = async () => {
       if (wsRef.current?.readyState === WebSocket.OPEN || wsRef.current?.readyState === WebSocket.CONNECTING) {
         return;
       }
@@ -117,7 +120,16 @@ export function useWebSocket(url?: string): UseWebSocketReturn {
       setConnectionStatus('connecting');
       
       try {
-        const ws = new WebSocket(wsUrl);
+        // Browsers cannot set headers on a WebSocket, so the backend reads the
+        // Firebase ID token from ?token= and only streams the user's own patients
+        const idToken = await getIdToken();
+        if (cancelled) {
+          return;
+        }
+        const authedUrl = idToken
+          ? `${wsUrl}${wsUrl.includes('?') ? '&' : '?'}token=${encodeURIComponent(idToken)}`
+          : wsUrl;
+        const ws = new WebSocket(authedUrl);
         
         ws.onopen = () => {
           console.log('WebSocket connected to backend');
@@ -208,6 +220,7 @@ export function useWebSocket(url?: string): UseWebSocketReturn {
     }, 2000); // Check every 2 seconds
 
     return () => {
+      cancelled = true;
       clearInterval(timeoutInterval);
       if (reconnectTimeoutRef.current) {
         clearTimeout(reconnectTimeoutRef.current);